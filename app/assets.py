@@ -0,0 +1,316 @@
+"""
+Static asset pipeline.
+
+    python -m app.assets          # build static/dist/ (run on deploy, after pip install)
+
+The build writes a content-hashed copy of every file under static/ into
+static/dist/:
+
+  css, js   minified
+  images    resized to each of IMAGE_HEIGHTS (never upscaled), with WebP and
+            AVIF siblings — needs Pillow, otherwise images are copied as-is
+  text      precompressed .gz siblings, and .br with the `brotli` package
+
+dist/manifest.json maps logical paths ("css/hepacheck.css") to the built
+files. Templates resolve static URLs through it with
+`url_for('static', path=...)` and the `picture` macro (macros.html); with no
+build both fall back to the source files, so development needs no build.
+
+`AssetFiles` is the /static mount: hashed files get a year-long immutable
+Cache-Control and a precompressed sibling when the client accepts one;
+anything else is `no-cache`, i.e. revalidated against its ETag.
+"""
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os as _os
+import re
+import shutil
+import stat
+import sys
+
+import anyio
+from fastapi.staticfiles import StaticFiles
+from jinja2 import pass_context
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+
+_BACKEND   = _os.path.dirname(_os.path.dirname(_os.path.abspath(__file__)))
+STATIC_DIR = _os.path.join(_BACKEND, "static")
+DIST       = "dist"   # build output, under STATIC_DIR
+STATIC_URL = "/static/"
+
+IMAGE_HEIGHTS = (64, 240)   # px; 2× the rendered heights (28–36px icons, 90–120px logos)
+IMAGE_TYPES   = (".png", ".jpg", ".jpeg")
+TEXT_TYPES    = (".css", ".js", ".svg", ".json", ".txt")
+HASH_LENGTH   = 12
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+_HASHED   = re.compile(r"\.[0-9a-f]{%d}\.\w+$" % HASH_LENGTH)
+
+
+# ── Minifiers ─────────────────────────────────────────────────────────────────
+_CSS_TOKEN = re.compile(
+    r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')"""   # strings: kept
+    r"|/\*.*?\*/"                                 # comments: dropped
+    r"|\s*([{};,])\s*"                            # punctuation: no space around
+    r"|\s+",                                      # other whitespace: one space
+    re.S,
+)
+
+
+def minify_css(src: str) -> str:
+    def token(m):
+        if m.group(1):
+            return m.group(1)
+        if m.group(2):
+            return m.group(2)
+        return "" if m.group(0).startswith("/*") else " "
+    return _CSS_TOKEN.sub(token, src).strip()
+
+
+_WORD         = re.compile(r"[\w$]")
+_BEFORE_REGEX = set("(,=:[!&|?{};+-*%<>~^")
+
+
+def minify_js(src: str) -> str:
+    """
+    Drop comments and indentation, collapse whitespace. Conservative: line
+    breaks are kept (no semicolon insertion to reason about), and strings,
+    template literals and regex literals pass through untouched.
+    """
+    out, i, n = [], 0, len(src)
+    last = ""   # last significant character written
+    while i < n:
+        c = src[i]
+        if c in "'\"`":
+            j = i + 1
+            while j < n and src[j] != c:
+                j += 2 if src[j] == "\\" else 1
+            out.append(src[i:j + 1])
+            i, last = j + 1, c
+        elif src.startswith("//", i):
+            j = src.find("\n", i)
+            i = n if j < 0 else j
+        elif src.startswith("/*", i):
+            j = src.find("*/", i + 2)
+            i = n if j < 0 else j + 2
+            if i < n and not src[i].isspace():
+                out.append(" ")
+        elif c == "/" and (not last or last in _BEFORE_REGEX or last == "\n"):
+            j, in_class = i + 1, False
+            while j < n and src[j] != "\n":
+                if src[j] == "\\":
+                    j += 1
+                elif src[j] == "[":
+                    in_class = True
+                elif src[j] == "]":
+                    in_class = False
+                elif src[j] == "/" and not in_class:
+                    break
+                j += 1
+            out.append(src[i:j + 1])
+            i, last = j + 1, "/"
+        elif c.isspace():
+            j = i
+            while j < n and src[j].isspace():
+                j += 1
+            nxt = src[j] if j < n else ""
+            if "\n" in src[i:j]:
+                if last and last != "\n" and nxt:
+                    out.append("\n")
+                    last = "\n"
+            elif (_WORD.match(last or " ") and _WORD.match(nxt or " ")) or (last == nxt and nxt in "+-"):
+                out.append(" ")
+            i = j
+        else:
+            out.append(c)
+            i, last = i + 1, c
+    return "".join(out).strip() + "\n"
+
+
+# ── Build ─────────────────────────────────────────────────────────────────────
+def _write_hashed(rel: str, data: bytes, out_root: str) -> str:
+    """Write `data` as dist/<dir>/<stem>.<hash><ext> (plus compressed siblings); returns its path."""
+    stem, ext = _os.path.splitext(rel)
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    built = f"{DIST}/{stem}.{digest}{ext}"
+    path = _os.path.join(out_root, built)
+    _os.makedirs(_os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    if ext in TEXT_TYPES:
+        for suffix, compressed in _compressed(data):
+            if len(compressed) < len(data):
+                with open(path + suffix, "wb") as f:
+                    f.write(compressed)
+    return built
+
+
+def _compressed(data: bytes):
+    yield ".gz", gzip.compress(data, 9, mtime=0)
+    try:
+        import brotli
+    except ImportError:
+        return
+    yield ".br", brotli.compress(data, quality=11)
+
+
+def _image_variants(rel: str, data: bytes, out_root: str) -> list | None:
+    """Resized PNG/WebP/AVIF variants per IMAGE_HEIGHTS; None without Pillow."""
+    try:
+        from PIL import Image, features
+    except ImportError:
+        return None
+    formats = [("png", {"optimize": True}), ("webp", {"quality": 85, "method": 6})]
+    if features.check("avif"):
+        formats.append(("avif", {"quality": 60}))
+    stem = _os.path.splitext(rel)[0]
+    variants = []
+    with Image.open(io.BytesIO(data)) as im:
+        im.load()
+        for height in sorted({min(h, im.height) for h in IMAGE_HEIGHTS}):
+            width = round(im.width * height / im.height)
+            frame = im if height == im.height else im.resize((width, height), Image.LANCZOS)
+            variant = {"width": width, "height": height}
+            for fmt, options in formats:
+                buf = io.BytesIO()
+                frame.save(buf, fmt.upper(), **options)
+                variant[fmt] = _write_hashed(f"{stem}.{fmt}", buf.getvalue(), out_root)
+            variants.append(variant)
+    return variants
+
+
+def build(static_dir: str = STATIC_DIR) -> dict:
+    """Rebuild static_dir/dist and its manifest; returns the manifest."""
+    out = _os.path.join(static_dir, DIST)
+    shutil.rmtree(out, ignore_errors=True)
+    manifest = {"files": {}, "images": {}}
+    for root, dirs, files in _os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if _os.path.join(root, d) != out)
+        for name in sorted(files):
+            if name.startswith("."):
+                continue
+            path = _os.path.join(root, name)
+            rel = _os.path.relpath(path, static_dir).replace(_os.sep, "/")
+            with open(path, "rb") as f:
+                data = f.read()
+            ext = _os.path.splitext(name)[1].lower()
+            if ext == ".css":
+                data = minify_css(data.decode()).encode()
+            elif ext == ".js":
+                data = minify_js(data.decode()).encode()
+            elif ext in IMAGE_TYPES:
+                variants = _image_variants(rel, data, static_dir)
+                if variants:
+                    manifest["images"][rel] = variants
+                    manifest["files"][rel] = variants[-1]["png"]
+                    continue
+            manifest["files"][rel] = _write_hashed(rel, data, static_dir)
+    with open(_os.path.join(out, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    reload_manifest(static_dir)
+    return manifest
+
+
+# ── Lookup ────────────────────────────────────────────────────────────────────
+_manifest = {"files": {}, "images": {}}
+
+
+def reload_manifest(static_dir: str = STATIC_DIR):
+    global _manifest
+    try:
+        with open(_os.path.join(static_dir, DIST, "manifest.json")) as f:
+            _manifest = json.load(f)
+    except FileNotFoundError:
+        _manifest = {"files": {}, "images": {}}
+
+
+def asset_path(path: str) -> str:
+    """Built (hashed) path for a logical static path, or the path itself when unbuilt."""
+    return _manifest["files"].get(path, path)
+
+
+def image_variant(path: str, height: int) -> dict:
+    """
+    Smallest built variant at least twice `height` (else the largest), as
+    {"width", "height", "png", "webp"[, "avif"]} URLs; just {"png"} when unbuilt.
+    """
+    variants = _manifest["images"].get(path)
+    if not variants:
+        return {"png": STATIC_URL + path}
+    chosen = next((v for v in variants if v["height"] >= 2 * height), variants[-1])
+    return {k: STATIC_URL + v if isinstance(v, str) else v for k, v in chosen.items()}
+
+
+@pass_context
+def url_for(context, name: str, /, **path_params):
+    """Jinja `url_for`; static paths go through the manifest and stay root-relative."""
+    if name == "static":
+        return STATIC_URL + asset_path(path_params["path"])
+    return context["request"].url_for(name, **path_params)
+
+
+reload_manifest()
+
+
+# ── Serving ───────────────────────────────────────────────────────────────────
+def accepts_encoding(header: str, coding: str) -> bool:
+    """Whether an Accept-Encoding header allows `coding` (q=0 refuses it)."""
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        if token.strip().lower() == coding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+class AssetFiles(StaticFiles):
+    """StaticFiles with immutable caching and precompressed siblings for hashed files."""
+
+    async def get_response(self, path: str, scope) -> Response:
+        hashed = path.startswith(DIST + "/") and bool(_HASHED.search(path))
+        response = (await self._precompressed(path, scope)) if hashed else None
+        if response is None:
+            response = await super().get_response(path, scope)
+        if hashed:
+            response.headers["Cache-Control"] = IMMUTABLE
+            response.headers["Vary"] = "Accept-Encoding"
+        else:
+            response.headers["Cache-Control"] = "no-cache"
+        return response
+
+    async def _precompressed(self, path: str, scope) -> Response | None:
+        request_headers = Headers(scope=scope)
+        accepted = request_headers.get("accept-encoding", "")
+        if scope["method"] not in ("GET", "HEAD") or not accepted:
+            return None
+        for coding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if not accepts_encoding(accepted, coding):
+                continue
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            if stat_result and stat.S_ISREG(stat_result.st_mode):
+                response = FileResponse(
+                    full_path, stat_result=stat_result,
+                    media_type=mimetypes.guess_type(path)[0] or "application/octet-stream",
+                    headers={"Content-Encoding": coding},
+                )
+                if self.is_not_modified(response.headers, request_headers):
+                    return NotModifiedResponse(response.headers)
+                return response
+        return None
+
+
+def main():
+    manifest = build()
+    print(f"Built {len(manifest['files'])} assets ({len(manifest['images'])} images with variants) "
+          f"into {_os.path.join(STATIC_DIR, DIST)}")
+    if not manifest["images"]:
+        print("Pillow is not installed: images were copied without resizing or WebP/AVIF.",
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
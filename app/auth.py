@@ -1,29 +1,174 @@
 from jose import jwt, JWTError
 from fastapi import Request
 from fastapi.exceptions import HTTPException
+from collections import OrderedDict
+from hashlib import sha256
+from hmac import compare_digest
+from threading import Lock
+from typing import NamedTuple
 import os
+import time
+
+from sqlalchemy import select
+
+from app.database import User
+from app.metrics import JWT_SECONDS
 
 SECRET_KEY = os.environ.get("SECRET_KEY", "hepacheck-dev-secret-change-in-prod")
 ALGORITHM  = "HS256"
 
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")   # unset: /metrics is disabled
 
-def require_role(request: Request, role: str) -> dict:
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", "4096"))
+AUTH_CACHE_TTL  = float(os.environ.get("AUTH_CACHE_TTL", "60"))   # seconds
+
+
+class UserSnapshot(NamedTuple):
+    """The few User fields request handlers need, safe to keep across sessions."""
+    id:       int
+    username: str
+    email:    str
+    role:     str
+
+
+class _CachedAuth:
+    __slots__ = ("expires_at", "payload", "user")
+
+    def __init__(self, expires_at: float, payload: dict):
+        self.expires_at = expires_at
+        self.payload    = payload
+        self.user       = None
+
+
+class AuthCache:
     """
-    Decode the JWT cookie and verify the expected role.
-    Raises HTTP 303 → /login if missing, expired, or wrong role.
+    Bounded LRU of verified JWT payloads (and, once looked up, the user
+    snapshot), keyed by the SHA-256 of the token. Entries live for `ttl`
+    seconds but never past the token's own `exp`.
+
+    Only logout invalidates an entry. The app never edits or deletes a User
+    row, and the role is read from the signed token, not the row. A change
+    made outside the app, such as SQL by hand or a re-seed, therefore
+    reaches a signed-in user within AUTH_CACHE_TTL seconds (60 by default).
     """
+
+    def __init__(self, maxsize: int = AUTH_CACHE_SIZE, ttl: float = AUTH_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl     = ttl
+        self._data   = OrderedDict()
+        self._lock   = Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    @staticmethod
+    def key(token: str) -> str:
+        return sha256(token.encode()).hexdigest()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item.expires_at <= time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item
+
+    def put(self, key: str, payload: dict) -> _CachedAuth:
+        ttl = self.ttl
+        if "exp" in payload:
+            ttl = min(ttl, payload["exp"] - time.time())
+        item = _CachedAuth(time.monotonic() + ttl, payload)
+        with self._lock:
+            self._data[key] = item
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+        return item
+
+    def invalidate_token(self, token: str):
+        with self._lock:
+            if self._data.pop(self.key(token), None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data), "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "invalidations": self.invalidations,
+            }
+
+
+auth_cache = AuthCache()
+
+
+def _authenticate(request: Request) -> _CachedAuth:
     token = request.cookies.get("access_token")
     if not token:
         raise HTTPException(status_code=303, headers={"Location": "/login"})
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-    except JWTError:
-        raise HTTPException(status_code=303, headers={"Location": "/login"})
+    key = AuthCache.key(token)
+    item = auth_cache.get(key)
+    if item is None:
+        try:
+            with JWT_SECONDS.time():
+                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            raise HTTPException(status_code=303, headers={"Location": "/login"})
+        item = auth_cache.put(key, payload)
+    return item
+
 
+def _check_role(payload: dict, role: str):
     if payload.get("role") != role:
         # Logged in as a different role → send to their own dashboard
         actual_role = payload.get("role", "")
         dest = f"/{actual_role}/home" if actual_role in ("patient", "doctor") else "/login"
         raise HTTPException(status_code=303, headers={"Location": dest})
 
-    return payload
+
+def require_metrics_token(request: Request):
+    """
+    Operational endpoints need `Authorization: Bearer <METRICS_TOKEN>`.
+    With METRICS_TOKEN unset they answer 404, so they are never public by default.
+    """
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not compare_digest(request.headers.get("authorization", ""), f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token.")
+
+
+def require_login(request: Request) -> dict:
+    """Decode the JWT cookie for any role. Raises HTTP 303 → /login if missing or expired."""
+    return _authenticate(request).payload
+
+
+def require_role(request: Request, role: str) -> dict:
+    """
+    Decode the JWT cookie and verify the expected role.
+    Raises HTTP 303 → /login if missing, expired, or wrong role.
+    Verified payloads are served from `auth_cache` on repeat requests.
+    """
+    item = _authenticate(request)
+    _check_role(item.payload, role)
+    return item.payload
+
+
+async def current_user(request: Request, db, role: str) -> UserSnapshot:
+    """
+    `require_role` plus the matching user row, as a cached UserSnapshot.
+    Only the first request per token (per cache TTL) hits the users table.
+    """
+    item = _authenticate(request)
+    _check_role(item.payload, role)
+    if item.user is None:
+        user = await db.scalar(select(User).where(User.id == int(item.payload["sub"])))
+        if not user:
+            raise HTTPException(status_code=303, headers={"Location": "/login"})
+        item.user = UserSnapshot(user.id, user.username, user.email, user.role)
+    return item.user
@@ -0,0 +1,130 @@
+"""
+Response compression middleware.
+
+Compresses text-like responses with brotli (when the `brotli` package is
+installed and the client accepts it) or gzip. Whole bodies under
+COMPRESS_MIN_SIZE are sent as-is. Streamed bodies are compressed chunk by
+chunk with a sync flush after each one, so a streamed page still reaches the
+browser piece by piece. Left alone:
+
+  - responses that already carry a Content-Encoding (precompressed static
+    files from app.assets)
+  - binary types, including the application/gzip exports
+  - Server-Sent Events, which must not sit in a compressor's buffer
+
+A compressed response's ETag is made weak (W/"…"), since its bytes differ
+from the identity representation. app.etags compares If-None-Match weakly,
+so 304s still work.
+"""
+import os as _os
+import re
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.assets import accepts_encoding
+
+COMPRESS_MIN_SIZE  = int(_os.environ.get("COMPRESS_MIN_SIZE", "1024"))   # bytes
+GZIP_LEVEL         = 6
+BROTLI_QUALITY     = 5   # dynamic responses: fast, most of the gain of 11
+
+_COMPRESSIBLE = re.compile(
+    r"^(text/(?!event-stream)|application/(json|javascript|xml|x-ndjson|manifest\+json)|image/svg\+xml)"
+)
+
+try:
+    import brotli
+except ImportError:   # gzip only
+    brotli = None
+
+
+def _choose(accept_encoding: str) -> str | None:
+    if brotli is not None and accepts_encoding(accept_encoding, "br"):
+        return "br"
+    if accepts_encoding(accept_encoding, "gzip"):
+        return "gzip"
+    return None
+
+
+class _Gzip:
+    def __init__(self):
+        self._z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)   # wbits 31 = gzip framing
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._z.compress(data) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._z.compress(data) + self._z.flush()
+
+
+class _Brotli:
+    def __init__(self):
+        self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._c.process(data) + self._c.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._c.process(data) + self._c.finish()
+
+
+_CODERS = {"gzip": _Gzip, "br": _Brotli}
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app          = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        coding = _choose(Headers(scope=scope).get("accept-encoding", ""))
+        if coding is None:
+            return await self.app(scope, receive, send)
+
+        start = None      # held http.response.start message
+        coder = None      # set once we've decided to compress
+
+        async def wrapped_send(message):
+            nonlocal start, coder
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                return await send(message)
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if coder is None:
+                headers = Headers(raw=start["headers"])
+                if (
+                    start["status"] < 200 or start["status"] in (204, 304)
+                    or "content-encoding" in headers
+                    or not _COMPRESSIBLE.match(headers.get("content-type", ""))
+                    or (not more and len(body) < self.minimum_size)
+                ):
+                    await send(start)
+                    start = None   # pass everything else straight through
+                    return await send(message)
+                coder = _CODERS[coding]()
+                data = coder.chunk(body) if more else coder.finish(body)
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = coding
+                headers.add_vary_header("Accept-Encoding")
+                if more:
+                    if "content-length" in headers:
+                        del headers["content-length"]
+                else:
+                    headers["Content-Length"] = str(len(data))
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = "W/" + etag
+                await send(start)
+            else:
+                data = coder.chunk(body) if more else coder.finish(body)
+
+            if data or not more:
+                await send({"type": "http.response.body", "body": data, "more_body": more})
+
+        await self.app(scope, receive, wrapped_send)
@@ -1,16 +1,103 @@
 from datetime import datetime
+from fastapi import Depends, Request
 from sqlalchemy import (
     create_engine, Column, Integer, String, Float,
-    Boolean, DateTime, Text, ForeignKey, UniqueConstraint
+    Boolean, DateTime, Text, ForeignKey, UniqueConstraint, Index,
+    event, inspect, text, select, update, func, or_,
 )
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 import os as _os
 _DB_PATH = _os.path.join(_os.path.dirname(_os.path.abspath(__file__)), "hepacheck.db")
-DATABASE_URL = "sqlite:///" + _DB_PATH
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# ── Connection URLs ──────────────────────────────────────────────────────────
+# DATABASE_URL picks the backend; unset means the SQLite file next to this
+# package. PostgreSQL URLs (including Render's postgres://… form) run on
+# psycopg 3, which serves both the sync and async engines. When
+# DATABASE_REPLICA_URL is set, read-only dashboard queries go there instead.
+def _normalise_url(url: str) -> str:
+    for prefix in ("postgres://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix):]
+    return url
+
+
+DATABASE_URL         = _normalise_url(_os.environ.get("DATABASE_URL", "sqlite:///" + _DB_PATH))
+DATABASE_REPLICA_URL = _normalise_url(_os.environ.get("DATABASE_REPLICA_URL", ""))
+
+# Seconds a client keeps reading from the primary after it writes, so it sees
+# its own changes while the replica catches up (see main.py).
+REPLICA_STICKY_SECONDS = int(_os.environ.get("REPLICA_STICKY_SECONDS", "5"))
+READ_PRIMARY_COOKIE    = "read_primary"
+
+# ── Engine profile ───────────────────────────────────────────────────────────
+# WAL lets dashboard reads proceed while a save_score commit is in flight, and
+# synchronous=NORMAL is crash-safe in WAL mode (a power cut may drop the last
+# few commits, never corrupt the file). Every pragma can be overridden from
+# the environment, e.g. SQLITE_JOURNAL_MODE=DELETE.
+SQLITE_PRAGMAS = {
+    "journal_mode": _os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous":  _os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size":   int(_os.environ.get("SQLITE_CACHE_SIZE", "-65536")),         # negative = KiB → 64 MiB
+    "mmap_size":    int(_os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "busy_timeout": int(_os.environ.get("SQLITE_BUSY_TIMEOUT", "5000")),         # ms
+    "temp_store":   _os.environ.get("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+# aiosqlite defaults to NullPool, i.e. a fresh connection (and thread) per
+# session; keep a real pool instead. Sizes are per uvicorn worker process: the
+# default splits two connections per CPU across WEB_CONCURRENCY workers, since
+# SQLite serialises writers anyway and extra connections only add contention.
+WEB_CONCURRENCY = int(_os.environ.get("WEB_CONCURRENCY", "1"))
+DB_POOL_SIZE    = int(_os.environ.get(
+    "DB_POOL_SIZE", str(max(2, 2 * (_os.cpu_count() or 1) // WEB_CONCURRENCY))))
+DB_MAX_OVERFLOW = int(_os.environ.get("DB_MAX_OVERFLOW", str(DB_POOL_SIZE)))
+DB_POOL_TIMEOUT = float(_os.environ.get("DB_POOL_TIMEOUT", "30"))
+
+
+def configure_sqlite(engine, pragmas: dict = SQLITE_PRAGMAS):
+    """Run `pragmas` on every new DBAPI connection of a sync or async engine."""
+    def _on_connect(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    event.listen(getattr(engine, "sync_engine", engine), "connect", _on_connect)
+    return engine
+
+
+def make_engine(url: str):
+    """Sync engine for init_db and the maintenance CLIs."""
+    if make_url(url).get_backend_name() == "sqlite":
+        return configure_sqlite(create_engine(url, connect_args={"check_same_thread": False}))
+    return create_engine(url, pool_pre_ping=True)
+
+
+def make_async_engine(url: str):
+    """Pooled async engine for request handlers."""
+    url = make_url(url)
+    pool = {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_timeout": DB_POOL_TIMEOUT}
+    if url.get_backend_name() == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+        return configure_sqlite(create_async_engine(url, poolclass=AsyncAdaptedQueuePool, **pool))
+    return create_async_engine(url, pool_pre_ping=True, **pool)
+
+
+engine = make_engine(DATABASE_URL)
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+# Request handlers run on the async engine so a slow query parks the coroutine
+# instead of a threadpool worker. The sync engine above stays for init_db and
+# the maintenance CLIs.
+async_engine = make_async_engine(DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+replica_engine = make_async_engine(DATABASE_REPLICA_URL) if DATABASE_REPLICA_URL else async_engine
+AsyncReadSessionLocal = async_sessionmaker(bind=replica_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
@@ -23,6 +110,8 @@ class User(Base):
     email    = Column(String, unique=True, index=True)
     password = Column(String)
     role     = Column(String)          # "patient" | "doctor"
+    unread_notifications = Column(Integer, nullable=False, default=0)   # see app.notifications
+    data_version         = Column(Integer, nullable=False, default=0)   # dashboard fragment stamp, see app.summaries
 
     entries           = relationship("Entry",         back_populates="user",   cascade="all, delete")
     notifications     = relationship("Notification",  back_populates="user",   cascade="all, delete")
@@ -74,6 +163,10 @@ class PatientDoctor(Base):
     doctor_id   = Column(Integer, ForeignKey("users.id"), nullable=False)
     assigned_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_patient_doctor_doctor", "doctor_id"),
+    )
+
     patient     = relationship("User", foreign_keys=[patient_id], back_populates="assigned_doctor")
     doctor_user = relationship("User", foreign_keys=[doctor_id],  back_populates="assigned_patients")
 
@@ -100,11 +193,37 @@ class Entry(Base):
     homa_ir      = Column(Float, nullable=False)
     risk_level   = Column(String,  nullable=False)
     is_emergency = Column(Boolean, nullable=False)
+    risk_version = Column(Integer, nullable=False, default=1)   # scores.RISK_RULES version
+
+    # Patient history and doctor dashboards: WHERE user_id [IN ...] ORDER BY created_at DESC
+    __table_args__ = (
+        Index("ix_entries_user_created", "user_id", created_at.desc()),
+    )
 
     user  = relationship("User", back_populates="entries")
     flags = relationship("Flag", back_populates="entry", cascade="all, delete")
 
 
+# ── Patient summaries (one row per patient, maintained by app.summaries) ──────
+class PatientSummary(Base):
+    __tablename__ = "patient_summaries"
+
+    patient_id      = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    entry_count     = Column(Integer, nullable=False, default=0)
+    last_entry_at   = Column(DateTime)
+    latest_entry_id = Column(Integer)
+    fib4            = Column(Float)      # latest entry's scores
+    apri            = Column(Float)
+    nfs             = Column(Float)
+    homa_ir         = Column(Float)
+    risk_level      = Column(String)
+    low_count       = Column(Integer, nullable=False, default=0)
+    moderate_count  = Column(Integer, nullable=False, default=0)
+    high_count      = Column(Integer, nullable=False, default=0)
+    fib4_slope      = Column(Float)      # FIB-4 change per 30 days over the last few entries
+    updated_at      = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
 # ── Flags ─────────────────────────────────────────────────────────────────────
 class Flag(Base):
     __tablename__ = "flags"
@@ -116,6 +235,11 @@ class Flag(Base):
     status     = Column(String, nullable=False, default="open")
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
+    __table_args__ = (
+        Index("ix_flags_entry_status", "entry_id", "status"),
+        Index("ix_flags_doctor_status_created", "doctor_id", "status", "created_at"),
+    )
+
     entry  = relationship("Entry", back_populates="flags")
     doctor = relationship("User",  back_populates="flags_raised", foreign_keys=[doctor_id])
 
@@ -127,9 +251,15 @@ class Notification(Base):
     id         = Column(Integer, primary_key=True)
     user_id    = Column(Integer, ForeignKey("users.id"))
     message    = Column(String)
+    kind       = Column(String, default="info", nullable=False)   # "info" | "emergency"
     is_read    = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
+    __table_args__ = (
+        Index("ix_notifications_user_read_created", "user_id", "is_read", "created_at"),
+        Index("ix_notifications_user_created", "user_id", "created_at"),
+    )
+
     user = relationship("User", back_populates="notifications")
 
 
@@ -144,6 +274,18 @@ class CommunityPost(Base):
     body       = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
+    # Denormalised counters, kept in step with PostLike / PostReply rows by the
+    # like and reply handlers; reconcile_post_counters() repairs any drift.
+    like_count  = Column(Integer, nullable=False, default=0)
+    reply_count = Column(Integer, nullable=False, default=0)
+    updated_at  = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)   # feed ETag, see app.etags
+
+    __table_args__ = (
+        Index("ix_community_posts_created", "created_at"),
+        Index("ix_community_posts_updated", "updated_at"),
+        Index("ix_community_posts_author", "author_id"),   # the feed's "my posts" count
+    )
+
     author  = relationship("User", back_populates="community_posts")
     replies = relationship("PostReply", back_populates="post", cascade="all, delete", order_by="PostReply.created_at")
     likes   = relationship("PostLike",  back_populates="post", cascade="all, delete")
@@ -159,6 +301,10 @@ class PostReply(Base):
     body       = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
+    __table_args__ = (
+        Index("ix_post_replies_post_created", "post_id", "created_at"),
+    )
+
     post   = relationship("CommunityPost", back_populates="replies")
     author = relationship("User")
 
@@ -174,15 +320,124 @@ class PostLike(Base):
     # This UniqueConstraint is the source-of-truth for one-like-per-user-per-post
     __table_args__ = (
         UniqueConstraint("post_id", "user_id", name="uq_post_like"),
+        Index("ix_post_likes_user", "user_id"),
     )
 
     post = relationship("CommunityPost", back_populates="likes")
     user = relationship("User",          back_populates="post_likes")
 
 
+# ── Outbox (side effects committed with the write, delivered by app.outbox) ───
+class OutboxMessage(Base):
+    __tablename__ = "outbox"
+
+    id              = Column(Integer, primary_key=True)
+    topic           = Column(String, nullable=False)                 # e.g. "emergency_alert"
+    idempotency_key = Column(String, nullable=False, unique=True)    # passed to every sink
+    payload         = Column(Text, nullable=False)                   # JSON
+    status          = Column(String, default="pending", nullable=False)   # "pending" | "sent" | "failed"
+    attempts        = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)   # also the claim lease
+    last_error      = Column(Text)
+    created_at      = Column(DateTime, default=datetime.utcnow, nullable=False)
+    sent_at         = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+
 # ── DB helpers ────────────────────────────────────────────────────────────────
+# Columns and indexes added after the first release. create_all() never alters
+# existing tables, so older hepacheck.db files get them on startup instead.
+_ADDED_COLUMNS = {
+    "entries": {"risk_version": "INTEGER NOT NULL DEFAULT 1"},
+    "users": {
+        "unread_notifications": "INTEGER NOT NULL DEFAULT 0",
+        "data_version":         "INTEGER NOT NULL DEFAULT 0",
+    },
+    "notifications": {"kind": "VARCHAR NOT NULL DEFAULT 'info'"},
+    "community_posts": {
+        "like_count":  "INTEGER NOT NULL DEFAULT 0",
+        "reply_count": "INTEGER NOT NULL DEFAULT 0",
+        "updated_at":  "TIMESTAMP",   # DateTime on both SQLite and PostgreSQL
+    },
+}
+
+
+def _add_missing_columns() -> set:
+    """ALTER in any missing _ADDED_COLUMNS; returns the (table, column) pairs added."""
+    insp = inspect(engine)
+    added = set()
+    with engine.begin() as conn:
+        for table, columns in _ADDED_COLUMNS.items():
+            existing = {c["name"] for c in insp.get_columns(table)}
+            for name, ddl in columns.items():
+                if name not in existing:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+                    added.add((table, name))
+    return added
+
+
+def _create_missing_indexes():
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+
+def reconcile_post_counters(conn) -> int:
+    """Recount like_count / reply_count from their rows; returns posts corrected."""
+    likes = (
+        select(func.count(PostLike.id))
+        .where(PostLike.post_id == CommunityPost.id)
+        .scalar_subquery()
+    )
+    replies = (
+        select(func.count(PostReply.id))
+        .where(PostReply.post_id == CommunityPost.id)
+        .scalar_subquery()
+    )
+    result = conn.execute(
+        update(CommunityPost)
+        .where(or_(CommunityPost.like_count != likes, CommunityPost.reply_count != replies))
+        .values(like_count=likes, reply_count=replies)
+    )
+    return result.rowcount
+
+
+def reconcile_unread_counts(conn) -> int:
+    """Recount User.unread_notifications from unread rows; returns users corrected."""
+    unread = (
+        select(func.count(Notification.id))
+        .where(Notification.user_id == User.id, Notification.is_read == False)
+        .scalar_subquery()
+    )
+    result = conn.execute(
+        update(User)
+        .where(User.unread_notifications != unread)
+        .values(unread_notifications=unread)
+    )
+    return result.rowcount
+
+
 def init_db():
+    new_summaries = not inspect(engine).has_table(PatientSummary.__tablename__)
     Base.metadata.create_all(bind=engine)
+    added = _add_missing_columns()
+    if new_summaries:
+        from app.summaries import rebuild_summaries
+        with SessionLocal() as db:
+            rebuild_summaries(db)
+    if ("community_posts", "like_count") in added:
+        with engine.begin() as conn:
+            reconcile_post_counters(conn)
+    if ("users", "unread_notifications") in added:
+        with engine.begin() as conn:
+            reconcile_unread_counts(conn)
+    _create_missing_indexes()
+    # Drop pooled connections that cached the pre-migration schema
+    engine.dispose()
 
 
 def get_db():
@@ -190,4 +445,27 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_read_session_factory(request: Request):
+    """
+    Session factory for handlers that only read. The replica, unless this
+    client wrote within the last REPLICA_STICKY_SECONDS and must see its own
+    writes. Streamed responses open their sessions from it, since a
+    request-scoped session is closed before the body is sent.
+    """
+    if request.cookies.get(READ_PRIMARY_COOKIE):
+        return AsyncSessionLocal
+    return AsyncReadSessionLocal
+
+
+async def get_async_read_db(factory=Depends(get_read_session_factory)):
+    """Request-scoped session from get_read_session_factory."""
+    async with factory() as db:
+        yield db
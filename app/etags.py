@@ -0,0 +1,101 @@
+"""
+Conditional GETs for the polled views.
+
+Each view has a version stamp: one SELECT of indexed MAX/COUNT lookups and
+counter columns that changes whenever anything the view shows does. The
+strong ETag hashes the stamp together with the viewer, the query string and
+BUILD_ID, so a deploy that changes templates invalidates every tag. BUILD_ID
+defaults to a hash of the templates, static sources and app code, which every
+worker of one deploy computes alike. Routes
+read the stamp right after authenticating and return `not_modified(...)` if
+the client's If-None-Match matches, before running the page's queries.
+
+  patient home   own summary row (the entry count is all it renders)
+  doctor home    User.data_version (patients' summaries and assignments)
+                 and own flags; notifications reach it over SSE, not HTML
+  feed           CommunityPost.updated_at (posts, replies and likes) and ids
+"""
+import os as _os
+from hashlib import sha256
+
+from fastapi import Request
+from fastapi.responses import Response
+from sqlalchemy import func, select
+
+from app.assets import DIST, STATIC_DIR
+from app.database import CommunityPost, Flag, PatientSummary, User
+from app.templating import TEMPLATES_DIR
+
+_APP_DIR = _os.path.dirname(_os.path.abspath(__file__))
+
+
+def _source_digest() -> str:
+    """Hash of everything that shapes a rendered page; identical in every worker."""
+    digest = sha256()
+    for root, suffix in ((TEMPLATES_DIR, ""), (STATIC_DIR, ""), (_APP_DIR, ".py")):
+        for dirpath, dirnames, filenames in _os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if d not in (DIST, "__pycache__"))
+            for name in sorted(filenames):
+                if not name.endswith(suffix):
+                    continue
+                path = _os.path.join(dirpath, name)
+                digest.update(_os.path.relpath(path, root).encode())
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+BUILD_ID      = _os.environ.get("BUILD_ID") or _source_digest()
+CACHE_CONTROL = "private, no-cache"   # store, but revalidate every time
+
+
+async def patient_home_stamp(db, patient_id: int):
+    return (await db.execute(select(
+        User.username,
+        select(PatientSummary.updated_at)
+        .where(PatientSummary.patient_id == patient_id).scalar_subquery(),
+    ).where(User.id == patient_id))).one()
+
+
+async def doctor_home_stamp(db, doctor_id: int):
+    """Also carries data_version and open_flags for the page itself."""
+    return (await db.execute(select(
+        User.data_version,
+        select(func.max(Flag.id)).where(Flag.doctor_id == doctor_id).scalar_subquery(),
+        select(func.count(Flag.id))
+        .where(Flag.doctor_id == doctor_id, Flag.status == "open").scalar_subquery().label("open_flags"),
+    ).where(User.id == doctor_id))).one()
+
+
+async def feed_stamp(db):
+    # Separate subqueries: SQLite answers a lone MAX from its index in one probe
+    return (await db.execute(select(
+        select(func.max(CommunityPost.updated_at)).scalar_subquery(),
+        select(func.max(CommunityPost.id)).scalar_subquery(),
+    ))).one()
+
+
+def make_etag(request: Request, user_id: int, stamp) -> str:
+    raw = repr((BUILD_ID, request.url.path, request.url.query, user_id, tuple(stamp)))
+    return '"' + sha256(raw.encode()).hexdigest()[:32] + '"'
+
+
+def _matches(header: str, etag: str) -> bool:
+    """If-None-Match uses the weak comparison: W/ prefixes are ignored."""
+    if header.strip() == "*":
+        return True
+    return any(t.strip().removeprefix("W/") == etag for t in header.split(","))
+
+
+def not_modified(request: Request, etag: str) -> Response | None:
+    """A 304 for a matching If-None-Match, else None."""
+    header = request.headers.get("if-none-match")
+    if header and _matches(header, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    return None
+
+
+def tag(response: Response, etag: str) -> Response:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
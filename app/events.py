@@ -0,0 +1,165 @@
+"""
+Per-user push events.
+
+Notifications are published to a broker once the transaction that inserted
+them commits, and GET /notifications/stream relays them to the browser as
+server-sent events. The broker is picked by BROKER_URL:
+
+  memory://  (default) in-process fan-out; one worker only, and what tests use
+  redis://…  Redis pub/sub, so every worker sees every event (needs `redis`)
+"""
+import asyncio
+import json
+import os
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.database import Notification
+
+BROKER_URL        = os.environ.get("BROKER_URL", "memory://")
+SUBSCRIBER_BUFFER = int(os.environ.get("SSE_SUBSCRIBER_BUFFER", "100"))
+
+
+def notification_event(n: Notification) -> dict:
+    return {
+        "id":      n.id,
+        "kind":    n.kind,
+        "message": n.message,
+        "time":    n.created_at.strftime("%d %b %Y, %H:%M"),
+    }
+
+
+# ── Brokers ──────────────────────────────────────────────────────────────────
+class InMemoryBroker:
+    """Fan-out to asyncio queues in this process. Slow subscribers drop their oldest events."""
+
+    def __init__(self, buffer: int = SUBSCRIBER_BUFFER):
+        self.buffer = buffer
+        self._subscribers = {}   # user_id → set of queues
+
+    async def publish(self, user_id: int, payload: dict):
+        for queue in self._subscribers.get(user_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(payload)
+
+    def subscribe(self, user_id: int) -> "_QueueSubscription":
+        return _QueueSubscription(self, user_id)
+
+    def subscriber_count(self) -> int:
+        return sum(len(qs) for qs in self._subscribers.values())
+
+
+class _QueueSubscription:
+    def __init__(self, broker: InMemoryBroker, user_id: int):
+        self._broker  = broker
+        self._user_id = user_id
+        self._queue   = asyncio.Queue(maxsize=broker.buffer)
+
+    async def __aenter__(self):
+        self._broker._subscribers.setdefault(self._user_id, set()).add(self._queue)
+        return self
+
+    async def __aexit__(self, *exc):
+        queues = self._broker._subscribers.get(self._user_id, set())
+        queues.discard(self._queue)
+        if not queues:
+            self._broker._subscribers.pop(self._user_id, None)
+
+    async def get(self, timeout: float):
+        """Next event, or None after `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class RedisBroker:
+    """Redis pub/sub on one channel per user, shared by every worker."""
+
+    CHANNEL = "hepacheck:events:{}"
+
+    def __init__(self, url: str):
+        try:
+            from redis import asyncio as aioredis
+        except ImportError as exc:
+            raise RuntimeError("BROKER_URL=redis://… requires the `redis` package") from exc
+        self._redis = aioredis.from_url(url)
+
+    async def publish(self, user_id: int, payload: dict):
+        await self._redis.publish(self.CHANNEL.format(user_id), json.dumps(payload))
+
+    def subscribe(self, user_id: int) -> "_RedisSubscription":
+        return _RedisSubscription(self._redis, self.CHANNEL.format(user_id))
+
+
+class _RedisSubscription:
+    def __init__(self, redis, channel: str):
+        self._pubsub  = redis.pubsub(ignore_subscribe_messages=True)
+        self._channel = channel
+
+    async def __aenter__(self):
+        await self._pubsub.subscribe(self._channel)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._pubsub.unsubscribe(self._channel)
+        await self._pubsub.aclose()
+
+    async def get(self, timeout: float):
+        message = await self._pubsub.get_message(timeout=timeout)
+        return json.loads(message["data"]) if message else None
+
+
+def _make_broker(url: str):
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        return RedisBroker(url)
+    if url.startswith("memory://"):
+        return InMemoryBroker()
+    raise ValueError(f"Unsupported BROKER_URL: {url}")
+
+
+broker = _make_broker(BROKER_URL)
+
+
+def set_broker(new_broker):
+    """Swap the process-wide broker (tests, benchmarks)."""
+    global broker
+    broker = new_broker
+
+
+# ── Publish on commit ────────────────────────────────────────────────────────
+# Notifications are collected at flush and only published after COMMIT, so a
+# rolled-back request never pushes anything. Sessions without a running event
+# loop (the maintenance CLIs) skip publishing.
+_PENDING   = "pending_events"
+_in_flight = set()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_notifications(session, _flush_context):
+    pending = session.info.setdefault(_PENDING, [])
+    for obj in session.new:
+        if isinstance(obj, Notification):
+            pending.append((obj.user_id, notification_event(obj)))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_collected(session):
+    pending = session.info.pop(_PENDING, None)
+    if not pending:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    for user_id, payload in pending:
+        task = loop.create_task(broker.publish(user_id, payload))
+        _in_flight.add(task)
+        task.add_done_callback(_in_flight.discard)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_collected(session):
+    session.info.pop(_PENDING, None)
@@ -0,0 +1,114 @@
+"""
+Streaming exports of a doctor's panel.
+
+`export_stream` is an async generator of encoded chunks for a
+StreamingResponse: it opens its own read session, streams the query with
+`yield_per` (a server-side cursor on PostgreSQL, fetchmany on SQLite), and
+encodes and optionally gzips one partition at a time, so memory stays at
+one partition whatever the export size. Callers pass the already-checked
+patient ids from the doctor routes' access guard.
+
+  entries   every Entry of those patients, with inputs, scores and risk
+  flags     flags the doctor raised on those patients' entries
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, time
+
+from sqlalchemy import select
+
+from app.database import AsyncReadSessionLocal, Entry, Flag, User
+from app.scores import SCORE_FIELDS
+
+EXPORT_KINDS   = ("entries", "flags")
+EXPORT_FORMATS = ("csv", "ndjson")
+EXPORT_YIELD   = 1000   # rows fetched and encoded per chunk
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _entries_query(patient_ids, start, end):
+    q = (
+        select(
+            Entry.id, Entry.user_id.label("patient_id"), User.username.label("patient"),
+            Entry.created_at,
+            *(getattr(Entry, f) for f in SCORE_FIELDS),
+            Entry.fib4, Entry.apri, Entry.nfs, Entry.homa_ir,
+            Entry.risk_level, Entry.is_emergency, Entry.risk_version,
+        )
+        .join(User, User.id == Entry.user_id)
+        .where(Entry.user_id.in_(patient_ids))
+        .order_by(Entry.user_id, Entry.created_at.desc(), Entry.id.desc())
+    )
+    if start:
+        q = q.where(Entry.created_at >= datetime.combine(start, time.min))
+    if end:
+        q = q.where(Entry.created_at <= datetime.combine(end, time.max))
+    return q
+
+
+def _flags_query(doctor_id, patient_ids, start, end):
+    q = (
+        select(
+            Flag.id, Flag.entry_id, Entry.user_id.label("patient_id"),
+            User.username.label("patient"), Flag.status, Flag.note, Flag.created_at,
+            Entry.created_at.label("entry_created_at"), Entry.fib4, Entry.apri, Entry.risk_level,
+        )
+        .join(Entry, Entry.id == Flag.entry_id)
+        .join(User, User.id == Entry.user_id)
+        .where(Flag.doctor_id == doctor_id, Entry.user_id.in_(patient_ids))
+        .order_by(Flag.created_at.desc(), Flag.id.desc())
+    )
+    if start:
+        q = q.where(Flag.created_at >= datetime.combine(start, time.min))
+    if end:
+        q = q.where(Flag.created_at <= datetime.combine(end, time.max))
+    return q
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, (datetime, date)) else value
+
+
+def _encode_csv(columns, rows, header: bool) -> str:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if header:
+        writer.writerow(columns)
+    writer.writerows([_plain(v) for v in row] for row in rows)
+    return buf.getvalue()
+
+
+def _encode_ndjson(columns, rows, header: bool) -> str:
+    return "".join(
+        json.dumps(dict(zip(columns, map(_plain, row))), separators=(",", ":")) + "\n"
+        for row in rows
+    )
+
+
+async def export_stream(kind: str, fmt: str, doctor_id: int, patient_ids,
+                        start: date | None = None, end: date | None = None,
+                        gzip: bool = False, session_factory=AsyncReadSessionLocal):
+    """Yield the export as bytes, EXPORT_YIELD rows at a time."""
+    if kind == "entries":
+        stmt = _entries_query(patient_ids, start, end)
+    else:
+        stmt = _flags_query(doctor_id, patient_ids, start, end)
+    encode = _encode_csv if fmt == "csv" else _encode_ndjson
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None   # wbits 31 = gzip framing
+
+    async with session_factory() as db:
+        result = await db.stream(stmt.execution_options(yield_per=EXPORT_YIELD))
+        columns = list(result.keys())
+        header = True
+        async for rows in result.partitions():
+            data = encode(columns, rows, header).encode()
+            header = False
+            yield gz.compress(data) if gz else data
+        if header:   # no rows: a CSV still gets its header line
+            data = encode(columns, [], True).encode()
+            yield gz.compress(data) if gz else data
+    if gz:
+        yield gz.flush()
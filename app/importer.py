@@ -0,0 +1,366 @@
+"""
+Bulk import of historical lab panels.
+
+Reads CSV (or Parquet, when `pyarrow` is installed) IMPORT_CHUNK rows at a
+time, validates each chunk against the Entry columns, scores it in one
+`scores.score_batch` pass and inserts it with a single executemany in its own
+transaction, so memory holds one chunk whatever the file size. Invalid rows
+are reported and skipped; they never abort the import. Dated rows already
+stored for the same patient and created_at are skipped, so a failed import
+can be re-run. Historical rows raise no emergency alerts. Affected
+PatientSummary rows are rebuilt at the end.
+
+Columns (header names are case-insensitive):
+
+  patient_id | patient_email   the patient the panel belongs to
+  created_at                   ISO date or datetime; defaults to import time
+  age, ast, alt, platelets, albumin, bmi, diabetes, glucose, insulin
+
+    python -m app.importer labs.csv [--format csv|parquet] [--chunk-size 5000]
+                                    [--errors errors.csv]
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+from sqlalchemy import func, insert, select
+
+from app.database import Entry, SessionLocal, User
+from app.scores import SCORE_FIELDS, batch_to_rows, score_batch
+from app.summaries import rebuild_summaries
+
+IMPORT_CHUNK      = int(os.environ.get("IMPORT_CHUNK", "5000"))
+IMPORT_MAX_ERRORS = 1000   # errors kept for the report; all are counted
+
+# Accepted range per numeric field, inclusive. Wide enough for any real
+# panel, narrow enough to catch unit mix-ups and typos.
+FIELD_LIMITS = {
+    "age":       (0, 130),
+    "ast":       (0, 10_000),
+    "alt":       (0, 10_000),
+    "platelets": (0, 2_000),
+    "albumin":   (0, 10),
+    "bmi":       (5, 100),
+    "glucose":   (0, 2_000),
+    "insulin":   (0, 1_000),
+}
+_TRUE  = {"1", "true", "yes", "y", "t"}
+_FALSE = {"0", "false", "no", "n", "f", ""}
+
+
+class ImportReport:
+    """Running totals for one import; keeps the first IMPORT_MAX_ERRORS errors."""
+
+    def __init__(self, error_sink=None):
+        self.imported    = 0
+        self.rejected    = 0
+        self.duplicates  = 0
+        self.patients    = set()
+        self.errors      = []
+        self.error_count = 0
+        self._sink       = error_sink   # callable(error dict), sees every error
+
+    def error(self, row: int, column: str, message: str):
+        e = {"row": row, "column": column, "error": message}
+        self.error_count += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append(e)
+        if self._sink:
+            self._sink(e)
+
+    def as_dict(self) -> dict:
+        return {
+            "imported":    self.imported,
+            "rejected":    self.rejected,
+            "duplicates":  self.duplicates,
+            "patients":    len(self.patients),
+            "error_count": self.error_count,
+            "errors":      self.errors,
+        }
+
+
+# ── Readers: yield ({column: list of values}, rows in chunk) ────────────────
+def csv_chunks(stream, chunk_size: int = IMPORT_CHUNK):
+    """Chunks of a CSV text stream, as columns of raw strings."""
+    reader = csv.reader(stream)
+    header = [h.strip().lower() for h in next(reader, [])]
+    width = len(header)
+    rows = []
+    for row in reader:
+        if not row:
+            continue
+        rows.append(row[:width] + [""] * (width - len(row)))
+        if len(rows) == chunk_size:
+            yield dict(zip(header, map(list, zip(*rows)))), len(rows)
+            rows = []
+    if rows:
+        yield dict(zip(header, map(list, zip(*rows)))), len(rows)
+
+
+def parquet_chunks(source, chunk_size: int = IMPORT_CHUNK):
+    """Chunks of a Parquet file, one record batch at a time."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise RuntimeError("Parquet import requires the `pyarrow` package") from exc
+    for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_size):
+        columns = {name.strip().lower(): values for name, values in batch.to_pydict().items()}
+        yield columns, batch.num_rows
+
+
+# ── Validation ───────────────────────────────────────────────────────────────
+def _floats(values):
+    """Column → (float array, bad mask). Missing or unparsable cells are bad."""
+    try:
+        out = np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        out = np.empty(len(values))
+        for i, v in enumerate(values):
+            try:
+                out[i] = float(v)
+            except (TypeError, ValueError):
+                out[i] = np.nan
+    return out, ~np.isfinite(out)
+
+
+def _booleans(values):
+    out = np.zeros(len(values), dtype=bool)
+    bad = np.zeros(len(values), dtype=bool)
+    for i, v in enumerate(values):
+        if isinstance(v, bool):
+            out[i] = v
+            continue
+        text = "" if v is None else str(v).strip().lower()
+        if text in _TRUE:
+            out[i] = True
+        elif text not in _FALSE:
+            bad[i] = True
+    return out, bad
+
+
+def _timestamps(values, now: datetime):
+    """Column → (datetimes, None where blank; bad mask). Naive UTC, like Entry.created_at."""
+    out = [None] * len(values)
+    bad = np.zeros(len(values), dtype=bool)
+    latest = now + timedelta(days=1)
+    for i, v in enumerate(values):
+        if v is None or v == "":
+            continue
+        if isinstance(v, str):
+            try:
+                v = datetime.fromisoformat(v.strip())
+            except ValueError:
+                bad[i] = True
+                continue
+        elif isinstance(v, date) and not isinstance(v, datetime):
+            v = datetime.combine(v, datetime.min.time())
+        if v.tzinfo is not None:
+            v = v.astimezone(timezone.utc).replace(tzinfo=None)
+        if v > latest:
+            bad[i] = True
+        out[i] = v
+    return out, bad
+
+
+def _patient_key(patient_id, email):
+    text = str(patient_id if patient_id is not None else "").strip()
+    if text.isdigit():
+        return "id", int(text)
+    email = str(email or "").strip().lower()
+    return ("email", email) if email else None
+
+
+class _PatientResolver:
+    """Maps patient_id / patient_email cells to patient user ids, cached across chunks."""
+
+    def __init__(self, db, allowed=None):
+        self.db = db
+        self.allowed = allowed   # optional set of patient ids the caller may import for
+        self.known = {}          # ("id", 7) / ("email", "a@b") → user id or None
+
+    def _load(self, keys):
+        q = select(User.id, User.email).where(User.role == "patient")
+        ids = {v for kind, v in keys if kind == "id"}
+        emails = {v for kind, v in keys if kind == "email"}
+        if ids:
+            found = {uid for uid, _ in self.db.execute(q.where(User.id.in_(ids))).all()}
+            self.known.update({("id", uid): uid if uid in found else None for uid in ids})
+        if emails:
+            found = {email.lower(): uid for uid, email in
+                     self.db.execute(q.where(func.lower(User.email).in_(emails))).all()}
+            self.known.update({("email", e): found.get(e) for e in emails})
+
+    def resolve(self, ids, emails) -> list:
+        keys = [_patient_key(pid, email) for pid, email in zip(ids, emails)]
+        missing = {k for k in keys if k is not None and k not in self.known}
+        if missing:
+            self._load(missing)
+        out = []
+        for key in keys:
+            uid = self.known.get(key) if key else None
+            if uid is not None and self.allowed is not None and uid not in self.allowed:
+                uid = None
+            out.append(uid)
+        return out
+
+
+def validate_chunk(columns: dict, n: int, first_row: int, resolver, report, now: datetime):
+    """
+    Check one chunk against the Entry columns. Returns (keep mask, score
+    columns, user ids, created_at values with None where blank); each
+    rejected row is reported once, for its first problem.
+    """
+    bad = np.zeros(n, dtype=bool)
+    found = []
+
+    def flag(mask, column, message):
+        found.extend((first_row + int(i), column, message) for i in np.flatnonzero(mask & ~bad))
+        bad[:] |= mask
+
+    blank = [None] * n
+    user_ids = resolver.resolve(columns.get("patient_id", blank), columns.get("patient_email", blank))
+    flag(np.array([u is None for u in user_ids], dtype=bool), "patient",
+         "unknown patient, or not one of yours")
+
+    created_at, bad_ts = _timestamps(columns.get("created_at", [None] * n), now)
+    flag(bad_ts, "created_at", "not an ISO date/datetime, or in the future")
+
+    score_columns = {}
+    for field in SCORE_FIELDS:
+        if field not in columns:
+            flag(np.ones(n, dtype=bool), field, "column missing")
+            continue
+        if field == "diabetes":
+            values, bad_values = _booleans(columns[field])
+            flag(bad_values, field, "expected yes/no, true/false or 1/0")
+        else:
+            values, bad_values = _floats(columns[field])
+            flag(bad_values, field, "missing or not a number")
+            lo, hi = FIELD_LIMITS[field]
+            with np.errstate(invalid="ignore"):
+                flag((values < lo) | (values > hi), field, f"outside {lo}–{hi}")
+        score_columns[field] = values
+
+    for error in sorted(found):
+        report.error(*error)
+    keep = ~bad
+    report.rejected += int(bad.sum())
+    return keep, score_columns, user_ids, created_at
+
+
+# ── Import ───────────────────────────────────────────────────────────────────
+def _drop_duplicates(db, keep, user_ids, created_at, report):
+    """
+    Unmark dated rows already stored for the same patient and created_at, or
+    repeated earlier in the chunk. One query per chunk, over the chunk's
+    patients and time span.
+    """
+    idx = [i for i in np.flatnonzero(keep) if created_at[i] is not None]
+    if not idx:
+        return
+    stamps = [created_at[i] for i in idx]
+    existing = set(db.execute(
+        select(Entry.user_id, Entry.created_at)
+        .where(
+            Entry.user_id.in_({user_ids[i] for i in idx}),
+            Entry.created_at.between(min(stamps), max(stamps)),
+        )
+    ).all())
+    for i in idx:
+        key = (user_ids[i], created_at[i])
+        if key in existing:
+            keep[i] = False
+            report.duplicates += 1
+        else:
+            existing.add(key)
+
+
+def import_chunks(chunks, session_factory=SessionLocal, allowed_patients=None,
+                  report: ImportReport | None = None) -> ImportReport:
+    """
+    Validate, score and insert every chunk, one transaction per chunk, then
+    rebuild the affected patients' summaries. `allowed_patients` restricts
+    which patients rows may belong to (None allows any patient).
+    """
+    report = report or ImportReport()
+    now = datetime.utcnow()   # created_at of undated rows
+    first_row = 1
+    stmt = insert(Entry.__table__)
+    with session_factory() as db:
+        resolver = _PatientResolver(db, allowed_patients)
+        for columns, n in chunks:
+            keep, score_columns, user_ids, created_at = validate_chunk(
+                columns, n, first_row, resolver, report, now)
+            first_row += n
+            _drop_duplicates(db, keep, user_ids, created_at, report)
+            idx = np.flatnonzero(keep)
+            if not len(idx):
+                continue
+            scored = score_batch({k: v[idx] for k, v in score_columns.items()})
+            rows = batch_to_rows(scored)
+            for row, i in zip(rows, idx):
+                row["user_id"] = user_ids[i]
+                row["created_at"] = created_at[i] or now
+            db.execute(stmt, rows)
+            db.commit()
+            report.imported += len(rows)
+            report.patients.update(user_ids[i] for i in idx)
+        if report.patients:
+            rebuild_summaries(db, patient_ids=report.patients)
+    return report
+
+
+def import_file(source, fmt: str = "csv", chunk_size: int = IMPORT_CHUNK, **kwargs) -> ImportReport:
+    """Import a path or binary file object in `fmt` ("csv" or "parquet")."""
+    if fmt == "parquet":
+        return import_chunks(parquet_chunks(source, chunk_size), **kwargs)
+    if fmt != "csv":
+        raise ValueError(f"Unknown import format: {fmt}")
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, newline="", encoding="utf-8-sig") as f:
+            return import_chunks(csv_chunks(f, chunk_size), **kwargs)
+    text = io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
+    try:
+        return import_chunks(csv_chunks(text, chunk_size), **kwargs)
+    finally:
+        text.detach()   # leave the caller's file open
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import historical lab panels.")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=("csv", "parquet"))
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK)
+    parser.add_argument("--errors", help="write every rejected row to this CSV")
+    args = parser.parse_args(argv)
+    fmt = args.format or ("parquet" if args.path.endswith(".parquet") else "csv")
+
+    from app.database import init_db
+    init_db()
+
+    error_file = open(args.errors, "w", newline="") if args.errors else None
+    try:
+        sink = None
+        if error_file:
+            writer = csv.DictWriter(error_file, fieldnames=("row", "column", "error"))
+            writer.writeheader()
+            sink = writer.writerow
+        report = import_file(args.path, fmt, args.chunk_size, report=ImportReport(sink))
+    finally:
+        if error_file:
+            error_file.close()
+
+    print(f"imported {report.imported} rows for {len(report.patients)} patients; "
+          f"rejected {report.rejected}, skipped {report.duplicates} duplicates")
+    for e in report.errors[:20]:
+        print(f"  row {e['row']}: {e['column']}: {e['error']}", file=sys.stderr)
+    if report.error_count > 20:
+        print(f"  … {report.error_count - 20} more errors", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
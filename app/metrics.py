@@ -0,0 +1,202 @@
+"""
+Process-local instrumentation, served in the Prometheus text format by
+GET /metrics (app.routes_metrics) to holders of METRICS_TOKEN.
+
+  MetricsMiddleware   per-route latency, and per-request SQL query count and
+                      time, labelled by the route's path template
+  SQL                 engine-wide cursor events, charged to the request that
+                      ran them through a contextvar (tasks a request starts,
+                      such as streamed template loaders, inherit it)
+  templates           render time, timed by app.templating
+  bcrypt, JWT, scores timed where they run (app.routes_auth, app.auth,
+                      save_score)
+
+With METRICS_DEBUG=1 every request over QUERY_BUDGET queries is logged with
+its most repeated statement, which is usually an N+1.
+"""
+import contextvars
+import logging
+import os as _os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from threading import Lock
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS_DEBUG = _os.environ.get("METRICS_DEBUG", "0") == "1"
+QUERY_BUDGET  = int(_os.environ.get("QUERY_BUDGET", "15"))   # queries per request, with METRICS_DEBUG
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)   # seconds
+QUERY_BUCKETS   = (0, 1, 2, 5, 10, 15, 25, 50, 100, 250)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger("hepacheck.metrics")
+
+_registry = []
+
+
+# ── Histograms ────────────────────────────────────────────────────────────────
+class Histogram:
+    """Cumulative-bucket histogram with a fixed label set, Prometheus style."""
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name    = name
+        self.help    = help
+        self.labels  = labels
+        self.buckets = buckets
+        self._series = {}   # label values -> [count per bucket..., sum, count]
+        self._lock   = Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *label_values)
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((k, list(v)) for k, v in self._series.items())
+        for label_values, values in series:
+            labels = list(zip(self.labels, label_values))
+            for bound, n in zip(self.buckets, values):
+                lines.append(f"{self.name}_bucket{_labels(labels + [('le', bound)])} {n}")
+            lines.append(f"{self.name}_bucket{_labels(labels + [('le', '+Inf')])} {values[-1]}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {values[-2]:.6f}")
+            lines.append(f"{self.name}_count{_labels(labels)} {values[-1]}")
+        return lines
+
+
+def _labels(pairs) -> str:
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def family(name: str, kind: str, help: str, samples: dict) -> list[str]:
+    """Exposition lines for a gauge or counter; `samples` maps ((label, value), ...) to a number."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, value in samples.items():
+        if value is not None:
+            lines.append(f"{name}{_labels(labels)} {value}")
+    return lines
+
+
+def render(extra: list = ()) -> str:
+    """Every registered histogram, then `extra` lines, in the text exposition format."""
+    lines = [line for h in _registry for line in h.expose()]
+    return "\n".join(lines + list(extra)) + "\n"
+
+
+REQUEST_SECONDS  = Histogram("hepacheck_http_request_duration_seconds",
+                             "Time from request to last body byte.", ("method", "route", "status"))
+REQUEST_QUERIES  = Histogram("hepacheck_http_request_queries",
+                             "SQL statements executed per request.", ("route",), QUERY_BUCKETS)
+REQUEST_SQL      = Histogram("hepacheck_http_request_sql_seconds",
+                             "Time spent in SQL statements per request.", ("route",))
+TEMPLATE_SECONDS = Histogram("hepacheck_template_render_seconds",
+                             "Template render time; streamed renders exclude their loaders' SQL.",
+                             ("template",))
+BCRYPT_SECONDS   = Histogram("hepacheck_bcrypt_seconds", "bcrypt time per call, on the hash pool.",
+                             ("op",), (0.05, 0.1, 0.2, 0.3, 0.5, 1, 2.5))
+JWT_SECONDS      = Histogram("hepacheck_jwt_decode_seconds", "JWT verification on auth cache misses.",
+                             buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01))
+SCORE_SECONDS    = Histogram("hepacheck_score_seconds", "score_entry time in save_score.",
+                             buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.01))
+
+
+# ── Per-request SQL accounting ────────────────────────────────────────────────
+class RequestStats:
+    __slots__ = ("queries", "sql_seconds", "statements")
+
+    def __init__(self):
+        self.queries     = 0
+        self.sql_seconds = 0.0
+        self.statements  = Counter() if METRICS_DEBUG else None
+
+
+_current = contextvars.ContextVar("hepacheck_request_stats", default=None)
+
+
+def current_sql_seconds() -> float:
+    """SQL time charged to the current request so far (0 outside one)."""
+    stats = _current.get()
+    return stats.sql_seconds if stats else 0.0
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context.hepacheck_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_seconds += time.perf_counter() - context.hepacheck_started
+        if stats.statements is not None:
+            stats.statements[statement] += 1
+
+
+# ── Middleware ────────────────────────────────────────────────────────────────
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app     = app
+        self._routes = None   # endpoint -> path template, built on first request
+
+    def _route(self, scope) -> str:
+        if self._routes is None:
+            self._routes = {}
+            for route in scope["app"].routes:
+                self._routes[getattr(route, "endpoint", None) or route.app] = route.path
+        return self._routes.get(scope.get("endpoint"), "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+
+        async def wrapped_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            elapsed = time.perf_counter() - t0
+            _current.reset(token)
+            route = self._route(scope)
+            REQUEST_SECONDS.observe(elapsed, scope["method"], route, str(status))
+            REQUEST_QUERIES.observe(stats.queries, route)
+            REQUEST_SQL.observe(stats.sql_seconds, route)
+            if stats.statements is not None and stats.queries > QUERY_BUDGET:
+                statement, repeats = stats.statements.most_common(1)[0]
+                logger.warning(
+                    "%s %s ran %d queries (budget %d); %d× %s",
+                    scope["method"], scope["path"], stats.queries, QUERY_BUDGET,
+                    repeats, " ".join(statement.split())[:300],
+                )
@@ -0,0 +1,98 @@
+"""
+Notification writes that keep User.unread_notifications in step.
+
+Every insert and every read-marking goes through here, in the caller's
+transaction, so dashboards read one integer instead of counting rows.
+`database.reconcile_unread_counts` repairs any drift
+(python -m app.recompute unread-counts).
+"""
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select, update
+
+from app.database import Notification, User
+
+NOTIFICATION_PAGE_SIZE      = 20
+NOTIFICATION_MAX_PAGE       = 100
+MARK_READ_BATCH             = 500
+NOTIFICATION_RETENTION_DAYS = int(os.environ.get("NOTIFICATION_RETENTION_DAYS", "90"))
+
+
+async def notify(db, user_id: int, message: str, kind: str = "info") -> Notification:
+    """Queue a notification for `user_id` and bump their unread counter. Caller commits."""
+    notification = Notification(user_id=user_id, message=message, kind=kind)
+    db.add(notification)
+    await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(unread_notifications=User.unread_notifications + 1)
+    )
+    return notification
+
+
+async def unread_count(db, user_id: int) -> int:
+    return await db.scalar(select(User.unread_notifications).where(User.id == user_id)) or 0
+
+
+async def mark_read(db, user_id: int, ids) -> int:
+    """
+    Mark up to MARK_READ_BATCH of `user_id`'s notifications read and lower the
+    counter by the rows that actually changed. Caller commits.
+    """
+    ids = list(ids)[:MARK_READ_BATCH]
+    if not ids:
+        return 0
+    changed = (await db.execute(
+        update(Notification)
+        .where(
+            Notification.user_id == user_id,
+            Notification.id.in_(ids),
+            Notification.is_read == False,
+        )
+        .values(is_read=True)
+    )).rowcount
+    if changed:
+        await db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(unread_notifications=User.unread_notifications - changed)
+        )
+    return changed
+
+
+async def mark_all_read(db, user_id: int) -> int:
+    """Mark every unread notification read, one committed batch at a time."""
+    total = 0
+    while True:
+        ids = (await db.scalars(
+            select(Notification.id)
+            .where(Notification.user_id == user_id, Notification.is_read == False)
+            .limit(MARK_READ_BATCH)
+        )).all()
+        if not ids:
+            return total
+        total += await mark_read(db, user_id, ids)
+        await db.commit()
+
+
+def prune_notifications(db, days: int = NOTIFICATION_RETENTION_DAYS,
+                        batch_size: int = 5000) -> int:
+    """
+    Delete read notifications older than `days`, in short batches (sync
+    session; used by app.recompute). Unread rows are kept whatever their age,
+    so the counters never need adjusting. Returns rows deleted.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    total = 0
+    while True:
+        ids = db.scalars(
+            select(Notification.id)
+            .where(Notification.is_read == True, Notification.created_at < cutoff)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            return total
+        db.execute(delete(Notification).where(Notification.id.in_(ids)))
+        db.commit()
+        total += len(ids)
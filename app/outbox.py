@@ -0,0 +1,316 @@
+"""
+Transactional outbox.
+
+Request handlers `enqueue()` an OutboxMessage in the same transaction as the
+write that caused it, and return. `OutboxDispatcher` runs in the background,
+claims due messages in batches, hands each batch to every configured sink,
+and marks it sent — or schedules a retry with exponential backoff, giving up
+after OUTBOX_MAX_ATTEMPTS. Sent rows are deleted after OUTBOX_RETENTION_DAYS
+by `prune_outbox` (python -m app.recompute prune-outbox); dead letters stay.
+
+Delivery is at-least-once: a sink may see the same message again after a
+crash or a failure in a later sink, and should dedupe on `key` (the
+message's idempotency key). Sinks that write through the dispatcher's
+session, like NotificationSink, commit together with the "sent" mark and so
+run exactly once.
+
+Sinks are chosen by OUTBOX_SINKS, a comma-separated list:
+
+  notification   in-app Notification to the patient's doctor (default)
+  log            one log line per message
+  file:<path>    one JSON line per message appended to <path>
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event, func, select, update
+from sqlalchemy.orm import Session
+
+from app.database import AsyncSessionLocal, OutboxMessage, PatientDoctor
+from app.notifications import notify
+
+logger = logging.getLogger("hepacheck.outbox")
+
+OUTBOX_SINKS          = os.environ.get("OUTBOX_SINKS", "notification")
+OUTBOX_BATCH          = int(os.environ.get("OUTBOX_BATCH", "100"))
+OUTBOX_MAX_ATTEMPTS   = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_POLL_SECONDS   = float(os.environ.get("OUTBOX_POLL_SECONDS", "2"))
+OUTBOX_LEASE_SECONDS  = float(os.environ.get("OUTBOX_LEASE_SECONDS", "60"))
+OUTBOX_BACKOFF_CAP    = 300   # seconds between retries, at most
+OUTBOX_RETENTION_DAYS = int(os.environ.get("OUTBOX_RETENTION_DAYS", "30"))   # for sent rows
+
+
+def enqueue(db, topic: str, key: str, payload: dict) -> OutboxMessage:
+    """Add a message to the caller's transaction. Caller commits."""
+    message = OutboxMessage(topic=topic, idempotency_key=key, payload=json.dumps(payload))
+    db.add(message)
+    return message
+
+
+def prune_outbox(db, days: int = OUTBOX_RETENTION_DAYS, batch_size: int = 5000) -> int:
+    """
+    Delete messages sent more than `days` ago, in short batches (sync
+    session; used by app.recompute). Pending and failed rows are never
+    pruned. Returns rows deleted.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    total = 0
+    while True:
+        ids = db.scalars(
+            select(OutboxMessage.id)
+            .where(OutboxMessage.status == "sent", OutboxMessage.sent_at < cutoff)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            return total
+        db.execute(delete(OutboxMessage).where(OutboxMessage.id.in_(ids)))
+        db.commit()
+        total += len(ids)
+
+
+def _as_dict(m: OutboxMessage) -> dict:
+    return {
+        "id":         m.id,
+        "topic":      m.topic,
+        "key":        m.idempotency_key,
+        "payload":    json.loads(m.payload),
+        "attempt":    m.attempts,
+        "created_at": m.created_at.isoformat(),
+    }
+
+
+# ── Sinks ────────────────────────────────────────────────────────────────────
+class NotificationSink:
+    """Emergency alerts become in-app notifications (and SSE pushes) for the assigned doctor."""
+
+    async def deliver(self, messages: list, db):
+        alerts = [m for m in messages if m["topic"] == "emergency_alert"]
+        if not alerts:
+            return
+        doctors = dict((await db.execute(
+            select(PatientDoctor.patient_id, PatientDoctor.doctor_id)
+            .where(PatientDoctor.patient_id.in_({m["payload"]["patient_id"] for m in alerts}))
+        )).all())
+        for m in alerts:
+            p = m["payload"]
+            doctor_id = doctors.get(p["patient_id"])
+            if doctor_id is None:
+                continue
+            await notify(
+                db, doctor_id,
+                f"⚠️ High-risk entry from {p['patient']}: "
+                f"FIB-4={round(p['fib4'], 2)}, APRI={p['apri']}, NFS={p['nfs']}.",
+                kind="emergency",
+            )
+
+
+class LogSink:
+    async def deliver(self, messages: list, db):
+        for m in messages:
+            logger.warning("outbox %s %s %s", m["topic"], m["key"], json.dumps(m["payload"]))
+
+
+class FileSink:
+    """Appends one JSON line per message; handy for tests and local runs."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _write(self, lines: list):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+
+    async def deliver(self, messages: list, db):
+        lines = [json.dumps(m) + "\n" for m in messages]
+        await asyncio.to_thread(self._write, lines)
+
+
+def make_sinks(spec: str = OUTBOX_SINKS) -> list:
+    sinks = []
+    for name in filter(None, (s.strip() for s in spec.split(","))):
+        if name == "notification":
+            sinks.append(NotificationSink())
+        elif name == "log":
+            sinks.append(LogSink())
+        elif name.startswith("file:"):
+            sinks.append(FileSink(name[len("file:"):]))
+        else:
+            raise ValueError(f"Unknown outbox sink: {name}")
+    return sinks
+
+
+# ── Dispatcher ───────────────────────────────────────────────────────────────
+_running = set()   # started dispatchers, woken on commit
+
+
+class OutboxDispatcher:
+    def __init__(self, session_factory=AsyncSessionLocal, sinks=None,
+                 batch_size: int = OUTBOX_BATCH, poll_seconds: float = OUTBOX_POLL_SECONDS):
+        self.session_factory = session_factory
+        self.sinks        = make_sinks() if sinks is None else sinks
+        self.batch_size   = batch_size
+        self.poll_seconds = poll_seconds
+        self.sent = self.failed = self.retried = 0
+        self._latencies_ms = deque(maxlen=1000)   # enqueue → sent, recent messages
+        self._wakeup = asyncio.Event()
+        self._task   = None
+
+    # lifecycle
+    def start(self):
+        if self._task is None:
+            _running.add(self)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        _running.discard(self)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                handled = await self.dispatch_once()
+            except Exception:
+                logger.exception("outbox dispatch failed")
+                handled = 0
+            if handled < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def dispatch_once(self) -> int:
+        """Claim and deliver one batch; returns how many messages were claimed."""
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            due = (await db.scalars(
+                select(OutboxMessage.id)
+                .where(OutboxMessage.status == "pending", OutboxMessage.next_attempt_at <= now)
+                .order_by(OutboxMessage.id)
+                .limit(self.batch_size)
+            )).all()
+            if not due:
+                return 0
+            # Pushing next_attempt_at out by the lease claims the rows: other
+            # dispatchers skip them, and a crash mid-delivery only delays them.
+            claimed = (await db.scalars(
+                update(OutboxMessage)
+                .where(
+                    OutboxMessage.id.in_(due),
+                    OutboxMessage.status == "pending",
+                    OutboxMessage.next_attempt_at <= now,
+                )
+                .values(
+                    next_attempt_at=now + timedelta(seconds=OUTBOX_LEASE_SECONDS),
+                    attempts=OutboxMessage.attempts + 1,
+                )
+                .returning(OutboxMessage)
+            )).all()
+            await db.commit()
+            if not claimed:
+                return 0
+
+            messages = [_as_dict(m) for m in claimed]
+            ids = [m["id"] for m in messages]
+            created = [m.created_at for m in claimed]   # rollback would expire `claimed`
+            try:
+                for sink in self.sinks:
+                    await sink.deliver(messages, db)
+                sent_at = datetime.utcnow()
+                await db.execute(
+                    update(OutboxMessage)
+                    .where(OutboxMessage.id.in_(ids))
+                    .values(status="sent", sent_at=sent_at, last_error=None)
+                )
+                await db.commit()
+            except Exception as exc:
+                await db.rollback()
+                await self._schedule_retry(db, messages, exc)
+                return len(messages)
+
+        self.sent += len(messages)
+        self._latencies_ms.extend(
+            (sent_at - c).total_seconds() * 1000 for c in created
+        )
+        return len(messages)
+
+    async def _schedule_retry(self, db, messages: list, exc: Exception):
+        logger.warning("outbox batch of %d failed: %r", len(messages), exc)
+        now = datetime.utcnow()
+        for m in messages:
+            if m["attempt"] >= OUTBOX_MAX_ATTEMPTS:
+                values = {"status": "failed"}
+                self.failed += 1
+            else:
+                delay = min(OUTBOX_BACKOFF_CAP, 2 ** m["attempt"])
+                values = {"next_attempt_at": now + timedelta(seconds=delay)}
+                self.retried += 1
+            await db.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.id == m["id"])
+                .values(last_error=repr(exc)[:1000], **values)
+            )
+        await db.commit()
+
+    async def metrics(self) -> dict:
+        async with self.session_factory() as db:
+            depth = dict((await db.execute(
+                select(OutboxMessage.status, func.count(OutboxMessage.id))
+                .where(OutboxMessage.status != "sent")
+                .group_by(OutboxMessage.status)
+            )).all())
+            oldest = await db.scalar(
+                select(func.min(OutboxMessage.created_at))
+                .where(OutboxMessage.status == "pending")
+            )
+        latencies = sorted(self._latencies_ms)
+
+        def pct(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 1) if latencies else None
+
+        return {
+            "queue_depth":          depth.get("pending", 0),
+            "dead_letters":         depth.get("failed", 0),
+            "oldest_pending_age_s": round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else 0,
+            "sent":                 self.sent,
+            "retried":              self.retried,
+            "failed":               self.failed,
+            "dispatch_latency_ms":  {"p50": pct(0.50), "p95": pct(0.95), "max": pct(1.0)},
+        }
+
+
+dispatcher = OutboxDispatcher()
+
+
+# ── Wake the dispatcher on commit ────────────────────────────────────────────
+# Polling is only the fallback: a commit that enqueued anything wakes every
+# dispatcher in this process straight away.
+@event.listens_for(Session, "after_flush")
+def _note_enqueued(session, _flush_context):
+    if any(isinstance(obj, OutboxMessage) for obj in session.new):
+        session.info["outbox_enqueued"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_dispatchers(session):
+    if session.info.pop("outbox_enqueued", False):
+        for d in _running:
+            d.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_enqueued(session):
+    session.info.pop("outbox_enqueued", None)
@@ -0,0 +1,28 @@
+"""
+Keyset (cursor) pagination over (created_at, id), newest first.
+Cursors are opaque strings of the form "<created_at ISO>_<id>".
+"""
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    return f"{created_at.isoformat()}_{row_id}"
+
+
+def decode_cursor(cursor: str | None):
+    """Return (created_at, id) for a cursor, or None if missing/malformed."""
+    if not cursor:
+        return None
+    created_at, _, row_id = cursor.rpartition("_")
+    try:
+        return datetime.fromisoformat(created_at), int(row_id)
+    except ValueError:
+        return None
+
+
+def before_cursor(created_col, id_col, cursor):
+    """SQL condition selecting rows strictly older than `cursor` in (created_at, id) order."""
+    ts, last_id = cursor
+    return or_(created_col < ts, and_(created_col == ts, id_col < last_id))
@@ -0,0 +1,129 @@
+"""
+Maintenance jobs that recompute derived data.
+
+  risk           Re-classify stored entries after the risk-rule table changes.
+                 Only rows whose `risk_version` is behind
+                 `scores.CURRENT_RISK_VERSION` are touched, a batch at a time in
+                 short transactions, so the job can be interrupted and resumed
+                 and never rewrites the whole table.
+                 Patient summaries are rebuilt afterwards, since their risk
+                 bucket counts follow the stored risk_level.
+  post-counters  Repair drift in CommunityPost.like_count / reply_count.
+  summaries      Rebuild every PatientSummary row from Entry.
+  unread-counts  Repair drift in User.unread_notifications.
+  prune-notifications
+                 Delete read notifications older than --days
+                 (NOTIFICATION_RETENTION_DAYS, default 90). Meant for a daily
+                 cron; unread notifications are never pruned.
+  prune-outbox   Delete outbox messages sent more than --days ago
+                 (OUTBOX_RETENTION_DAYS, default 30). Daily cron as well;
+                 pending messages and dead letters are kept.
+
+    python -m app.recompute [risk|post-counters|summaries|unread-counts|prune-notifications|prune-outbox]
+                            [--batch-size 5000] [--days N]
+"""
+import argparse
+
+from sqlalchemy import bindparam, select, update
+
+from app.database import (
+    SessionLocal, Entry, engine, init_db,
+    reconcile_post_counters, reconcile_unread_counts,
+)
+from app.notifications import NOTIFICATION_RETENTION_DAYS, prune_notifications
+from app.outbox import OUTBOX_RETENTION_DAYS, prune_outbox
+from app.scores import CURRENT_RISK_VERSION, classify_risk_batch
+from app.summaries import rebuild_summaries
+
+
+def reclassify_entries(db, batch_size: int = 5000, version: int = CURRENT_RISK_VERSION) -> int:
+    """Bring every entry up to rule-table `version`; returns rows updated."""
+    stmt = (
+        update(Entry.__table__)
+        .where(Entry.__table__.c.id == bindparam("_id"))
+        .values(
+            risk_level=bindparam("risk_level"),
+            is_emergency=bindparam("is_emergency"),
+            risk_version=bindparam("risk_version"),
+        )
+    )
+    total = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(Entry.id, Entry.fib4, Entry.apri)
+            .where(Entry.risk_version != version, Entry.id > last_id)
+            .order_by(Entry.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return total
+
+        ids, fib4, apri = zip(*rows)
+        risk_level, is_emergency = classify_risk_batch(fib4, apri, version)
+        db.execute(stmt, [
+            {"_id": i, "risk_level": r, "is_emergency": e, "risk_version": version}
+            for i, r, e in zip(ids, risk_level.tolist(), is_emergency.tolist())
+        ])
+        db.commit()
+        total += len(ids)
+        last_id = ids[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute derived HepaCheck data.")
+    parser.add_argument("job", nargs="?", default="risk", choices=[
+        "risk", "post-counters", "summaries", "unread-counts", "prune-notifications", "prune-outbox",
+    ])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--days", type=int, help="retention for the prune jobs; default from the environment")
+    args = parser.parse_args()
+
+    init_db()
+    if args.job == "post-counters":
+        with engine.begin() as conn:
+            n = reconcile_post_counters(conn)
+        print(f"Corrected counters on {n} posts.")
+        return
+    if args.job == "unread-counts":
+        with engine.begin() as conn:
+            n = reconcile_unread_counts(conn)
+        print(f"Corrected unread counters on {n} users.")
+        return
+    if args.job == "prune-notifications":
+        days = NOTIFICATION_RETENTION_DAYS if args.days is None else args.days
+        db = SessionLocal()
+        try:
+            n = prune_notifications(db, days, args.batch_size)
+        finally:
+            db.close()
+        print(f"Pruned {n} read notifications older than {days} days.")
+        return
+    if args.job == "prune-outbox":
+        days = OUTBOX_RETENTION_DAYS if args.days is None else args.days
+        db = SessionLocal()
+        try:
+            n = prune_outbox(db, days, args.batch_size)
+        finally:
+            db.close()
+        print(f"Pruned {n} sent outbox messages older than {days} days.")
+        return
+
+    if args.job == "summaries":
+        with SessionLocal() as db:
+            n = rebuild_summaries(db)
+        print(f"Rebuilt {n} patient summaries.")
+        return
+
+    db = SessionLocal()
+    try:
+        n = reclassify_entries(db, args.batch_size)
+        if n:
+            rebuild_summaries(db)
+    finally:
+        db.close()
+    print(f"Re-classified {n} entries to risk rules v{CURRENT_RISK_VERSION}.")
+
+
+if __name__ == "__main__":
+    main()
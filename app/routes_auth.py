@@ -1,23 +1,60 @@
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
 from fastapi import APIRouter, Depends, Form, Request
+from fastapi.exceptions import HTTPException
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from passlib.context import CryptContext
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
 
-from app.database import get_db, User, DoctorProfile
+from app.database import get_async_db, User, DoctorProfile
+from app.auth import auth_cache
+from app.metrics import BCRYPT_SECONDS
+from app.templating import templates
 
 router = APIRouter()
 
-# backend/app/routes_auth.py  →  go up two levels to backend/  →  then templates/
-_HERE = os.path.dirname(os.path.abspath(__file__))
-_BACKEND = os.path.dirname(_HERE)
-templates = Jinja2Templates(directory=os.path.join(_BACKEND, "templates"))
-
 pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt costs ~250 ms of CPU per call, so it runs on a small dedicated pool
+# instead of the event loop. At most HASH_WORKERS + HASH_MAX_PENDING calls may
+# be in flight; beyond that requests fail fast with 503 rather than queueing.
+HASH_WORKERS     = int(os.environ.get("HASH_WORKERS", "4"))
+HASH_MAX_PENDING = int(os.environ.get("HASH_MAX_PENDING", "32"))
+
+_hash_pool  = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_slots = BoundedSemaphore(HASH_WORKERS + HASH_MAX_PENDING)
+
+
+async def _run_hasher(fn, *args):
+    if not _hash_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=503,
+            detail="Too many sign-in attempts in progress. Please retry shortly.",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_pool, _timed, fn, *args)
+    finally:
+        _hash_slots.release()
+
+
+def _timed(fn, *args):
+    with BCRYPT_SECONDS.time(fn.__name__):   # on the pool thread: excludes queueing
+        return fn(*args)
+
+
+async def hash_password(password: str) -> str:
+    return await _run_hasher(pwd_ctx.hash, password)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await _run_hasher(pwd_ctx.verify, password, hashed)
+
 SECRET_KEY = os.environ.get("SECRET_KEY", "hepacheck-dev-secret-change-in-prod")
 ALGORITHM  = "HS256"
 TOKEN_TTL  = 60 * 24  # minutes
@@ -53,11 +90,15 @@ async def login(
     email:    str = Form(...),
     password: str = Form(...),
     role:     str = Form(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    user = db.query(User).filter(User.email == email.strip().lower()).first()
+    user = (await db.execute(
+        select(User.id, User.password, User.role)
+        .where(User.email == email.strip().lower())
+    )).first()
+    await db.rollback()   # hand the pooled connection back while bcrypt runs
 
-    if not user or not pwd_ctx.verify(password, user.password):
+    if not user or not await verify_password(password, user.password):
         return templates.TemplateResponse("login.html", {
             "request": request,
             "error": "Invalid email or password.",
@@ -91,11 +132,11 @@ async def register_patient(
     username: str = Form(...),
     email:    str = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     email = email.strip().lower()
 
-    if db.query(User).filter(User.email == email).first():
+    if await db.scalar(select(User.id).where(User.email == email)):
         return templates.TemplateResponse("register.html", {
             "request": request,
             "error": "An account with this email already exists.",
@@ -109,11 +150,11 @@ async def register_patient(
             "prefill": {"username": username, "email": email, "role": "patient"},
         })
 
-    hashed = pwd_ctx.hash(password)
+    await db.rollback()   # hand the pooled connection back while bcrypt runs
+    hashed = await hash_password(password)
     user = User(username=username.strip(), email=email, password=hashed, role="patient")
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
 
     token = create_token(user.id, "patient")
     response = RedirectResponse("/patient/home", status_code=303)
@@ -135,7 +176,7 @@ async def register_doctor(
     clinic_hospital:  str = Form(default=""),
     city:             str = Form(default=""),
     bio:              str = Form(default=""),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     email = email.strip().lower()
 
@@ -146,7 +187,7 @@ async def register_doctor(
         "clinic_hospital": clinic_hospital, "city": city, "bio": bio,
     }
 
-    if db.query(User).filter(User.email == email).first():
+    if await db.scalar(select(User.id).where(User.email == email)):
         return templates.TemplateResponse("register.html", {
             "request": request,
             "error": "An account with this email already exists.",
@@ -168,10 +209,11 @@ async def register_doctor(
             "prefill": prefill,
         })
 
-    hashed = pwd_ctx.hash(password)
+    await db.rollback()   # hand the pooled connection back while bcrypt runs
+    hashed = await hash_password(password)
     user = User(username=username.strip(), email=email, password=hashed, role="doctor")
     db.add(user)
-    db.flush()
+    await db.flush()
 
     profile = DoctorProfile(
         user_id          = user.id,
@@ -185,8 +227,7 @@ async def register_doctor(
         is_verified      = False,
     )
     db.add(profile)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
 
     token = create_token(user.id, "doctor")
     response = RedirectResponse("/doctor/home", status_code=303)
@@ -196,8 +237,11 @@ async def register_doctor(
 
 # ── GET /logout ───────────────────────────────────────────────────────────────
 @router.get("/logout")
-async def logout():
+async def logout(request: Request):
     """Always deletes the cookie and hard-redirects to /login."""
+    token = request.cookies.get("access_token")
+    if token:
+        auth_cache.invalidate_token(token)
     response = RedirectResponse(url="/login", status_code=303)
     response.delete_cookie("access_token")
     return response
\ No newline at end of file
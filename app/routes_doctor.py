@@ -1,100 +1,240 @@
-from fastapi import APIRouter, Depends, Form, Request, status
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from datetime import date
 
-from app.database import get_db, User, Entry, Flag, Notification, PatientDoctor
-from app.auth import require_role
+from fastapi import APIRouter, Depends, File, Form, Request, UploadFile, status
+from fastapi.exceptions import HTTPException
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, joinedload
+
+from app.database import (
+    get_async_db, get_async_read_db, get_read_session_factory,
+    User, Entry, Flag, PatientDoctor, PatientSummary,
+)
+from app.auth import UserSnapshot, current_user
+from app.etags import doctor_home_stamp, make_etag, not_modified, tag
+from app.exporter import EXPORT_FORMATS, EXPORT_KINDS, MEDIA_TYPES, export_stream
+from app.importer import import_file
+from app.notifications import mark_all_read, notify
+from app.pagination import before_cursor, decode_cursor, encode_cursor
+from app.templating import StreamingTemplateResponse, once, templates
+from app.trends import TREND_POINTS, patient_trends
 
-import os as _os
 router = APIRouter(prefix="/doctor")
-_BACKEND = _os.path.dirname(_os.path.dirname(_os.path.abspath(__file__)))
-templates = Jinja2Templates(directory=_os.path.join(_BACKEND, "templates"))
 
 
-def _get_doctor(request: Request, db: Session) -> User:
-    payload = require_role(request, "doctor")
-    user = db.query(User).filter(User.id == int(payload["sub"])).first()
-    if not user:
-        raise Exception("Doctor not found")
-    return user
+async def _get_doctor(request: Request, db: AsyncSession) -> UserSnapshot:
+    return await current_user(request, db, "doctor")
 
 
-def _get_assigned_patient_ids(doctor: User, db: Session) -> list[int]:
+async def _get_assigned_patient_ids(doctor: UserSnapshot, db: AsyncSession) -> list[int]:
     """Return list of patient user IDs assigned to this doctor."""
-    assignments = (
-        db.query(PatientDoctor)
-        .filter(PatientDoctor.doctor_id == doctor.id)
-        .all()
+    return list(await db.scalars(
+        select(PatientDoctor.patient_id).where(PatientDoctor.doctor_id == doctor.id)
+    ))
+
+
+ENTRIES_PAGE_SIZE = 8
+EMERGENCY_LIMIT   = 20
+DETAIL_PAGE_SIZE  = 25   # entries per page of a patient's history table
+
+
+async def _entries_page(doctor: UserSnapshot, db: AsyncSession, cursor, limit: int = ENTRIES_PAGE_SIZE):
+    """
+    One keyset page of the doctor's patients' entries, newest first on
+    (created_at, id). Each patient contributes at most limit + 1 candidates
+    through a correlated LIMIT subquery that walks ix_entries_user_created, so
+    the page costs O(patients × limit) regardless of how much history exists.
+    Returns (entries, next_cursor).
+    """
+    e2 = aliased(Entry)
+    per_patient = (
+        select(e2.id)
+        .where(e2.user_id == PatientDoctor.patient_id)
+        .order_by(e2.created_at.desc(), e2.id.desc())
+        .limit(limit + 1)
     )
-    return [a.patient_id for a in assignments]
+    if cursor:
+        per_patient = per_patient.where(before_cursor(e2.created_at, e2.id, cursor))
+
+    entries = (await db.scalars(
+        select(Entry)
+        .select_from(PatientDoctor)
+        .join(Entry, Entry.id.in_(per_patient.correlate(PatientDoctor)))
+        .where(PatientDoctor.doctor_id == doctor.id)
+        .options(joinedload(Entry.user))
+        .order_by(Entry.created_at.desc(), Entry.id.desc())
+        .limit(limit + 1)
+    )).all()
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        last = entries[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return entries, next_cursor
+
+
+async def _patient_overview(doctor: UserSnapshot, db: AsyncSession):
+    """
+    Assigned patients with their PatientSummary row (absent until a patient's
+    first entry). Returns (patients, summaries by patient id).
+    """
+    rows = (await db.execute(
+        select(User, PatientSummary)
+        .join(PatientDoctor, PatientDoctor.patient_id == User.id)
+        .outerjoin(PatientSummary, PatientSummary.patient_id == User.id)
+        .where(PatientDoctor.doctor_id == doctor.id)
+    )).all()
+    patients = [u for u, _ in rows]
+    summaries = {u.id: s for u, s in rows if s is not None}
+    return patients, summaries
+
+
+# Patient-list pill from the latest FIB-4: (upper bound, css class, label)
+_FIB4_PILLS = ((1.30, "low", "Low Risk"), (2.67, "moderate", "Moderate"), (float("inf"), "high", "High Risk"))
+
+
+def _initials(name: str) -> str:
+    words = name.split()
+    return (words[0][0] + words[1][0]).upper() if len(words) >= 2 else name[:2].upper()
+
+
+def _patient_rows(patients, summaries: dict) -> list[dict]:
+    """Everything the patient list shows per patient, resolved once here."""
+    rows = []
+    for p in patients:
+        summary = summaries.get(p.id)
+        pill = None
+        if summary and summary.fib4 is not None:
+            pill = next(x for x in _FIB4_PILLS if summary.fib4 < x[0])
+        rows.append({
+            "patient":  p,
+            "summary":  summary,
+            "initials": _initials(p.username),
+            "pill":     pill[1] if pill else None,
+            "label":    pill[2] if pill else None,
+        })
+    return rows
+
+
+def _risk_distribution(summaries: dict) -> dict:
+    """Entries per stored risk_level across the doctor's patients, with whole percentages."""
+    counts = {
+        "low":      sum(s.low_count for s in summaries.values()),
+        "moderate": sum(s.moderate_count for s in summaries.values()),
+        "high":     sum(s.high_count for s in summaries.values()),
+    }
+    total = sum(counts.values())
+    return {
+        "total": total,
+        **counts,
+        "pct": {k: round(v * 100 / total) if total else 0 for k, v in counts.items()},
+    }
 
 
 # ── Home ──────────────────────────────────────────────────────────────────────
-@router.get("/home", response_class=HTMLResponse)
-async def doctor_home(request: Request, db: Session = Depends(get_db)):
-    doctor = _get_doctor(request, db)
-    patient_ids = _get_assigned_patient_ids(doctor, db)
-
-    # Only patients assigned to THIS doctor
-    patients = (
-        db.query(User)
-        .filter(User.id.in_(patient_ids))
-        .all()
-    ) if patient_ids else []
-
-    # Only entries from assigned patients, newest first
-    entries = (
-        db.query(Entry)
-        .join(User, Entry.user_id == User.id)
-        .filter(Entry.user_id.in_(patient_ids))
-        .order_by(Entry.created_at.desc())
-        .all()
-    ) if patient_ids else []
+async def _home_panels(doctor: UserSnapshot, db: AsyncSession, cursor) -> dict:
+    """The home tab's KPIs, entries page, emergencies and open flags."""
+    # One keyset page of entries from assigned patients, newest first
+    entries, next_cursor = await _entries_page(doctor, db, cursor)
 
     # Emergency entries with no open flag yet
-    flagged_entry_ids = {
-        f.entry_id
-        for f in db.query(Flag)
-        .filter(Flag.status == "open", Flag.entry_id.in_([e.id for e in entries]))
-        .all()
-    }
-    emergencies = [e for e in entries if e.is_emergency and e.id not in flagged_entry_ids]
+    open_flag_exists = (
+        select(Flag.id)
+        .where(Flag.entry_id == Entry.id, Flag.status == "open")
+        .exists()
+    )
+    emergency_filter = (
+        PatientDoctor.doctor_id == doctor.id,
+        Entry.is_emergency == True,
+        ~open_flag_exists,
+    )
+    emergency_count = await db.scalar(
+        select(func.count(Entry.id))
+        .join(PatientDoctor, PatientDoctor.patient_id == Entry.user_id)
+        .where(*emergency_filter)
+    )
+    emergencies = (await db.scalars(
+        select(Entry)
+        .join(PatientDoctor, PatientDoctor.patient_id == Entry.user_id)
+        .where(*emergency_filter)
+        .options(joinedload(Entry.user))
+        .order_by(Entry.created_at.desc(), Entry.id.desc())
+        .limit(EMERGENCY_LIMIT)
+    )).all()
 
     # Open flags raised by this doctor on assigned patients
-    open_flags = (
-        db.query(Flag)
-        .filter(Flag.doctor_id == doctor.id, Flag.status == "open")
+    open_flags = (await db.scalars(
+        select(Flag)
+        .where(Flag.doctor_id == doctor.id, Flag.status == "open")
+        .options(joinedload(Flag.entry).joinedload(Entry.user))
         .order_by(Flag.created_at.desc())
-        .all()
-    )
+    )).all()
 
-    # Unread notifications for this doctor
-    notifications = (
-        db.query(Notification)
-        .filter(Notification.user_id == doctor.id, Notification.is_read == False)
-        .order_by(Notification.created_at.desc())
-        .all()
-    )
+    # Patient and entry totals from the summaries, without loading the patients
+    total_patients, total_entries = (await db.execute(
+        select(func.count(PatientDoctor.patient_id), func.coalesce(func.sum(PatientSummary.entry_count), 0))
+        .outerjoin(PatientSummary, PatientSummary.patient_id == PatientDoctor.patient_id)
+        .where(PatientDoctor.doctor_id == doctor.id)
+    )).one()
 
-    stats = {
-        "total_patients":  len(patients),
-        "total_entries":   len(entries),
-        "open_flags":      len(open_flags),
-        "emergencies":     len(emergencies),
-        "notifications":   len(notifications),
+    return {
+        "entries":           entries,
+        "next_cursor":       next_cursor,
+        "flagged_entry_ids": {f.entry_id for f in open_flags},
+        "emergencies":       emergencies,
+        "open_flags":        open_flags,
+        "stats": {
+            "total_patients": total_patients,
+            "total_entries":  total_entries,
+            "open_flags":     len(open_flags),
+            "emergencies":    emergency_count,
+        },
     }
 
-    return templates.TemplateResponse("doctor/home.html", {
-        "request":       request,
-        "user":          doctor,
-        "patients":      patients,
-        "entries":       entries,
-        "emergencies":   emergencies,
-        "open_flags":    open_flags,
-        "notifications": notifications,
-        "stats":         stats,
-    })
+
+def _loader(session_factory, fn, doctor: UserSnapshot, *args):
+    """`fn(doctor, db, *args)` as a memoized template loader with its own session."""
+    async def load():
+        async with session_factory() as db:
+            return await fn(doctor, db, *args)
+    return once(load)
+
+
+@router.get("/home", response_class=HTMLResponse)
+async def doctor_home(
+    request: Request,
+    before:  str | None = None,
+    db: AsyncSession = Depends(get_async_read_db),
+    session_factory = Depends(get_read_session_factory),
+):
+    doctor = await _get_doctor(request, db)
+    stamp = await doctor_home_stamp(db, doctor.id)
+    etag = make_etag(request, doctor.id, stamp)
+    if cached := not_modified(request, etag):
+        return cached
+
+    # Streamed: the shell goes out first, each section queries when the
+    # template reaches it, and the cached sections skip their query on a hit.
+    overview = _loader(session_factory, _patient_overview, doctor)   # only patients assigned to THIS doctor
+
+    async def load_risk():
+        return _risk_distribution((await overview())[1])
+
+    async def load_patient_rows():
+        return _patient_rows(*await overview())
+
+    return tag(StreamingTemplateResponse("doctor/home.html", {
+        "request":           request,
+        "user":              doctor,
+        "data_version":      stamp.data_version,
+        "open_flag_count":   stamp.open_flags,
+        "is_first_page":     before is None,
+        "load_home":         _loader(session_factory, _home_panels, doctor, decode_cursor(before)),
+        "load_risk":         load_risk,
+        "load_patient_rows": load_patient_rows,
+    }), etag)
 
 
 # ── Flag an entry ─────────────────────────────────────────────────────────────
@@ -103,12 +243,12 @@ async def flag_entry(
     request:  Request,
     entry_id: int = Form(...),
     note:     str = Form(default=""),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    doctor = _get_doctor(request, db)
-    patient_ids = _get_assigned_patient_ids(doctor, db)
+    doctor = await _get_doctor(request, db)
+    patient_ids = await _get_assigned_patient_ids(doctor, db)
 
-    entry = db.query(Entry).filter(Entry.id == entry_id).first()
+    entry = await db.get(Entry, entry_id)
     # Guard: only flag entries belonging to assigned patients
     if not entry or entry.user_id not in patient_ids:
         return RedirectResponse("/doctor/home", status_code=303)
@@ -116,81 +256,175 @@ async def flag_entry(
     flag = Flag(entry_id=entry_id, doctor_id=doctor.id, note=note, status="open")
     db.add(flag)
 
-    notif = Notification(
-        user_id=entry.user_id,
-        message=(
-            f"Dr. {doctor.username} has flagged your entry from "
-            f"{entry.created_at.strftime('%b %d, %Y')} "
-            f"(FIB-4: {entry.fib4}, APRI: {entry.apri})"
-            + (f": {note}" if note else ".")
-        ),
+    await notify(
+        db, entry.user_id,
+        f"Dr. {doctor.username} has flagged your entry from "
+        f"{entry.created_at.strftime('%b %d, %Y')} "
+        f"(FIB-4: {entry.fib4}, APRI: {entry.apri})"
+        + (f": {note}" if note else "."),
     )
-    db.add(notif)
-    db.commit()
+    await db.commit()
     return RedirectResponse("/doctor/home", status_code=303)
 
 
 # ── Resolve a flag ────────────────────────────────────────────────────────────
 @router.post("/flag/{flag_id}/resolve")
-async def resolve_flag(flag_id: int, request: Request, db: Session = Depends(get_db)):
-    doctor = _get_doctor(request, db)
-    flag = db.query(Flag).filter(Flag.id == flag_id, Flag.doctor_id == doctor.id).first()
+async def resolve_flag(flag_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    doctor = await _get_doctor(request, db)
+    flag = await db.scalar(select(Flag).where(Flag.id == flag_id, Flag.doctor_id == doctor.id))
     if flag:
         flag.status = "resolved"
-        entry = db.query(Entry).filter(Entry.id == flag.entry_id).first()
+        entry = await db.get(Entry, flag.entry_id) if flag.entry_id else None
         if entry:
-            notif = Notification(
-                user_id=entry.user_id,
-                message=(
-                    f"Dr. {doctor.username} has resolved the flag on your entry "
-                    f"from {entry.created_at.strftime('%b %d, %Y')}."
-                ),
+            await notify(
+                db, entry.user_id,
+                f"Dr. {doctor.username} has resolved the flag on your entry "
+                f"from {entry.created_at.strftime('%b %d, %Y')}.",
             )
-            db.add(notif)
-        db.commit()
+        await db.commit()
     return RedirectResponse("/doctor/home", status_code=303)
 
 
 # ── Patient detail ────────────────────────────────────────────────────────────
+# The detail view reuses doctor/home.html with its dashboard tabs left empty
+_EMPTY_HOME = {
+    "entries": [], "next_cursor": None, "flagged_entry_ids": set(), "emergencies": [], "open_flags": [],
+    "stats": {"total_patients": 0, "total_entries": 0, "open_flags": 0, "emergencies": 0},
+}
+
+
 @router.get("/patient/{patient_id}", response_class=HTMLResponse)
-async def patient_detail(patient_id: int, request: Request, db: Session = Depends(get_db)):
-    doctor = _get_doctor(request, db)
-    patient_ids = _get_assigned_patient_ids(doctor, db)
+async def patient_detail(
+    patient_id: int,
+    request:    Request,
+    before:     str | None = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    doctor = await _get_doctor(request, db)
+    patient_ids = await _get_assigned_patient_ids(doctor, db)
 
     # Guard: can only view assigned patients
     if patient_id not in patient_ids:
         return RedirectResponse("/doctor/home", status_code=302)
 
-    patient = db.query(User).filter(User.id == patient_id).first()
-    entries = (
-        db.query(Entry)
-        .filter(Entry.user_id == patient_id)
-        .order_by(Entry.created_at.desc())
-        .all()
-    )
+    patient = await db.get(User, patient_id)
+    summary = await db.get(PatientSummary, patient_id)
+
+    # One keyset page of the history table; the chart comes from /trends
+    cursor = decode_cursor(before)
+    q = select(Entry).where(Entry.user_id == patient_id)
+    if cursor:
+        q = q.where(before_cursor(Entry.created_at, Entry.id, cursor))
+    entries = (await db.scalars(
+        q.order_by(Entry.created_at.desc(), Entry.id.desc()).limit(DETAIL_PAGE_SIZE + 1)
+    )).all()
+    next_cursor = None
+    if len(entries) > DETAIL_PAGE_SIZE:
+        entries = entries[:DETAIL_PAGE_SIZE]
+        next_cursor = encode_cursor(entries[-1].created_at, entries[-1].id)
 
     return templates.TemplateResponse("doctor/home.html", {
-        "request":        request,
-        "user":           doctor,
-        "patients":       [],
-        "entries":        [],
-        "emergencies":    [],
-        "open_flags":     [],
-        "notifications":  [],
-        "stats":          {"total_patients": 0, "total_entries": 0, "open_flags": 0, "emergencies": 0, "notifications": 0},
-        "detail_patient": patient,
-        "detail_entries": entries,
-        "active_tab":     "patients",
+        "request":           request,
+        "user":              doctor,
+        "data_version":      None,
+        "open_flag_count":   0,
+        "is_first_page":     True,
+        "load_home":         lambda: _EMPTY_HOME,
+        "load_risk":         lambda: _risk_distribution({}),
+        "load_patient_rows": lambda: [],
+        "detail_patient":    patient,
+        "detail_summary":    summary,
+        "detail_entries":    entries,
+        "detail_cursor":     next_cursor,
+        "detail_first":      before is None,
+        "active_tab":        "patients",
     })
 
 
+@router.get("/patient/{patient_id}/trends")
+async def patient_trends_json(
+    patient_id: int,
+    request:    Request,
+    start:      date | None = None,
+    end:        date | None = None,
+    metrics:    str | None = None,
+    points:     int = TREND_POINTS,
+    method:     str = "lttb",
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """An assigned patient's score history, downsampled; see app.trends."""
+    doctor = await _get_doctor(request, db)
+    if patient_id not in await _get_assigned_patient_ids(doctor, db):
+        raise HTTPException(status_code=404, detail="No such patient.")
+    try:
+        result = await patient_trends(db, patient_id, start, end, metrics, points, method)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    return JSONResponse(result)
+
+
+# ── Bulk import ───────────────────────────────────────────────────────────────
+@router.post("/import")
+async def import_lab_panels(
+    request: Request,
+    file:    UploadFile = File(...),
+    format:  str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Import historical lab panels for this doctor's patients from an uploaded
+    CSV or Parquet file (see app.importer for the columns). The upload is
+    spooled to disk and read a chunk at a time on a worker thread. Returns
+    the import report; invalid rows are listed, not fatal.
+    """
+    doctor = await _get_doctor(request, db)
+    allowed = set(await _get_assigned_patient_ids(doctor, db))
+    await db.close()   # the import runs on its own sync session
+    fmt = format or ("parquet" if (file.filename or "").endswith(".parquet") else "csv")
+    try:
+        report = await run_in_threadpool(import_file, file.file, fmt, allowed_patients=allowed)
+    except (ValueError, RuntimeError) as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    return JSONResponse(report.as_dict())
+
+
+# ── Streaming export ──────────────────────────────────────────────────────────
+@router.get("/export")
+async def export_panel(
+    request:    Request,
+    kind:       str = "entries",
+    format:     str = "csv",
+    gzip:       bool = False,
+    patient_id: int | None = None,
+    start:      date | None = None,
+    end:        date | None = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """
+    Download the entries (or this doctor's flags) of assigned patients as
+    CSV or NDJSON, optionally gzipped, streamed in constant memory; see
+    app.exporter. `patient_id` narrows it to one assigned patient.
+    """
+    doctor = await _get_doctor(request, db)
+    patient_ids = await _get_assigned_patient_ids(doctor, db)
+    if kind not in EXPORT_KINDS or format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=422, detail="kind must be entries|flags, format csv|ndjson.")
+    if patient_id is not None:
+        if patient_id not in patient_ids:
+            raise HTTPException(status_code=404, detail="No such patient.")
+        patient_ids = [patient_id]
+
+    filename = f"hepacheck-{kind}-{date.today():%Y%m%d}.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        export_stream(kind, format, doctor.id, patient_ids, start, end, gzip),
+        media_type="application/gzip" if gzip else MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 # ── Mark doctor notifications read ───────────────────────────────────────────
 @router.post("/notifications/read")
-async def mark_notifications_read(request: Request, db: Session = Depends(get_db)):
-    doctor = _get_doctor(request, db)
-    db.query(Notification).filter(
-        Notification.user_id == doctor.id,
-        Notification.is_read == False,
-    ).update({"is_read": True})
-    db.commit()
-    return RedirectResponse("/doctor/home", status_code=303)
\ No newline at end of file
+async def mark_notifications_read(request: Request, db: AsyncSession = Depends(get_async_db)):
+    doctor = await _get_doctor(request, db)
+    await mark_all_read(db, doctor.id)
+    return RedirectResponse("/doctor/home", status_code=303)
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, Response
+
+from app import metrics, outbox
+from app.auth import auth_cache, require_metrics_token
+from app.templating import fragment_cache
+
+router = APIRouter(prefix="/metrics")
+
+
+# ── GET /metrics ──────────────────────────────────────────────────────────────
+@router.get("")
+async def prometheus_metrics(request: Request):
+    """This worker's histograms (app.metrics), cache and outbox figures, for Prometheus to scrape."""
+    require_metrics_token(request)
+    caches = {"auth": auth_cache.stats(), "fragment": fragment_cache.stats()}
+    extra = metrics.family("hepacheck_cache_entries", "gauge", "Entries held per in-process cache.",
+                           {(("cache", name),): s["size"] for name, s in caches.items()})
+    for stat in ("hits", "misses", "evictions"):
+        extra += metrics.family(f"hepacheck_cache_{stat}_total", "counter", f"Cache {stat} since start.",
+                                {(("cache", name),): s[stat] for name, s in caches.items()})
+
+    box = await outbox.dispatcher.metrics()
+    extra += metrics.family("hepacheck_outbox_queue_depth", "gauge", "Pending outbox messages.",
+                            {(): box["queue_depth"]})
+    extra += metrics.family("hepacheck_outbox_dead_letters", "gauge", "Outbox messages that gave up.",
+                            {(): box["dead_letters"]})
+    extra += metrics.family("hepacheck_outbox_oldest_pending_seconds", "gauge", "Age of the oldest pending message.",
+                            {(): box["oldest_pending_age_s"]})
+    extra += metrics.family("hepacheck_outbox_messages_total", "counter", "Outbox dispatch outcomes since start.",
+                            {(("outcome", k),): box[k] for k in ("sent", "retried", "failed")})
+    extra += metrics.family("hepacheck_outbox_dispatch_latency_ms", "gauge", "Enqueue-to-sent latency, recent window.",
+                            {(("quantile", q),): box["dispatch_latency_ms"][k]
+                             for q, k in (("0.5", "p50"), ("0.95", "p95"), ("1", "max"))})
+    return Response(metrics.render(extra), media_type=metrics.CONTENT_TYPE)
+
+
+# ── GET /metrics/outbox ───────────────────────────────────────────────────────
+@router.get("/outbox")
+async def outbox_metrics(request: Request):
+    """Queue depth, dead letters, and enqueue→sent latency of this worker's dispatcher."""
+    require_metrics_token(request)
+    return JSONResponse(await outbox.dispatcher.metrics())
@@ -0,0 +1,128 @@
+import json
+
+from fastapi import APIRouter, Body, Depends, Request
+from fastapi.exceptions import HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import events
+from app.auth import require_login
+from app.database import AsyncSessionLocal, Notification, get_async_db, get_async_read_db
+from app.notifications import (
+    MARK_READ_BATCH, NOTIFICATION_MAX_PAGE, NOTIFICATION_PAGE_SIZE,
+    mark_read, unread_count,
+)
+from app.pagination import before_cursor, decode_cursor, encode_cursor
+
+router = APIRouter(prefix="/notifications")
+
+KEEPALIVE_SECONDS = 15    # comment frames keep proxies from closing idle streams
+REPLAY_LIMIT      = 100   # missed notifications re-sent on reconnect
+
+
+def _sse(payload: dict) -> str:
+    return f"id: {payload['id']}\nevent: notification\ndata: {json.dumps(payload)}\n\n"
+
+
+async def _event_stream(user_id: int, last_event_id: str | None):
+    async with events.broker.subscribe(user_id) as subscription:
+        yield "retry: 5000\n\n"
+
+        # Subscribed first, so anything committed while we replay is queued,
+        # and the id check below drops what the replay already sent.
+        sent = 0
+        if last_event_id and last_event_id.isdigit():
+            async with AsyncSessionLocal() as db:
+                missed = (await db.scalars(
+                    select(Notification)
+                    .where(Notification.user_id == user_id, Notification.id > int(last_event_id))
+                    .order_by(Notification.id)
+                    .limit(REPLAY_LIMIT)
+                )).all()
+            for n in missed:
+                yield _sse(events.notification_event(n))
+            sent = missed[-1].id if missed else int(last_event_id)
+
+        while True:
+            payload = await subscription.get(KEEPALIVE_SECONDS)
+            if payload is None:
+                yield ": keep-alive\n\n"
+            elif payload["id"] > sent:
+                yield _sse(payload)
+
+
+# ── GET /notifications/stream ─────────────────────────────────────────────────
+@router.get("/stream")
+async def notification_stream(request: Request):
+    """
+    Server-sent events for the signed-in user: one `notification` event per
+    Notification row, pushed as soon as the inserting transaction commits.
+    The DB is only touched to replay what was missed across a reconnect
+    (Last-Event-ID), never held open for the life of the stream.
+    """
+    payload = require_login(request)
+    return StreamingResponse(
+        _event_stream(int(payload["sub"]), request.headers.get("last-event-id")),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ── GET /notifications ────────────────────────────────────────────────────────
+@router.get("")
+async def list_notifications(
+    request: Request,
+    cursor:  str | None = None,
+    limit:   int = NOTIFICATION_PAGE_SIZE,
+    unread:  bool = False,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """
+    One page of the signed-in user's notifications, newest first (only unread
+    ones with `?unread=true`). Pass `next_cursor` back as `cursor` for the next
+    page; it is null on the last page.
+    """
+    user_id = int(require_login(request)["sub"])
+    limit = max(1, min(limit, NOTIFICATION_MAX_PAGE))
+
+    q = (
+        select(Notification)
+        .where(Notification.user_id == user_id)
+        .order_by(Notification.created_at.desc(), Notification.id.desc())
+    )
+    if unread:
+        q = q.where(Notification.is_read == False)
+    decoded = decode_cursor(cursor)
+    if decoded:
+        q = q.where(before_cursor(Notification.created_at, Notification.id, decoded))
+    rows = (await db.scalars(q.limit(limit + 1))).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return JSONResponse({
+        "notifications": [
+            {**events.notification_event(n), "read": n.is_read} for n in rows
+        ],
+        "next_cursor": next_cursor,
+        "unread":      await unread_count(db, user_id),
+    })
+
+
+# ── POST /notifications/read ──────────────────────────────────────────────────
+@router.post("/read")
+async def mark_notifications_read(
+    request: Request,
+    ids: list[int] = Body(..., embed=True),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Mark the given notification ids read (at most MARK_READ_BATCH per call)."""
+    user_id = int(require_login(request)["sub"])
+    if len(ids) > MARK_READ_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MARK_READ_BATCH} ids per call.")
+    marked = await mark_read(db, user_id, ids)
+    await db.commit()
+    return JSONResponse({"marked": marked, "unread": await unread_count(db, user_id)})
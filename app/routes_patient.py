@@ -1,66 +1,74 @@
+from datetime import date
+
 from fastapi import APIRouter, Depends, Form, Request, status
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
+from fastapi.exceptions import HTTPException
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 
 from app.database import (
-    get_db, User, Entry, Flag, Notification,
-    DoctorProfile, PatientDoctor,
+    get_async_db, get_async_read_db, User, Entry, Flag,
+    DoctorProfile, PatientDoctor, PatientSummary,
     CommunityPost, PostReply, PostLike,
 )
-from app.auth import require_role
+from app.auth import UserSnapshot, current_user
+from app.etags import feed_stamp, make_etag, not_modified, patient_home_stamp, tag
+from app.metrics import SCORE_SECONDS
+from app.pagination import before_cursor, decode_cursor, encode_cursor
+from app.notifications import mark_all_read, notify
+from app.outbox import enqueue
+from app.scores import score_entry
+from app.summaries import bump_data_version, record_entry
+from app.templating import templates
+from app.trends import TREND_POINTS, patient_trends
 
-import os as _os
 router = APIRouter(prefix="/patient")
-_BACKEND = _os.path.dirname(_os.path.dirname(_os.path.abspath(__file__)))
-templates = Jinja2Templates(directory=_os.path.join(_BACKEND, "templates"))
+_INSERT = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}   # have ON CONFLICT
 
 
-def _get_patient(request: Request, db: Session) -> User:
-    payload = require_role(request, "patient")
-    user = db.query(User).filter(User.id == int(payload["sub"])).first()
-    if not user:
-        raise Exception("Patient not found")
-    return user
+async def _get_patient(request: Request, db: AsyncSession) -> UserSnapshot:
+    return await current_user(request, db, "patient")
 
 
 # ── Home ──────────────────────────────────────────────────────────────────────
 @router.get("/home", response_class=HTMLResponse)
-async def patient_home(request: Request, db: Session = Depends(get_db)):
-    patient = _get_patient(request, db)
-
-    entries = (
-        db.query(Entry)
-        .filter(Entry.user_id == patient.id)
-        .order_by(Entry.created_at.desc())
-        .all()
-    )
-
-    unread_notifications = (
-        db.query(Notification)
-        .filter(Notification.user_id == patient.id, Notification.is_read == False)
-        .order_by(Notification.created_at.desc())
-        .all()
-    )
-
-    assignment = (
-        db.query(PatientDoctor)
-        .filter(PatientDoctor.patient_id == patient.id)
-        .first()
-    )
-    assigned_doctor = None
-    if assignment:
-        assigned_doctor = db.query(User).filter(User.id == assignment.doctor_id).first()
-
-    return templates.TemplateResponse("patient/home.html", {
-        "request":         request,
-        "user":            patient,
-        "entries":         entries,
-        "notifications":   unread_notifications,
-        "assigned_doctor": assigned_doctor,
-        "assignment":      assignment,
-    })
+async def patient_home(request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    patient = await _get_patient(request, db)
+    stamp = await patient_home_stamp(db, patient.id)
+    etag = make_etag(request, patient.id, stamp)
+    if cached := not_modified(request, etag):
+        return cached
+
+    # History is drawn client-side from /patient/trends
+    summary = await db.get(PatientSummary, patient.id)
+
+    return tag(templates.TemplateResponse("patient/home.html", {
+        "request": request,
+        "user":    patient,
+        "summary": summary,
+    }), etag)
+
+
+# ── Score trends ──────────────────────────────────────────────────────────────
+@router.get("/trends")
+async def trends_json(
+    request: Request,
+    start:   date | None = None,
+    end:     date | None = None,
+    metrics: str | None = None,
+    points:  int = TREND_POINTS,
+    method:  str = "lttb",
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """The patient's own score history, downsampled; see app.trends."""
+    patient = await _get_patient(request, db)
+    try:
+        result = await patient_trends(db, patient.id, start, end, metrics, points, method)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    return JSONResponse(result)
 
 
 # ── Score entry ───────────────────────────────────────────────────────────────
@@ -76,63 +84,53 @@ async def save_score(
     diabetes:  bool  = Form(default=False),
     glucose:   float = Form(...),
     insulin:   float = Form(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    patient = _get_patient(request, db)
-
-    import math
-    fib4    = (age * ast) / (platelets * math.sqrt(alt)) if platelets > 0 and alt > 0 else 0.0
-    apri    = (ast / 40 * 100) / platelets if platelets > 0 else 0.0
-    nfs     = (-1.675 + 0.037 * age + 0.094 * bmi + 1.13 * (1 if diabetes else 0)
-               + 0.99 * (ast / alt) - 0.013 * platelets - 0.66 * albumin) if alt > 0 else 0.0
-    homa_ir = (glucose * insulin) / 405 if glucose and insulin else 0.0
-
-    if fib4 < 1.30:   risk = "Low"
-    elif fib4 < 2.67: risk = "Moderate"
-    else:             risk = "High"
-
-    is_emergency = fib4 >= 2.67
-
-    entry = Entry(
-        user_id=patient.id, age=age, ast=ast, alt=alt, platelets=platelets,
-        albumin=albumin, bmi=bmi, diabetes=diabetes, glucose=glucose, insulin=insulin,
-        fib4=round(fib4, 4), apri=round(apri, 4), nfs=round(nfs, 4),
-        homa_ir=round(homa_ir, 4), risk_level=risk, is_emergency=is_emergency,
-    )
-    db.add(entry)
+    patient = await _get_patient(request, db)
 
-    if is_emergency:
-        assignment = db.query(PatientDoctor).filter(PatientDoctor.patient_id == patient.id).first()
-        if assignment:
-            notif = Notification(
-                user_id=assignment.doctor_id,
-                message=(
-                    f"⚠️ High-risk entry from {patient.username}: "
-                    f"FIB-4={round(fib4,2)}, APRI={round(apri,3)}, NFS={round(nfs,3)}."
-                ),
-            )
-            db.add(notif)
+    with SCORE_SECONDS.time():
+        scored = score_entry({
+            "age": age, "ast": ast, "alt": alt, "platelets": platelets,
+            "albumin": albumin, "bmi": bmi, "diabetes": diabetes,
+            "glucose": glucose, "insulin": insulin,
+        })
+    entry = Entry(user_id=patient.id, **scored)
+    db.add(entry)
+    await db.flush()
+    await record_entry(db, entry)
+
+    if entry.is_emergency:
+        # Alerting the doctor (and any other sink) happens in app.outbox,
+        # after this request has returned.
+        enqueue(db, "emergency_alert", f"emergency_alert:entry:{entry.id}", {
+            "entry_id":   entry.id,
+            "patient_id": patient.id,
+            "patient":    patient.username,
+            "fib4":       entry.fib4,
+            "apri":       entry.apri,
+            "nfs":        entry.nfs,
+        })
 
-    db.commit()
+    await db.commit()
     return RedirectResponse("/patient/home", status_code=303)
 
 
 # ── Choose / change doctor ────────────────────────────────────────────────────
 @router.get("/choose-doctor", response_class=HTMLResponse)
-async def choose_doctor_page(request: Request, db: Session = Depends(get_db)):
-    patient = _get_patient(request, db)
+async def choose_doctor_page(request: Request, db: AsyncSession = Depends(get_async_db)):
+    patient = await _get_patient(request, db)
 
-    doctors = (
-        db.query(User)
+    doctors = (await db.scalars(
+        select(User)
         .join(DoctorProfile, User.id == DoctorProfile.user_id)
-        .filter(User.role == "doctor")
-        .all()
-    )
-
-    assignment = (
-        db.query(PatientDoctor)
-        .filter(PatientDoctor.patient_id == patient.id)
-        .first()
+        .where(User.role == "doctor")
+        .options(joinedload(User.doctor_profile))
+    )).all()
+
+    assignment = await db.scalar(
+        select(PatientDoctor)
+        .where(PatientDoctor.patient_id == patient.id)
+        .options(joinedload(PatientDoctor.doctor_user).joinedload(User.doctor_profile))
     )
 
     return templates.TemplateResponse("patient/choose_doctor.html", {
@@ -147,66 +145,58 @@ async def choose_doctor_page(request: Request, db: Session = Depends(get_db)):
 async def choose_doctor(
     request:   Request,
     doctor_id: int = Form(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    patient = _get_patient(request, db)
+    patient = await _get_patient(request, db)
 
-    doctor = db.query(User).filter(User.id == doctor_id, User.role == "doctor").first()
+    doctor = await db.scalar(select(User).where(User.id == doctor_id, User.role == "doctor"))
     if not doctor:
         return RedirectResponse("/patient/choose-doctor", status_code=303)
 
-    assignment = (
-        db.query(PatientDoctor)
-        .filter(PatientDoctor.patient_id == patient.id)
-        .first()
+    assignment = await db.scalar(
+        select(PatientDoctor).where(PatientDoctor.patient_id == patient.id)
     )
     if assignment:
         old_doctor_id = assignment.doctor_id
         assignment.doctor_id = doctor_id
         if old_doctor_id != doctor_id:
-            db.add(Notification(
-                user_id=old_doctor_id,
-                message=f"Patient {patient.username} has switched to a different doctor.",
-            ))
+            await db.execute(bump_data_version(doctor_ids=[old_doctor_id]))
+            await notify(
+                db, old_doctor_id,
+                f"Patient {patient.username} has switched to a different doctor.",
+            )
     else:
         assignment = PatientDoctor(patient_id=patient.id, doctor_id=doctor_id)
         db.add(assignment)
 
-    db.add(Notification(
-        user_id=doctor_id,
-        message=f"Patient {patient.username} has chosen you as their doctor.",
-    ))
-    db.commit()
+    await notify(db, doctor_id, f"Patient {patient.username} has chosen you as their doctor.")
+    await db.execute(bump_data_version(doctor_ids=[doctor_id]))
+    await db.commit()
     return RedirectResponse("/patient/home", status_code=303)
 
 
 @router.post("/remove-doctor")
-async def remove_doctor(request: Request, db: Session = Depends(get_db)):
-    patient = _get_patient(request, db)
-    assignment = (
-        db.query(PatientDoctor)
-        .filter(PatientDoctor.patient_id == patient.id)
-        .first()
+async def remove_doctor(request: Request, db: AsyncSession = Depends(get_async_db)):
+    patient = await _get_patient(request, db)
+    assignment = await db.scalar(
+        select(PatientDoctor).where(PatientDoctor.patient_id == patient.id)
     )
     if assignment:
-        db.add(Notification(
-            user_id=assignment.doctor_id,
-            message=f"Patient {patient.username} has removed you as their doctor.",
-        ))
-        db.delete(assignment)
-        db.commit()
+        await notify(
+            db, assignment.doctor_id,
+            f"Patient {patient.username} has removed you as their doctor.",
+        )
+        await db.execute(bump_data_version(doctor_ids=[assignment.doctor_id]))
+        await db.delete(assignment)
+        await db.commit()
     return RedirectResponse("/patient/home", status_code=303)
 
 
 # ── Mark notifications read ───────────────────────────────────────────────────
 @router.post("/notifications/read")
-async def mark_notifications_read(request: Request, db: Session = Depends(get_db)):
-    patient = _get_patient(request, db)
-    db.query(Notification).filter(
-        Notification.user_id == patient.id,
-        Notification.is_read == False,
-    ).update({"is_read": True})
-    db.commit()
+async def mark_notifications_read(request: Request, db: AsyncSession = Depends(get_async_db)):
+    patient = await _get_patient(request, db)
+    await mark_all_read(db, patient.id)
     return RedirectResponse("/patient/home", status_code=303)
 
 
@@ -219,16 +209,16 @@ async def community_create_post(
     request: Request,
     body:    str = Form(...),
     tag:     str = Form(default="Question"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Create a new post. Only authenticated patients can post."""
-    patient = _get_patient(request, db)
+    patient = await _get_patient(request, db)
     if not body.strip():
         return RedirectResponse("/patient/home#community", status_code=303)
 
     post = CommunityPost(author_id=patient.id, tag=tag.strip(), body=body.strip())
     db.add(post)
-    db.commit()
+    await db.commit()
     return RedirectResponse("/patient/home#community", status_code=303)
 
 
@@ -237,78 +227,129 @@ async def community_reply(
     request: Request,
     post_id: int = Form(...),
     body:    str = Form(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Reply to an existing post."""
-    patient = _get_patient(request, db)
+    patient = await _get_patient(request, db)
     if not body.strip():
         return RedirectResponse("/patient/home#community", status_code=303)
 
-    post = db.query(CommunityPost).filter(CommunityPost.id == post_id).first()
-    if post:
+    bumped = (await db.execute(
+        update(CommunityPost)
+        .where(CommunityPost.id == post_id)
+        .values(reply_count=CommunityPost.reply_count + 1)
+    )).rowcount
+    if bumped:
         reply = PostReply(post_id=post_id, author_id=patient.id, body=body.strip())
         db.add(reply)
-        db.commit()
+        await db.commit()
     return RedirectResponse("/patient/home#community", status_code=303)
 
 
 @router.post("/community/like/{post_id}")
-async def community_like(post_id: int, request: Request, db: Session = Depends(get_db)):
+async def community_like(post_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Toggle like for the current user on a post.
     The DB UniqueConstraint (post_id, user_id) enforces one-like-per-user.
     If already liked → unlike. If not liked → like.
+    Each direction is one DELETE/INSERT … RETURNING, and like_count moves by
+    the rows it actually touched, in the same transaction.
     """
-    patient = _get_patient(request, db)
+    patient = await _get_patient(request, db)
+
+    removed = (await db.execute(
+        delete(PostLike)
+        .where(PostLike.post_id == post_id, PostLike.user_id == patient.id)
+        .returning(PostLike.id)
+    )).first()
+    if removed:
+        delta = -1   # toggle off
+    else:
+        added = (await db.execute(
+            _INSERT[db.bind.dialect.name](PostLike)
+            .values(post_id=post_id, user_id=patient.id)
+            .on_conflict_do_nothing(index_elements=["post_id", "user_id"])
+            .returning(PostLike.id)
+        )).first()
+        delta = 1 if added else 0   # 0: a concurrent request liked first
+
+    if delta:
+        await db.execute(
+            update(CommunityPost)
+            .where(CommunityPost.id == post_id)
+            .values(like_count=CommunityPost.like_count + delta)
+        )
+    await db.commit()
+    return RedirectResponse("/patient/home#community", status_code=303)
 
-    existing = db.query(PostLike).filter(
-        PostLike.post_id == post_id,
-        PostLike.user_id == patient.id,
-    ).first()
 
-    if existing:
-        db.delete(existing)   # toggle off
-        db.commit()
-    else:
-        try:
-            db.add(PostLike(post_id=post_id, user_id=patient.id))
-            db.commit()
-        except IntegrityError:
-            db.rollback()     # race-condition safeguard
+FEED_PAGE_SIZE = 20
+FEED_MAX_PAGE  = 100
 
-    return RedirectResponse("/patient/home#community", status_code=303)
+
+async def _feed_page(db: AsyncSession, viewer_id: int, cursor, limit: int):
+    """
+    One page of the community feed in a constant number of queries: posts with
+    authors joined and their stored like_count, the viewer's like as a
+    correlated EXISTS over uq_post_like, and replies+authors in one selectin
+    batch. Returns (rows, next_cursor) where rows are (post, liked).
+    """
+    liked = (
+        select(PostLike.id)
+        .where(PostLike.post_id == CommunityPost.id, PostLike.user_id == viewer_id)
+        .correlate(CommunityPost)
+        .exists()
+    )
+    q = (
+        select(CommunityPost, liked)
+        .options(
+            joinedload(CommunityPost.author),
+            selectinload(CommunityPost.replies).joinedload(PostReply.author),
+        )
+        .order_by(CommunityPost.created_at.desc(), CommunityPost.id.desc())
+    )
+    if cursor:
+        q = q.where(before_cursor(CommunityPost.created_at, CommunityPost.id, cursor))
+    rows = (await db.execute(q.limit(limit + 1))).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1][0]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return rows, next_cursor
 
 
 @router.get("/community/posts")
-async def community_posts_json(request: Request, db: Session = Depends(get_db)):
+async def community_posts_json(
+    request: Request,
+    cursor:  str | None = None,
+    limit:   int = FEED_PAGE_SIZE,
+    db: AsyncSession = Depends(get_async_read_db),
+):
     """
-    Return all posts as JSON for the client-side renderer.
-    Only posts from real, active users are returned.
+    Return one page of posts as JSON for the client-side renderer, newest
+    first. Pass the returned `next_cursor` back as `cursor` for the next page;
+    it is null on the last page. Feed totals are only computed for page one.
     """
-    patient = _get_patient(request, db)
-
-    posts = (
-        db.query(CommunityPost)
-        .order_by(CommunityPost.created_at.desc())
-        .all()
-    )
+    patient = await _get_patient(request, db)
+    etag = make_etag(request, patient.id, await feed_stamp(db))
+    if cached := not_modified(request, etag):
+        return cached
+    limit = max(1, min(limit, FEED_MAX_PAGE))
 
-    # Build liked-set for current user
-    liked_ids = {
-        like.post_id
-        for like in db.query(PostLike).filter(PostLike.user_id == patient.id).all()
-    }
+    rows, next_cursor = await _feed_page(db, patient.id, decode_cursor(cursor), limit)
 
-    result = []
-    for p in posts:
-        result.append({
+    posts = []
+    for p, liked in rows:
+        posts.append({
             "id":        p.id,
             "author":    p.author.username,
             "tag":       p.tag,
             "body":      p.body,
             "time":      p.created_at.strftime("%d %b %Y, %H:%M"),
-            "likes":     len(p.likes),
-            "liked":     p.id in liked_ids,
+            "likes":     p.like_count,
+            "liked":     bool(liked),
             "isOwn":     p.author_id == patient.id,
             "replies": [
                 {
@@ -320,5 +361,11 @@ async def community_posts_json(request: Request, db: Session = Depends(get_db)):
             ],
         })
 
-    from fastapi.responses import JSONResponse
-    return JSONResponse(result)
\ No newline at end of file
+    result = {"posts": posts, "next_cursor": next_cursor}
+    if not cursor:
+        result["total"] = await db.scalar(select(func.count(CommunityPost.id)))
+        result["mine"] = await db.scalar(
+            select(func.count(CommunityPost.id))
+            .where(CommunityPost.author_id == patient.id)
+        )
+    return tag(JSONResponse(result), etag)
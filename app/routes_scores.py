@@ -0,0 +1,101 @@
+import csv
+import io
+import json
+
+from fastapi import APIRouter, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import HTTPException
+from fastapi.responses import JSONResponse, Response
+
+from app.auth import require_role
+from app.scores import SCORE_FIELDS, RESULT_FIELDS, score_batch, batch_to_rows
+
+router = APIRouter(prefix="/scores")
+
+MAX_BATCH_ROWS  = 100_000
+MAX_BATCH_BYTES = 32 * 1024 * 1024   # refused before parsing; ~2x a 100k-row JSON batch
+
+
+def _columns_from_rows(rows: list) -> dict:
+    return {k: [r.get(k, 0) for r in rows] for k in SCORE_FIELDS}
+
+
+def _columns_from_csv(text: str) -> dict:
+    reader = csv.DictReader(io.StringIO(text))
+    columns = {k: [] for k in SCORE_FIELDS}
+    for n, row in enumerate(reader):
+        if n == MAX_BATCH_ROWS:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_ROWS} rows.")
+        for k in SCORE_FIELDS:
+            value = (row.get(k) or "").strip()
+            if k == "diabetes":
+                columns[k].append(value.lower() in ("1", "true", "yes", "y"))
+            else:
+                columns[k].append(float(value or 0))
+    return columns
+
+
+def _score_body(body: bytes, is_csv: bool, format: str) -> Response:
+    """Parse, score and serialise one batch; CPU-bound, so run on a worker thread."""
+    try:
+        if is_csv:
+            columns = _columns_from_csv(body.decode("utf-8-sig"))
+        else:
+            payload = json.loads(body)
+            if isinstance(payload, list):
+                columns = _columns_from_rows(payload)
+            elif isinstance(payload, dict):
+                columns = {k: payload[k] for k in SCORE_FIELDS if k in payload}
+            else:
+                raise ValueError("expected a list of rows or an object of columns")
+        if any(len(v) > MAX_BATCH_ROWS for v in columns.values()):
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_ROWS} rows.")
+        result = score_batch(columns)
+    except (ValueError, TypeError, AttributeError) as exc:
+        raise HTTPException(status_code=422, detail=f"Invalid batch: {exc}")
+
+    n = len(result["fib4"])
+
+    rows = batch_to_rows(result)
+    if format == "csv":
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=SCORE_FIELDS + RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+        return Response(out.getvalue(), media_type="text/csv")
+    return JSONResponse({"count": n, "rows": rows})
+
+
+async def _read_capped(request: Request) -> bytes:
+    """The request body, refused with 413 past MAX_BATCH_BYTES without reading the rest."""
+    too_large = HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_BYTES} bytes.")
+    try:
+        declared = int(request.headers.get("content-length", 0))
+    except ValueError:
+        declared = 0
+    if declared > MAX_BATCH_BYTES:
+        raise too_large
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > MAX_BATCH_BYTES:
+            raise too_large
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+# ── POST /scores/batch ────────────────────────────────────────────────────────
+@router.post("/batch")
+async def score_batch_endpoint(request: Request, format: str = "json"):
+    """
+    Score many lab panels in one vectorised pass.
+    Accepts `text/csv` (header row with SCORE_FIELDS) or JSON — either a list
+    of row objects or an object of equal-length columns. Returns JSON rows,
+    or CSV when called with `?format=csv`. Bodies over MAX_BATCH_BYTES are
+    refused before parsing; parsing, scoring and serialising run on a worker
+    thread so a large batch does not stall the event loop.
+    """
+    require_role(request, "doctor")
+    body = await _read_capped(request)
+    is_csv = request.headers.get("content-type", "").startswith("text/csv")
+    return await run_in_threadpool(_score_body, body, is_csv, format)
@@ -1,14 +1,21 @@
 """
 Liver-health scoring functions.
-All inputs are expected as plain Python floats/ints/bools.
+The scalar functions expect plain Python floats/ints/bools; `score_batch`
+takes the same fields as columns (lists or NumPy arrays) and scores them
+in one vectorised pass.
 """
+import math
+from bisect import bisect_right
+from typing import NamedTuple
+
+import numpy as np
 
 
 def compute_fib4(age: float, ast: float, platelets: float, alt: float) -> float:
     """FIB-4 = (Age × AST) / (Platelets × √ALT)"""
     if platelets <= 0 or alt <= 0:
         return 0.0
-    return round((age * ast) / (platelets * (alt ** 0.5)), 3)
+    return round((age * ast) / (platelets * math.sqrt(alt)), 3)
 
 
 def compute_apri(ast: float, platelets: float, uln_ast: float = 40.0) -> float:
@@ -40,17 +47,43 @@ def compute_homa_ir(glucose: float, insulin: float) -> float:
     return round((glucose * insulin) / 405, 3)
 
 
-def classify_risk(fib4: float, apri: float) -> tuple[str, bool]:
+# ── Risk rules ────────────────────────────────────────────────────────────────
+class RiskRules(NamedTuple):
     """
-    Returns (risk_level, is_emergency).
-    risk_level: "low" | "moderate" | "high"
-    is_emergency: True if any critical threshold is breached
+    One compiled, versioned risk-rule table.
+    `cutpoints` maps a score name to its ascending cut-points; a value's level
+    is bisect_right(cutpoints, value), and the entry's level is the highest
+    across all listed scores. Levels index `labels`; any level at or above
+    `emergency_level` raises an emergency.
     """
-    if fib4 >= 3.25 or apri >= 2.0:
-        return "high", True
-    if fib4 >= 1.45 or apri >= 0.5:
-        return "moderate", False
-    return "low", False
+    version:         int
+    cutpoints:       dict
+    labels:          tuple
+    emergency_level: int
+
+
+RISK_RULES = {
+    # FIB-4 only, 1.30 / 2.67 — the rules every stored Entry was classified with
+    1: RiskRules(
+        version=1,
+        cutpoints={"fib4": (1.30, 2.67)},
+        labels=("Low", "Moderate", "High"),
+        emergency_level=2,
+    ),
+}
+CURRENT_RISK_VERSION = max(RISK_RULES)
+
+
+def classify_risk(fib4: float, apri: float, version: int = CURRENT_RISK_VERSION) -> tuple[str, bool]:
+    """
+    Returns (risk_level, is_emergency) under rule-table `version`.
+    risk_level: one of the table's labels ("Low" | "Moderate" | "High")
+    is_emergency: True if the emergency level is reached
+    """
+    rules = RISK_RULES[version]
+    values = {"fib4": fib4, "apri": apri}
+    level = max(bisect_right(cuts, values[name]) for name, cuts in rules.cutpoints.items())
+    return rules.labels[level], level >= rules.emergency_level
 
 
 def score_entry(data: dict) -> dict:
@@ -81,4 +114,118 @@ def score_entry(data: dict) -> dict:
         "glucose": glucose, "insulin": insulin,
         "fib4": fib4, "apri": apri, "nfs": nfs, "homa_ir": homa_ir,
         "risk_level": risk_level, "is_emergency": is_emergency,
+        "risk_version": CURRENT_RISK_VERSION,
     }
+
+
+# ── Batch scoring ─────────────────────────────────────────────────────────────
+SCORE_FIELDS = ("age", "ast", "alt", "platelets", "albumin",
+                "bmi", "diabetes", "glucose", "insulin")
+RESULT_FIELDS = ("fib4", "apri", "nfs", "homa_ir", "risk_level", "is_emergency", "risk_version")
+
+
+def _round3(x: np.ndarray) -> np.ndarray:
+    """
+    np.round(x, 3), corrected to match Python's round() on near-ties.
+    np.round scales by 1000 before rounding, which can flip x.xxx5 cases that
+    round() resolves on the exact binary value; those few elements fall back
+    to round() so batch and scalar results stay identical.
+    """
+    out = np.round(x, 3)
+    scaled = x * 1000.0
+    near_tie = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    if near_tie.size:
+        out[near_tie] = [round(v, 3) for v in x[near_tie].tolist()]
+    return out
+
+
+def _column(columns: dict, key: str, n: int, dtype=np.float64) -> np.ndarray:
+    values = columns.get(key)
+    if values is None:
+        return np.zeros(n, dtype=dtype)
+    return np.asarray(values, dtype=dtype)
+
+
+def score_batch(columns: dict) -> dict:
+    """
+    Vectorised `score_entry` over columnar input.
+    `columns` maps each of SCORE_FIELDS to an equal-length sequence; missing
+    fields default to 0 / False exactly like `score_entry`, while a None, NaN
+    or infinite value raises ValueError naming the field and row. Returns a
+    dict of NumPy arrays holding the inputs plus fib4, apri, nfs, homa_ir,
+    risk_level and is_emergency — element-for-element identical to calling
+    `score_entry` on each row.
+    """
+    lengths = {len(v) for v in columns.values() if v is not None}
+    if len(lengths) > 1:
+        raise ValueError("score_batch columns must all have the same length")
+    n = lengths.pop() if lengths else 0
+
+    age       = _column(columns, "age", n)
+    ast       = _column(columns, "ast", n)
+    alt       = _column(columns, "alt", n)
+    platelets = _column(columns, "platelets", n)
+    albumin   = _column(columns, "albumin", n)
+    bmi       = _column(columns, "bmi", n)
+    diabetes  = _column(columns, "diabetes", n, dtype=bool)
+    glucose   = _column(columns, "glucose", n)
+    insulin   = _column(columns, "insulin", n)
+
+    # None, "nan" and "inf" parse to non-finite floats; refuse them by name
+    for key, values in (("age", age), ("ast", ast), ("alt", alt), ("platelets", platelets),
+                        ("albumin", albumin), ("bmi", bmi), ("glucose", glucose), ("insulin", insulin)):
+        bad = np.flatnonzero(~np.isfinite(values))
+        if bad.size:
+            raise ValueError(f"{key} is missing or not finite in row {int(bad[0])}")
+
+    # Substitute 1.0 where a guard fires so the division never warns;
+    # those rows are overwritten with 0.0 by np.where below.
+    plt_ok  = platelets > 0
+    alt_ok  = alt > 0
+    safe_plt = np.where(plt_ok, platelets, 1.0)
+    safe_alt = np.where(alt_ok, alt, 1.0)
+
+    fib4 = np.where(plt_ok & alt_ok,
+                    _round3((age * ast) / (safe_plt * np.sqrt(safe_alt))), 0.0)
+    apri = np.where(plt_ok, _round3((ast / 40.0) / safe_plt * 100), 0.0)
+
+    ast_alt = np.where(alt_ok, _round3(ast / safe_alt), 0.0)
+    nfs = _round3(
+        -1.675
+        + (0.037 * age)
+        + (0.094 * bmi)
+        + (1.13 * diabetes)
+        + (0.99 * ast_alt)
+        - (0.013 * platelets)
+        - (0.66 * albumin)
+    )
+    homa_ir = _round3((glucose * insulin) / 405)
+
+    risk_level, is_emergency = classify_risk_batch(fib4, apri)
+
+    return {
+        "age": age, "ast": ast, "alt": alt, "platelets": platelets,
+        "albumin": albumin, "bmi": bmi, "diabetes": diabetes,
+        "glucose": glucose, "insulin": insulin,
+        "fib4": fib4, "apri": apri, "nfs": nfs, "homa_ir": homa_ir,
+        "risk_level": risk_level, "is_emergency": is_emergency,
+        "risk_version": np.full(n, CURRENT_RISK_VERSION),
+    }
+
+
+def classify_risk_batch(fib4, apri, version: int = CURRENT_RISK_VERSION) -> tuple[np.ndarray, np.ndarray]:
+    """Vectorised `classify_risk`: returns (risk_level, is_emergency) arrays."""
+    rules = RISK_RULES[version]
+    values = {"fib4": np.asarray(fib4, dtype=np.float64),
+              "apri": np.asarray(apri, dtype=np.float64)}
+    level = np.zeros(len(values["fib4"]), dtype=np.intp)
+    for name, cuts in rules.cutpoints.items():
+        np.maximum(level, np.searchsorted(cuts, values[name], side="right"), out=level)
+    return np.asarray(rules.labels)[level], level >= rules.emergency_level
+
+
+def batch_to_rows(result: dict) -> list[dict]:
+    """Turn a `score_batch` result back into a list of plain-Python row dicts."""
+    keys = SCORE_FIELDS + RESULT_FIELDS
+    cols = [result[k].tolist() for k in keys]
+    return [dict(zip(keys, row)) for row in zip(*cols)]
@@ -0,0 +1,181 @@
+"""
+PatientSummary maintenance.
+
+save_score folds each new entry into its patient's row with `record_entry`
+(one indexed read of the last few entries plus one UPDATE), so dashboards
+read one row per patient instead of aggregating Entry. `rebuild_summaries`
+regenerates every row from Entry:
+
+    python -m app.recompute summaries
+
+Whatever changes a summary row, or who a doctor's patients are, also bumps
+User.data_version for the doctors concerned (`bump_data_version`), which
+keys the cached dashboard fragments in app.templating.
+"""
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import case, delete, func, insert, select, update
+
+from app.database import Entry, PatientDoctor, PatientSummary, User
+from app.trends import slope_per_30d
+
+TREND_WINDOW = 5   # entries behind fib4_slope
+
+_BUCKETS = {"Low": "low_count", "Moderate": "moderate_count", "High": "high_count"}
+
+
+def _trend_slope(recent) -> float | None:
+    """FIB-4 change per 30 days over (created_at, fib4) rows."""
+    t = np.array([r.created_at.timestamp() for r in recent]) / 86400.0
+    return slope_per_30d(t, np.array([r.fib4 for r in recent], dtype=float))
+
+
+def bump_data_version(doctor_ids=None, patient_ids=None):
+    """
+    UPDATE statement raising data_version for `doctor_ids` and the doctors of
+    `patient_ids` (every user when both are None). Execute it in the
+    transaction making the change.
+    """
+    stmt = update(User).values(data_version=User.data_version + 1)
+    if doctor_ids is None and patient_ids is None:
+        return stmt
+    cond = User.id.in_(list(doctor_ids or ()))
+    if patient_ids is not None:
+        cond = cond | User.id.in_(
+            select(PatientDoctor.doctor_id).where(PatientDoctor.patient_id.in_(list(patient_ids)))
+        )
+    return stmt.where(cond)
+
+
+def _recent_query(patient_ids):
+    """The newest TREND_WINDOW entries of each patient, newest first."""
+    rank = func.row_number().over(
+        partition_by=Entry.user_id,
+        order_by=(Entry.created_at.desc(), Entry.id.desc()),
+    ).label("rank")
+    ranked = (
+        select(
+            Entry.user_id, Entry.id, Entry.created_at,
+            Entry.fib4, Entry.apri, Entry.nfs, Entry.homa_ir, Entry.risk_level, rank,
+        )
+        .where(Entry.user_id.in_(patient_ids))
+        .subquery()
+    )
+    return (
+        select(ranked)
+        .where(ranked.c.rank <= TREND_WINDOW)
+        .order_by(ranked.c.user_id, ranked.c.rank)
+    )
+
+
+def _aggregate_query(patient_ids):
+    return (
+        select(
+            Entry.user_id,
+            func.count(Entry.id).label("entry_count"),
+            *(
+                func.sum(case((Entry.risk_level == level, 1), else_=0)).label(column)
+                for level, column in _BUCKETS.items()
+            ),
+        )
+        .where(Entry.user_id.in_(patient_ids))
+        .group_by(Entry.user_id)
+    )
+
+
+def _summary_rows(aggregates, recent) -> list:
+    by_patient = {}
+    for r in recent:
+        by_patient.setdefault(r.user_id, []).append(r)
+    rows = []
+    for agg in aggregates:
+        latest = by_patient[agg.user_id][0]
+        rows.append({
+            "patient_id":      agg.user_id,
+            "entry_count":     agg.entry_count,
+            "last_entry_at":   latest.created_at,
+            "latest_entry_id": latest.id,
+            "fib4":            latest.fib4,
+            "apri":            latest.apri,
+            "nfs":             latest.nfs,
+            "homa_ir":         latest.homa_ir,
+            "risk_level":      latest.risk_level,
+            **{column: getattr(agg, column) or 0 for column in _BUCKETS.values()},
+            "fib4_slope":      _trend_slope(by_patient[agg.user_id]),
+            "updated_at":      datetime.utcnow(),
+        })
+    return rows
+
+
+async def refresh_patient_summary(db, patient_id: int):
+    """Recompute one patient's row from their entries. Caller commits."""
+    aggregates = (await db.execute(_aggregate_query([patient_id]))).all()
+    recent = (await db.execute(_recent_query([patient_id]))).all()
+    await db.execute(delete(PatientSummary).where(PatientSummary.patient_id == patient_id))
+    rows = _summary_rows(aggregates, recent)
+    if rows:
+        await db.execute(insert(PatientSummary), rows)
+
+
+async def record_entry(db, entry: Entry):
+    """
+    Fold a flushed, newest-for-its-patient entry into the summary row.
+    Falls back to a full per-patient refresh when the row doesn't exist yet.
+    Caller commits.
+    """
+    recent = (await db.execute(
+        select(Entry.created_at, Entry.fib4)
+        .where(Entry.user_id == entry.user_id)
+        .order_by(Entry.created_at.desc(), Entry.id.desc())
+        .limit(TREND_WINDOW)
+    )).all()
+    values = {
+        "entry_count":     PatientSummary.entry_count + 1,
+        "last_entry_at":   entry.created_at,
+        "latest_entry_id": entry.id,
+        "fib4":            entry.fib4,
+        "apri":            entry.apri,
+        "nfs":             entry.nfs,
+        "homa_ir":         entry.homa_ir,
+        "risk_level":      entry.risk_level,
+        "fib4_slope":      _trend_slope(recent),
+    }
+    bucket = _BUCKETS.get(entry.risk_level)
+    if bucket:
+        values[bucket] = getattr(PatientSummary, bucket) + 1
+    updated = (await db.execute(
+        update(PatientSummary)
+        .where(PatientSummary.patient_id == entry.user_id)
+        .values(**values)
+    )).rowcount
+    if not updated:
+        await refresh_patient_summary(db, entry.user_id)
+    await db.execute(bump_data_version(patient_ids=[entry.user_id]))
+
+
+def rebuild_summaries(db, batch_size: int = 500, patient_ids=None) -> int:
+    """
+    Regenerate PatientSummary rows from Entry (sync session) — every row, or
+    only those of `patient_ids`. Returns rows written.
+    """
+    if patient_ids is None:
+        db.execute(delete(PatientSummary))
+        db.execute(bump_data_version())
+        patient_ids = db.scalars(select(Entry.user_id).distinct().order_by(Entry.user_id)).all()
+    else:
+        patient_ids = sorted(patient_ids)
+        db.execute(bump_data_version(patient_ids=patient_ids))
+    total = 0
+    for i in range(0, len(patient_ids), batch_size):
+        batch = patient_ids[i:i + batch_size]
+        rows = _summary_rows(
+            db.execute(_aggregate_query(batch)).all(),
+            db.execute(_recent_query(batch)).all(),
+        )
+        db.execute(delete(PatientSummary).where(PatientSummary.patient_id.in_(batch)))
+        if rows:
+            db.execute(insert(PatientSummary), rows)
+        total += len(rows)
+    db.commit()
+    return total
@@ -0,0 +1,214 @@
+"""
+The one Jinja2 environment every router renders through.
+
+Compiled templates are kept in the environment's in-memory cache and their
+bytecode in a FileSystemBytecodeCache, so a restarted worker skips the
+parse/compile step; `warm_templates` compiles everything at startup. The
+`{% cache %}` tag stores a rendered block in a bounded LRU:
+
+    {% cache "patients", user.id, data_version %} ... {% endcache %}
+
+The key parts should include a stamp that changes with the data the block
+shows (User.data_version for doctor dashboards, see app.summaries); a None
+part renders the block uncached.
+
+`StreamingTemplateResponse` renders through the async overlay of the same
+environment and sends output as it is produced. Pass the slow parts of the
+context as async loaders and call them where the template needs them
+(`{% set risk = load_risk() %}`): the page shell above the first call goes
+out before any of them runs, and a loader inside a cached block is not
+called at all on a hit.
+"""
+import asyncio
+import functools
+import os as _os
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from fastapi.responses import StreamingResponse
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template, nodes
+from jinja2.ext import Extension
+
+from app import metrics
+from app.assets import image_variant, url_for
+
+_BACKEND      = _os.path.dirname(_os.path.dirname(_os.path.abspath(__file__)))
+TEMPLATES_DIR = _os.path.join(_BACKEND, "templates")
+
+TEMPLATE_BYTECODE_DIR = _os.environ.get("TEMPLATE_BYTECODE_DIR")   # default: a per-user temp dir
+TEMPLATE_AUTO_RELOAD  = _os.environ.get("TEMPLATE_AUTO_RELOAD", "1") == "1"   # 0 in production: no stat per render
+FRAGMENT_CACHE_SIZE   = int(_os.environ.get("FRAGMENT_CACHE_SIZE", "256"))
+FRAGMENT_CACHE_TTL    = float(_os.environ.get("FRAGMENT_CACHE_TTL", "300"))   # seconds
+STREAM_QUEUE          = 256   # rendered pieces buffered ahead of a slow client
+
+
+class FragmentCache:
+    """Bounded LRU of rendered template blocks; entries live for `ttl` seconds."""
+
+    def __init__(self, maxsize: int = FRAGMENT_CACHE_SIZE, ttl: float = FRAGMENT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl     = ttl
+        self._data   = OrderedDict()
+        self._lock   = Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key: tuple):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: tuple, html: str):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, html)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data), "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions,
+            }
+
+
+fragment_cache = FragmentCache()
+
+
+class FragmentCacheExtension(Extension):
+    """`{% cache key, ... %}body{% endcache %}` backed by `fragment_cache`."""
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        call = self.call_method("_render_cached", [nodes.List(parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render_cached(self, parts, caller):
+        if any(p is None for p in parts):
+            return caller()
+        key = tuple(parts)
+        html = fragment_cache.get(key)
+        if html is not None:
+            return html
+        if self.environment.is_async:   # caller() is a coroutine here
+            return self._render_async(key, caller)
+        html = caller()
+        fragment_cache.put(key, html)
+        return html
+
+    async def _render_async(self, key, caller):
+        html = await caller()
+        fragment_cache.put(key, html)
+        return html
+
+
+class _TimedTemplate(Template):
+    def render(self, *args, **kwargs) -> str:
+        with metrics.TEMPLATE_SECONDS.time(self.name):
+            return super().render(*args, **kwargs)
+
+
+def _bytecode_cache(pattern: str) -> FileSystemBytecodeCache:
+    return FileSystemBytecodeCache(TEMPLATE_BYTECODE_DIR, pattern)
+
+
+env = Environment(
+    loader=FileSystemLoader(TEMPLATES_DIR),
+    autoescape=True,
+    auto_reload=TEMPLATE_AUTO_RELOAD,
+    bytecode_cache=_bytecode_cache("__jinja2_%s.cache"),
+    extensions=[FragmentCacheExtension],
+)
+env.globals.update(url_for=url_for, image_variant=image_variant)   # manifest-aware, see app.assets
+env.template_class = _TimedTemplate
+templates = Jinja2Templates(env=env)
+# Shares globals and the loader. Async templates compile to different code, and
+# the bytecode cache keys on the template name only, hence a separate pattern.
+async_env = env.overlay(enable_async=True, bytecode_cache=_bytecode_cache("__jinja2_async_%s.cache"))
+
+
+# ── Streaming ─────────────────────────────────────────────────────────────────
+def once(loader):
+    """Memoize an async loader, so several template sections can share one query."""
+    task = None
+
+    @functools.wraps(loader)
+    def wrapper():
+        nonlocal task
+        if task is None:
+            task = asyncio.ensure_future(loader())
+        return task
+    return wrapper
+
+
+class StreamingTemplateResponse(StreamingResponse):
+    """
+    HTML rendered while it is sent. Whatever the template has produced is
+    flushed each time rendering waits on a loader, so the first byte does
+    not wait for the slowest query.
+    """
+
+    def __init__(self, name: str, context: dict, status_code: int = 200, headers=None):
+        self.template = async_env.get_template(name)
+        self.context  = context
+        super().__init__(self._body(), status_code=status_code,
+                         headers=headers, media_type="text/html")
+
+    async def _body(self):
+        queue = asyncio.Queue(STREAM_QUEUE)
+
+        async def produce():
+            t0, sql0 = time.perf_counter(), metrics.current_sql_seconds()
+            try:
+                async for piece in self.template.generate_async(self.context):
+                    await queue.put(piece)
+            except Exception:
+                await queue.put(None)   # wake the consumer, which re-raises below
+                raise
+            await queue.put(None)
+            sql = metrics.current_sql_seconds() - sql0
+            metrics.TEMPLATE_SECONDS.observe(time.perf_counter() - t0 - sql, self.template.name)
+
+        producer = asyncio.ensure_future(produce())
+        try:
+            done = False
+            while not done:
+                pieces = [await queue.get()]
+                while not queue.empty():   # everything rendered so far, as one chunk
+                    pieces.append(queue.get_nowait())
+                if pieces[-1] is None:
+                    pieces.pop()
+                    done = True
+                if pieces:
+                    yield "".join(pieces)
+            await producer   # re-raises a rendering error
+        finally:
+            producer.cancel()
+
+
+def warm_templates() -> int:
+    """Compile every template (filling the bytecode cache); returns how many."""
+    names = env.list_templates(extensions=("html",))
+    for name in names:
+        env.get_template(name)
+        async_env.get_template(name)
+    return len(names)
@@ -0,0 +1,224 @@
+"""
+Score history as downsampled time series.
+
+`patient_trends` reads one patient's (created_at, score) columns for a date
+range and returns a fixed-size payload whatever the history length: each
+series is cut to at most `points` points, either by Largest-Triangle-Three-
+Buckets (keeps the visual shape, every point is a real entry) or by
+equal-width time buckets carrying min/max/mean. Deltas, rates of change and
+rate-of-change alerts are computed over the full-resolution series with
+NumPy before downsampling, so a spike inside a bucket still raises its alert.
+"""
+from datetime import date, datetime, time
+
+import numpy as np
+from sqlalchemy import select
+
+from app.database import Entry
+
+TREND_METRICS    = ("fib4", "apri", "nfs", "homa_ir")
+TREND_METHODS    = ("lttb", "minmax")
+TREND_POINTS     = 200    # default points per series
+TREND_MAX_POINTS = 1000
+TREND_MIN_GAP    = 1.0    # days; closer entries are rated as if a day apart
+ROC_WINDOW_DAYS  = 30     # look-back of the rolling rate of change
+ALERT_LIMIT      = 20     # newest alerts returned
+
+# Rolling rise per 30 days that raises a rate-of-change alert. Every score
+# here worsens as it rises, so only increases alert, and a sustained rise
+# alerts once, where it first crosses the threshold.
+ROC_THRESHOLDS = {"fib4": 0.5, "apri": 0.5, "nfs": 1.0, "homa_ir": 2.0}
+
+
+# ── Vectorised series maths ──────────────────────────────────────────────────
+def slope_per_30d(t_days: np.ndarray, y: np.ndarray) -> float | None:
+    """Least-squares change in `y` per 30 days; None for fewer than two distinct times."""
+    if len(t_days) < 2:
+        return None
+    t = t_days - t_days.mean()
+    denom = float((t * t).sum())
+    if denom == 0.0:
+        return None
+    return round(float((t * (y - y.mean())).sum()) / denom * 30.0, 4)
+
+
+def deltas(t_days: np.ndarray, y: np.ndarray):
+    """
+    Per entry: the change from the previous entry, and the rolling rate —
+    the change since the oldest entry within ROC_WINDOW_DAYS, per 30 days
+    (NaN where there is nothing to compare against).
+    """
+    delta = np.diff(y, prepend=np.nan)
+    j = np.searchsorted(t_days, t_days - ROC_WINDOW_DAYS, side="left")
+    span = np.maximum(t_days - t_days[j], TREND_MIN_GAP)
+    rate = np.where(j < np.arange(len(y)), (y - y[j]) / span * 30.0, np.nan)
+    return delta, rate
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """
+    Indices of the `n` points kept by Largest-Triangle-Three-Buckets. The
+    first and last points always survive; each of the n - 2 buckets between
+    them keeps the point forming the largest triangle with the previously
+    kept point and the mean of the next bucket.
+    """
+    size = len(x)
+    if n >= size:
+        return np.arange(size)
+    if n < 3:
+        return np.array([0, size - 1])[:max(n, 1)]
+    edges = np.append(np.linspace(1, size - 1, n - 1).astype(int), size)
+    keep = np.empty(n, dtype=int)
+    keep[0], keep[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = edges[i + 1], edges[i + 2]
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+
+def bucket_stats(t: np.ndarray, y: np.ndarray, n: int):
+    """
+    Split the (sorted) time range into `n` equal-width buckets and return
+    (first index, count, min, max, mean) for each non-empty one.
+    """
+    span = t[-1] - t[0]
+    if span <= 0:
+        bucket = np.zeros(len(t), dtype=int)
+    else:
+        bucket = np.minimum(((t - t[0]) / span * n).astype(int), n - 1)
+    starts = np.flatnonzero(np.diff(bucket, prepend=-1))
+    counts = np.diff(np.append(starts, len(t)))
+    return (
+        starts,
+        counts,
+        np.minimum.reduceat(y, starts),
+        np.maximum.reduceat(y, starts),
+        np.add.reduceat(y, starts) / counts,
+    )
+
+
+# ── Payload ──────────────────────────────────────────────────────────────────
+def _r(values, digits: int = 3) -> list:
+    """Round for JSON, with NaN → None."""
+    return [None if np.isnan(v) else round(float(v), digits) for v in values]
+
+
+def _iso(stamps: np.ndarray, idx) -> list:
+    return [stamps[i].isoformat(timespec="minutes") for i in idx]
+
+
+def _series(method: str, stamps, t_days, y, delta, rate, points: int) -> dict:
+    if method == "minmax":
+        starts, counts, lo, hi, mean = bucket_stats(t_days, y, points)
+        return {
+            "t":     _iso(stamps, starts),
+            "count": counts.tolist(),
+            "min":   _r(lo),
+            "max":   _r(hi),
+            "mean":  _r(mean),
+        }
+    idx = lttb(t_days, y, points)
+    return {
+        "t":     _iso(stamps, idx),
+        "y":     _r(y[idx]),
+        "delta": _r(delta[idx]),
+        "rate":  _r(rate[idx]),
+    }
+
+
+def _summary(t_days, y, rate) -> dict:
+    return {
+        "first":         round(float(y[0]), 3),
+        "last":          round(float(y[-1]), 3),
+        "min":           round(float(y.min()), 3),
+        "max":           round(float(y.max()), 3),
+        "change":        round(float(y[-1] - y[0]), 3),
+        "slope_per_30d": slope_per_30d(t_days, y),
+        "max_rate":      _r([np.nanmax(rate)])[0] if len(y) > 1 else None,
+    }
+
+
+def _alerts(metric: str, stamps, y, delta, rate) -> list:
+    over = rate >= ROC_THRESHOLDS[metric]   # NaN compares False
+    hits = np.flatnonzero(over & ~np.concatenate(([False], over[:-1])))
+    return [
+        {
+            "metric": metric,
+            "at":     stamps[i].isoformat(timespec="minutes"),
+            "value":  round(float(y[i]), 3),
+            "delta":  round(float(delta[i]), 3),
+            "rate":   round(float(rate[i]), 3),
+        }
+        for i in hits
+    ]
+
+
+def build_trends(rows, metrics=TREND_METRICS, points: int = TREND_POINTS,
+                 method: str = "lttb") -> dict:
+    """Trend payload from (created_at, *metrics) rows in ascending time order."""
+    result = {"count": len(rows), "method": method, "points": points,
+              "series": {}, "summary": {}, "alerts": [], "alert_count": 0}
+    if not rows:
+        return result
+    stamps = np.array([r[0] for r in rows], dtype=object)
+    t_days = np.array([s.timestamp() for s in stamps]) / 86400.0
+    alerts = []
+    for k, metric in enumerate(metrics, start=1):
+        y = np.array([r[k] for r in rows], dtype=float)
+        delta, rate = deltas(t_days, y)
+        result["series"][metric] = _series(method, stamps, t_days, y, delta, rate, points)
+        result["summary"][metric] = _summary(t_days, y, rate)
+        alerts += _alerts(metric, stamps, y, delta, rate)
+    alerts.sort(key=lambda a: a["at"], reverse=True)
+    result["alerts"] = alerts[:ALERT_LIMIT]
+    result["alert_count"] = len(alerts)
+    return result
+
+
+def parse_metrics(spec: str | None) -> tuple:
+    """Comma-separated subset of TREND_METRICS; raises ValueError on unknown names."""
+    if not spec:
+        return TREND_METRICS
+    metrics = tuple(dict.fromkeys(m.strip() for m in spec.split(",") if m.strip()))
+    unknown = [m for m in metrics if m not in TREND_METRICS]
+    if unknown or not metrics:
+        raise ValueError(f"Unknown metric(s): {', '.join(unknown)}")
+    return metrics
+
+
+async def patient_trends(db, patient_id: int, start: date | None = None,
+                         end: date | None = None, metrics: str | None = None,
+                         points: int = TREND_POINTS, method: str = "lttb") -> dict:
+    """
+    Downsampled series for one patient from `start` to `end` (whole days,
+    either open). `metrics` is a comma-separated subset of TREND_METRICS.
+    Only the timestamp and requested score columns are read, along
+    ix_entries_user_created. Raises ValueError on a bad metric or method.
+    """
+    if method not in TREND_METHODS:
+        raise ValueError(f"Unknown method: {method}")
+    metrics = parse_metrics(metrics)
+    q = (
+        select(Entry.created_at, *(getattr(Entry, m) for m in metrics))
+        .where(Entry.user_id == patient_id)
+        .order_by(Entry.created_at, Entry.id)
+    )
+    if start:
+        q = q.where(Entry.created_at >= datetime.combine(start, time.min))
+    if end:
+        q = q.where(Entry.created_at <= datetime.combine(end, time.max))
+    rows = (await db.execute(q)).all()
+    result = build_trends(rows, metrics, max(3, min(points, TREND_MAX_POINTS)), method)
+    result.update({
+        "patient_id": patient_id,
+        "start":      start.isoformat() if start else None,
+        "end":        end.isoformat() if end else None,
+    })
+    return result
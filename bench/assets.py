@@ -0,0 +1,65 @@
+"""
+Bytes a first visit to /login downloads, before and after the asset build:
+runs `app.assets.build` on a temp copy of static/ and compares each
+referenced file as served unbuilt with what a modern browser would fetch
+afterwards (AVIF or WebP variant, brotli or gzip sibling).
+
+    python -m bench.assets
+"""
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+from app import assets
+
+
+def _login_urls(client) -> list:
+    html = client.get("/login").text
+    return re.findall(r'(?:src|href|srcset)="(/static/[^"]+)"', html)
+
+
+def _best(static_dir: str, url: str) -> str:
+    """Path of the smallest file a browser accepting br/avif would receive for `url`."""
+    path = os.path.join(static_dir, url.removeprefix(assets.STATIC_URL))
+    candidates = [p for p in (path + ".br", path + ".gz", path) if os.path.exists(p)]
+    return min(candidates, key=os.path.getsize)
+
+
+def run():
+    static_dir = os.path.join(tempfile.mkdtemp(), "static")
+    shutil.copytree(assets.STATIC_DIR, static_dir,
+                    ignore=shutil.ignore_patterns(assets.DIST))
+    client = TestClient(main.app)
+
+    assets.reload_manifest(static_dir)   # none there yet: unbuilt URLs
+    before = {u: os.path.getsize(os.path.join(static_dir, u.removeprefix(assets.STATIC_URL)))
+              for u in _login_urls(client)}
+
+    t0 = time.perf_counter()
+    assets.build(static_dir)
+    elapsed = time.perf_counter() - t0
+    after, images = {}, set()
+    for url in _login_urls(client):
+        name = url.rsplit("/", 1)[1].split(".")[0]
+        if url.endswith((".avif", ".webp", ".png")):
+            if name in images:
+                continue   # a <picture>: the browser takes its first (AVIF) source
+            images.add(name)
+        after[url] = os.path.getsize(_best(static_dir, url))
+
+    print(f"build          {elapsed:.2f}s")
+    for url, size in before.items():
+        print(f"  unbuilt  {size / 1024:8.1f} KiB  {url}")
+    for url, size in after.items():
+        print(f"  built    {size / 1024:8.1f} KiB  {url}")
+    print(f"login page     {sum(before.values()) / 1024:.0f} KiB -> {sum(after.values()) / 1024:.0f} KiB")
+    assets.reload_manifest()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,111 @@
+"""
+Query count and latency of GET /patient/community/posts on a seeded feed
+(10k posts, 100k likes, 20k replies by default), against the previous
+load-everything implementation.
+
+    python -m bench.community_feed [posts] [likes]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import main
+from app.database import (
+    Base, get_async_db, get_async_read_db, reconcile_post_counters,
+    User, CommunityPost, PostReply, PostLike,
+)
+from app.routes_auth import create_token
+
+
+def seed(session, n_posts: int, n_likes: int, n_users: int = 500, seed: int = 0):
+    rng = random.Random(seed)
+    session.execute(insert(User), [
+        {"id": i, "username": f"patient {i}", "email": f"p{i}@bench.local",
+         "password": "x", "role": "patient"}
+        for i in range(1, n_users + 1)
+    ])
+    start = datetime(2023, 1, 1)
+    session.execute(insert(CommunityPost), [
+        {"id": i, "author_id": rng.randint(1, n_users), "tag": "Question",
+         "body": f"post {i}", "created_at": start + timedelta(minutes=i)}
+        for i in range(1, n_posts + 1)
+    ])
+    session.execute(insert(PostReply), [
+        {"post_id": rng.randint(1, n_posts), "author_id": rng.randint(1, n_users),
+         "body": "reply", "created_at": start + timedelta(minutes=n_posts + i)}
+        for i in range(n_posts * 2)
+    ])
+    pairs = set()
+    while len(pairs) < n_likes:
+        pairs.add((rng.randint(1, n_posts), rng.randint(1, n_users)))
+    session.execute(insert(PostLike), [{"post_id": p, "user_id": u} for p, u in pairs])
+    reconcile_post_counters(session)
+    session.commit()
+
+
+def legacy_feed(db, viewer_id: int) -> list:
+    """The pre-pagination handler body: every post, lazy authors/likes/replies."""
+    posts = db.query(CommunityPost).order_by(CommunityPost.created_at.desc()).all()
+    liked_ids = {l.post_id for l in db.query(PostLike).filter(PostLike.user_id == viewer_id).all()}
+    return [{
+        "id": p.id, "author": p.author.username, "likes": len(p.likes),
+        "liked": p.id in liked_ids,
+        "replies": [{"author": r.author.username, "body": r.body} for r in p.replies],
+    } for p in posts]
+
+
+def main_(n_posts: int = 10_000, n_likes: int = 100_000):
+    path = os.path.join(tempfile.mkdtemp(), "feed_bench.db")
+    engine = create_engine("sqlite:///" + path, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    with Session() as s:
+        seed(s, n_posts, n_likes)
+
+    async_engine = create_async_engine("sqlite+aiosqlite:///" + path)
+    AsyncSession = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+    queries = [0]
+    count = lambda *a: queries.__setitem__(0, queries[0] + 1)
+    event.listen(engine, "before_cursor_execute", count)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count)
+
+    def timed(fn):
+        queries[0] = 0
+        t0 = time.perf_counter()
+        out = fn()
+        return out, queries[0], (time.perf_counter() - t0) * 1000
+
+    with Session() as s:
+        _, q_old, ms_old = timed(lambda: legacy_feed(s, 1))
+
+    async def override_db():
+        async with AsyncSession() as db:
+            yield db
+
+    main.app.dependency_overrides[get_async_db] = override_db
+    main.app.dependency_overrides[get_async_read_db] = override_db
+    client = TestClient(main.app)
+    client.cookies.set("access_token", create_token(1, "patient"))
+    r, q_new, ms_new = timed(lambda: client.get("/patient/community/posts"))
+    page = r.json()
+    r2, q_next, ms_next = timed(lambda: client.get(
+        "/patient/community/posts", params={"cursor": page["next_cursor"]}))
+    main.app.dependency_overrides.clear()
+
+    print(f"feed          {n_posts} posts, {n_likes} likes")
+    print(f"legacy        {q_old:>7} queries  {ms_old:>9.1f} ms  (all posts)")
+    print(f"page 1        {q_new:>7} queries  {ms_new:>9.1f} ms  ({len(page['posts'])} posts + totals)")
+    print(f"page 2        {q_next:>7} queries  {ms_next:>9.1f} ms  ({len(r2.json()['posts'])} posts)")
+
+
+if __name__ == "__main__":
+    main_(*(int(a) for a in sys.argv[1:3]))
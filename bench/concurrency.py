@@ -0,0 +1,126 @@
+"""
+Throughput of the dashboard endpoints at 1, 16 and 64 concurrent clients on
+one event loop (one worker), against a seeded temp DB: 20 doctors, 400
+patients with 50 entries each and a 2k-post community feed.
+
+    python -m bench.concurrency [seconds_per_level]
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import main
+from app.database import (
+    Base, get_async_db, get_async_read_db, get_read_session_factory, reconcile_post_counters,
+    User, Entry, PatientDoctor, CommunityPost,
+)
+from app.routes_auth import create_token
+from app.summaries import rebuild_summaries
+
+LEVELS = (1, 16, 64)
+
+
+def seed(session, n_doctors=20, n_patients=400, n_entries=50, n_posts=2000, seed=0):
+    rng = random.Random(seed)
+    n_users = n_doctors + n_patients
+    session.execute(insert(User), [
+        {"id": i, "username": f"user {i}", "email": f"u{i}@bench.local", "password": "x",
+         "role": "doctor" if i <= n_doctors else "patient"}
+        for i in range(1, n_users + 1)
+    ])
+    session.execute(insert(PatientDoctor), [
+        {"patient_id": p, "doctor_id": 1 + p % n_doctors}
+        for p in range(n_doctors + 1, n_users + 1)
+    ])
+    start = datetime(2023, 1, 1)
+    session.execute(insert(Entry), [
+        {"user_id": p, "age": 50, "ast": 40, "alt": 30, "platelets": 200, "albumin": 4,
+         "bmi": 27, "diabetes": False, "glucose": 100, "insulin": 10,
+         "fib4": f, "apri": 0.5, "nfs": -1.0, "homa_ir": 2.5,
+         "risk_level": "High" if f > 2.67 else "Low", "is_emergency": f > 2.67,
+         "created_at": start + timedelta(hours=p * n_entries + k)}
+        for p in range(n_doctors + 1, n_users + 1)
+        for k in range(n_entries)
+        for f in (round(rng.uniform(0.5, 3.5), 3),)
+    ])
+    session.execute(insert(CommunityPost), [
+        {"author_id": rng.randint(n_doctors + 1, n_users), "tag": "Question",
+         "body": f"post {i}", "created_at": start + timedelta(minutes=i)}
+        for i in range(n_posts)
+    ])
+    reconcile_post_counters(session)
+    session.commit()
+    rebuild_summaries(session)
+    return n_doctors, n_users
+
+
+async def _client(client, paths, deadline, latencies):
+    i = 0
+    while time.perf_counter() < deadline:
+        cookie, path = paths[i % len(paths)]
+        t0 = time.perf_counter()
+        r = await client.get(path, cookies={"access_token": cookie})
+        latencies.append((time.perf_counter() - t0) * 1000)
+        assert r.status_code == 200, (path, r.status_code)
+        i += 1
+
+
+async def run(seconds: float):
+    path = os.path.join(tempfile.mkdtemp(), "concurrency_bench.db")
+    engine = create_engine("sqlite:///" + path, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as s:
+        n_doctors, n_users = seed(s)
+
+    AsyncSession = async_sessionmaker(
+        bind=create_async_engine("sqlite+aiosqlite:///" + path),
+        autoflush=False, expire_on_commit=False,
+    )
+
+    async def override_db():
+        async with AsyncSession() as db:
+            yield db
+
+    main.app.dependency_overrides[get_async_db] = override_db
+    main.app.dependency_overrides[get_async_read_db] = override_db
+    main.app.dependency_overrides[get_read_session_factory] = lambda: AsyncSession
+    paths = []
+    for d in range(1, n_doctors + 1):
+        paths.append((create_token(d, "doctor"), "/doctor/home"))
+        p = n_doctors + d
+        paths.append((create_token(p, "patient"), "/patient/home"))
+        paths.append((create_token(p, "patient"), "/patient/community/posts"))
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await asyncio.gather(*(_client(client, paths, time.perf_counter() + 0.5, [])
+                               for _ in range(4)))   # warm auth cache and pool
+        print(f"mix           /doctor/home, /patient/home, /patient/community/posts")
+        for level in LEVELS:
+            latencies = []
+            t0 = time.perf_counter()
+            deadline = t0 + seconds
+            await asyncio.gather(*(
+                _client(client, paths[k:] + paths[:k], deadline, latencies)
+                for k in range(level)
+            ))
+            elapsed = time.perf_counter() - t0
+            ordered = sorted(latencies)
+            print(f"clients={level:<4} {len(latencies) / elapsed:8.1f} req/s  "
+                  f"p50={statistics.median(ordered):7.1f} ms  "
+                  f"p95={ordered[int(len(ordered) * 0.95)]:7.1f} ms")
+    main.app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(float(sys.argv[1]) if len(sys.argv) > 1 else 5.0))
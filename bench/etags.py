@@ -0,0 +1,73 @@
+"""
+Conditional GET savings: median latency of each polled view rendered in
+full versus revalidated with the ETag from the previous response (a 304),
+on the bench.concurrency temp DB (20 doctors, 400 patients, 2k posts).
+
+    python -m bench.etags [repeats]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import main
+from app.database import Base, get_async_db, get_async_read_db, get_read_session_factory
+from app.routes_auth import create_token
+from bench.concurrency import seed
+
+
+async def _median_ms(client, path, cookie, repeats, headers=None, status=200):
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        r = await client.get(path, cookies={"access_token": cookie}, headers=headers or {})
+        times.append((time.perf_counter() - t0) * 1000)
+        assert r.status_code == status, (path, r.status_code)
+    return statistics.median(times), len(r.content)
+
+
+async def run(repeats: int):
+    path = os.path.join(tempfile.mkdtemp(), "etags_bench.db")
+    engine = create_engine("sqlite:///" + path)
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as s:
+        n_doctors, _ = seed(s)
+    engine.dispose()
+
+    async_engine = create_async_engine("sqlite+aiosqlite:///" + path)
+    AsyncSession = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_db():
+        async with AsyncSession() as db:
+            yield db
+
+    main.app.dependency_overrides[get_async_db] = override_db
+    main.app.dependency_overrides[get_async_read_db] = override_db
+    main.app.dependency_overrides[get_read_session_factory] = lambda: AsyncSession
+    doctor, patient = create_token(1, "doctor"), create_token(n_doctors + 1, "patient")
+    views = (("/doctor/home", doctor), ("/patient/home", patient),
+             ("/patient/community/posts", patient))
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{'view':<26}  {'200':>16}  {'304':>9}")
+        for view, cookie in views:
+            etag = (await client.get(view, cookies={"access_token": cookie})).headers["etag"]
+            ms_full, size = await _median_ms(client, view, cookie, repeats)
+            ms_304, _ = await _median_ms(client, view, cookie, repeats,
+                                         {"If-None-Match": etag}, status=304)
+            print(f"{view:<26}  {ms_full:6.1f}ms {size / 1024:5.0f}KiB  {ms_304:7.2f}ms")
+
+    main.app.dependency_overrides.clear()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
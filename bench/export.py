@@ -0,0 +1,123 @@
+"""
+Streaming export throughput and memory: one doctor with 500 patients and
+`rows` entries between them (default 1M) in a temp DB, downloaded from
+GET /doctor/export as CSV, NDJSON and gzipped CSV through a real uvicorn
+server (the ASGI test transport would buffer the body). Reports rows/s,
+bytes on the wire and the peak RSS growth while streaming, which should
+not depend on `rows`.
+
+    python -m bench.export [rows] [port]
+"""
+import asyncio
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+import uvicorn
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import main
+from app import exporter
+from app.database import Base, get_async_db, get_async_read_db, User, Entry, PatientDoctor
+from app.routes_auth import create_token
+
+N_PATIENTS = 500
+SEED_BATCH = 50_000
+
+
+def seed(session, n_rows: int, seed: int = 0):
+    rng = random.Random(seed)
+    session.execute(insert(User), [
+        {"id": i, "username": f"user {i}", "email": f"u{i}@bench.local", "password": "x",
+         "role": "doctor" if i == 1 else "patient"}
+        for i in range(1, N_PATIENTS + 2)
+    ])
+    session.execute(insert(PatientDoctor), [
+        {"patient_id": p, "doctor_id": 1} for p in range(2, N_PATIENTS + 2)
+    ])
+    start = datetime(2010, 1, 1)
+    for lo in range(0, n_rows, SEED_BATCH):
+        session.execute(insert(Entry), [
+            {"user_id": 2 + k % N_PATIENTS, "age": 50, "ast": 40, "alt": 30, "platelets": 200,
+             "albumin": 4, "bmi": 27, "diabetes": False, "glucose": 100, "insulin": 10,
+             "fib4": f, "apri": 0.5, "nfs": -1.0, "homa_ir": 2.5,
+             "risk_level": "High" if f > 2.67 else "Low", "is_emergency": f > 2.67,
+             "created_at": start + timedelta(minutes=5 * k)}
+            for k in range(lo, min(lo + SEED_BATCH, n_rows))
+            for f in (round(rng.uniform(0.5, 3.5), 3),)
+        ])
+        session.commit()
+
+
+def _rss_mib() -> float:
+    """Current resident set size (Linux)."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+
+
+async def run(n_rows: int, port: int):
+    path = os.path.join(tempfile.mkdtemp(), "export_bench.db")
+    engine = create_engine("sqlite:///" + path)
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as s:
+        seed(s, n_rows)
+    engine.dispose()
+
+    async_engine = create_async_engine("sqlite+aiosqlite:///" + path)
+    AsyncSession = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_db():
+        async with AsyncSession() as db:
+            yield db
+
+    main.app.dependency_overrides[get_async_db] = override_db
+    main.app.dependency_overrides[get_async_read_db] = override_db
+    main.app.router.on_startup.clear()   # skip init_db and the outbox dispatcher
+    main.app.router.on_shutdown.clear()
+    stream = exporter.export_stream
+
+    def export_from_bench_db(*args, **kwargs):
+        return stream(*args, session_factory=AsyncSession, **kwargs)
+
+    import app.routes_doctor as routes_doctor
+    routes_doctor.export_stream = export_from_bench_db
+
+    server = uvicorn.Server(uvicorn.Config(main.app, port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    print(f"export        {n_rows} entries, {N_PATIENTS} patients")
+    cookies = {"access_token": create_token(1, "doctor")}
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None) as client:
+        for label, params in (("csv", {}), ("ndjson", {"format": "ndjson"}),
+                              ("csv.gz", {"gzip": "true"})):
+            rss_before = peak = _rss_mib()
+            size = 0
+            t0 = time.perf_counter()
+            async with client.stream("GET", "/doctor/export", params=params, cookies=cookies) as r:
+                assert r.status_code == 200, r.status_code
+                async for chunk in r.aiter_raw():
+                    size += len(chunk)
+                    peak = max(peak, _rss_mib())
+            elapsed = time.perf_counter() - t0
+            print(f"{label:<12}  {elapsed:6.1f}s  {n_rows / elapsed:9,.0f} rows/s  "
+                  f"{size / 2**20:7.1f} MiB  peak RSS +{peak - rss_before:.0f} MiB")
+
+    server.should_exit = True
+    await serving
+    routes_doctor.export_stream = stream
+    main.app.dependency_overrides.clear()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(run(int(args[0]) if args else 1_000_000, int(args[1]) if len(args) > 1 else 8766))
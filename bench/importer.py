@@ -0,0 +1,90 @@
+"""
+Bulk import throughput and memory: writes a synthetic CSV of lab panels
+(default 1M rows across 2,000 patients, about 1% of them invalid) and
+imports it into a temp DB through app.importer, reporting rows/s and the
+peak RSS growth during the import. RSS also counts SQLite's page cache and
+mmap, which are capped (SQLITE_CACHE_SIZE, SQLITE_MMAP_SIZE) but fill as the
+database grows; shrink them to see the importer's own, flat, footprint:
+
+    python -m bench.importer [rows] [chunk_size]
+    SQLITE_MMAP_SIZE=0 SQLITE_CACHE_SIZE=-8192 python -m bench.importer
+"""
+import csv
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, SQLITE_PRAGMAS, Entry, PatientSummary, User, configure_sqlite
+from app.importer import IMPORT_CHUNK, import_file
+
+N_PATIENTS = 2000
+
+
+def write_csv(path: str, n_rows: int, seed: int = 0):
+    rng = random.Random(seed)
+    start = datetime(2005, 1, 1)
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["patient_id", "created_at", "age", "ast", "alt", "platelets",
+                    "albumin", "bmi", "diabetes", "glucose", "insulin"])
+        for k in range(n_rows):
+            pid = 1 + k % N_PATIENTS
+            ast = round(rng.uniform(15, 160), 1)
+            if k % 100 == 99:
+                ast = "n/a"   # ~1% invalid rows
+            w.writerow([pid, (start + timedelta(minutes=10 * k)).isoformat(), rng.randint(25, 80), ast,
+                        round(rng.uniform(10, 120), 1), round(rng.uniform(60, 400)),
+                        round(rng.uniform(3, 5), 1), round(rng.uniform(18, 40), 1),
+                        rng.choice(("yes", "no")), round(rng.uniform(70, 200)),
+                        round(rng.uniform(2, 30), 1)])
+
+
+def _rss_mib() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024   # Linux: KiB
+
+
+def run(n_rows: int, chunk_size: int):
+    tmp = tempfile.mkdtemp()
+    csv_path = os.path.join(tmp, "labs.csv")
+    t0 = time.perf_counter()
+    write_csv(csv_path, n_rows)
+    print(f"csv           {n_rows} rows, {os.path.getsize(csv_path) / 2**20:.0f} MiB "
+          f"written in {time.perf_counter() - t0:.1f}s")
+
+    engine = configure_sqlite(create_engine("sqlite:///" + os.path.join(tmp, "import.db")),
+                              SQLITE_PRAGMAS)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as s:
+        s.execute(insert(User), [
+            {"id": i, "username": f"patient{i}", "email": f"p{i}@bench.local",
+             "password": "x", "role": "patient"}
+            for i in range(1, N_PATIENTS + 1)
+        ])
+        s.commit()
+
+    rss_before = _rss_mib()
+    t0 = time.perf_counter()
+    report = import_file(csv_path, "csv", chunk_size, session_factory=Session)
+    elapsed = time.perf_counter() - t0
+    with Session() as s:
+        stored = s.scalar(select(func.count(Entry.id)))
+        summaries = s.scalar(select(func.count(PatientSummary.patient_id)))
+    engine.dispose()
+
+    print(f"import        {report.imported} imported, {report.rejected} rejected, "
+          f"{stored} stored, {summaries} summaries")
+    print(f"throughput    {elapsed:.1f}s  {n_rows / elapsed:,.0f} rows/s  (chunk {chunk_size})")
+    print(f"peak RSS      +{_rss_mib() - rss_before:.0f} MiB during import")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    run(int(args[0]) if args else 1_000_000, int(args[1]) if len(args) > 1 else IMPORT_CHUNK)
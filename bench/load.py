@@ -0,0 +1,232 @@
+"""
+Scripted load against a HepaCheck seeded by bench.seed. Each virtual user
+signs in as a seeded doctor or patient, then loops through its role's
+scenario mix with no think time; the first `--warmup` seconds are dropped.
+Reports throughput and p50/p95/p99 per scenario.
+
+    python -m bench.seed --reset
+    python -m bench.load --users 32 --duration 30 --save main
+    ... change something ...
+    python -m bench.load --users 32 --duration 30 --compare main
+
+Without `--url` it starts `uvicorn main:app` on the configured database
+itself. `--save NAME` writes bench/baselines/NAME.json; `--compare NAME`
+checks this run against it and exits 1 if any scenario's p95 grew, or its
+throughput fell, by more than `--tolerance` (default 20%), or if it had
+errors, so a deploy script can gate on it.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import httpx
+
+from bench.seed import SEED_PASSWORD, doctor_email, patient_email
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+_ROOT        = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (scenario, weight) per role; "login" is also each user's first request
+MIXES = {
+    "doctor":  (("doctor_home", 10), ("login", 1)),
+    "patient": (("patient_home", 10), ("community_feed", 6), ("save_score", 2), ("login", 1)),
+}
+ACCEPTED = {"login": 303, "save_score": 303}   # anything else expects 200
+
+
+# ── Scenarios ─────────────────────────────────────────────────────────────────
+def _score_form(rng: random.Random) -> dict:
+    return {
+        "age": rng.randint(25, 80), "ast": round(rng.lognormvariate(3.4, 0.4), 1),
+        "alt": round(rng.lognormvariate(3.4, 0.4), 1), "platelets": rng.randint(60, 400),
+        "albumin": round(rng.uniform(3.0, 5.0), 1), "bmi": round(rng.uniform(19, 40), 1),
+        "diabetes": "true" if rng.random() < 0.15 else "false",
+        "glucose": rng.randint(75, 180), "insulin": round(rng.uniform(3, 30), 1),
+    }
+
+
+def _request(client, scenario: str, user: dict, rng: random.Random):
+    if scenario == "login":
+        return client.post("/login", data={"email": user["email"], "password": SEED_PASSWORD,
+                                           "role": user["role"]})
+    if scenario == "save_score":
+        return client.post("/patient/score", data=_score_form(rng))
+    path = {"doctor_home": "/doctor/home", "patient_home": "/patient/home",
+            "community_feed": "/patient/community/posts"}[scenario]
+    return client.get(path)
+
+
+async def _virtual_user(base_url: str, user: dict, seed: int, start: float, deadline: float, results: dict):
+    rng = random.Random(seed)
+    names, weights = zip(*MIXES[user["role"]])
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        scenario = "login"
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                r = await _request(client, scenario, user, rng)
+                ok = r.status_code == ACCEPTED.get(scenario, 200)
+            except httpx.HTTPError:
+                ok = False
+            t1 = time.perf_counter()
+            if t0 >= start:
+                latencies, errors = results.setdefault(scenario, ([], [0]))
+                latencies.append((t1 - t0) * 1000)
+                errors[0] += not ok
+            scenario = rng.choices(names, weights)[0]
+
+
+# ── Report ────────────────────────────────────────────────────────────────────
+def _percentile(ordered: list, q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def summarise(results: dict, seconds: float) -> dict:
+    summary = {}
+    for scenario, (latencies, errors) in sorted(results.items()):
+        ordered = sorted(latencies)
+        summary[scenario] = {
+            "requests": len(ordered),
+            "rps":      round(len(ordered) / seconds, 1),
+            "p50":      round(_percentile(ordered, 0.50), 1),
+            "p95":      round(_percentile(ordered, 0.95), 1),
+            "p99":      round(_percentile(ordered, 0.99), 1),
+            "errors":   errors[0],
+        }
+    return summary
+
+
+def print_summary(summary: dict):
+    print(f"{'scenario':<16} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for scenario, s in summary.items():
+        print(f"{scenario:<16} {s['requests']:8} {s['rps']:8.1f} {s['p50']:8.1f} "
+              f"{s['p95']:8.1f} {s['p99']:8.1f} {s['errors']:7}")
+    total = sum(s["requests"] for s in summary.values())
+    print(f"{'total':<16} {total:8} {sum(s['rps'] for s in summary.values()):8.1f}")
+
+
+def compare(summary: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions of `summary` against a saved baseline, as readable lines."""
+    problems = []
+    for scenario, base in baseline["scenarios"].items():
+        now = summary.get(scenario)
+        if now is None:
+            problems.append(f"{scenario}: not exercised in this run")
+            continue
+        if now["errors"]:
+            problems.append(f"{scenario}: {now['errors']} errors")
+        if now["p95"] > base["p95"] * (1 + tolerance):
+            problems.append(f"{scenario}: p95 {base['p95']}ms -> {now['p95']}ms")
+        if now["rps"] < base["rps"] * (1 - tolerance):
+            problems.append(f"{scenario}: throughput {base['rps']} -> {now['rps']} req/s")
+    return problems
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ── Server ────────────────────────────────────────────────────────────────────
+def _start_server(port: int) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=_ROOT,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/login", timeout=1)
+            return server
+        except httpx.HTTPError:
+            if server.poll() is not None:
+                sys.exit("uvicorn exited during startup")
+            time.sleep(0.2)
+    server.terminate()
+    sys.exit("uvicorn did not start within 30s")
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    users = []
+    for k in range(args.users):
+        if rng.random() < args.doctor_share:
+            users.append({"role": "doctor", "email": doctor_email(rng.randint(1, args.doctors))})
+        else:
+            users.append({"role": "patient", "email": patient_email(rng.randint(1, args.patients))})
+
+    results = {}
+    now = time.perf_counter()
+    start, deadline = now + args.warmup, now + args.warmup + args.duration
+    await asyncio.gather(*(
+        _virtual_user(args.url, user, args.seed + k, start, deadline, results)
+        for k, user in enumerate(users)
+    ))
+    return summarise(results, args.duration)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.load", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", help="server to load; default: start uvicorn on --port")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--users", type=int, default=16, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="unmeasured seconds first")
+    parser.add_argument("--doctor-share", type=float, default=0.2)
+    parser.add_argument("--doctors", type=int, default=20, help="as seeded")
+    parser.add_argument("--patients", type=int, default=2000, help="as seeded")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", metavar="NAME", help="write bench/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="exit 1 on regression against NAME")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    server = None
+    if not args.url:
+        server = _start_server(args.port)
+        args.url = f"http://127.0.0.1:{args.port}"
+    try:
+        summary = asyncio.run(run(args))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    print(f"{args.users} users ({args.doctor_share:.0%} doctors) for {args.duration:g}s against {args.url}")
+    print_summary(summary)
+
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, args.save + ".json")
+        with open(path, "w") as f:
+            json.dump({
+                "meta": {"created_at": datetime.utcnow().isoformat(timespec="seconds"),
+                         "git": git_revision(), "users": args.users, "duration": args.duration,
+                         "doctor_share": args.doctor_share, "seed": args.seed},
+                "scenarios": summary,
+            }, f, indent=1)
+        print(f"baseline saved to {path}")
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, args.compare + ".json")) as f:
+            baseline = json.load(f)
+        problems = compare(summary, baseline, args.tolerance)
+        meta = baseline["meta"]
+        print(f"against baseline {args.compare!r} ({meta['git'] or 'unknown revision'}, {meta['created_at']}): "
+              + ("no regressions" if not problems else f"{len(problems)} regressions"))
+        for line in problems:
+            print("  " + line)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+p50/p99 latency of an unrelated endpoint (GET /login) while a burst of
+concurrent POST /login requests is in flight, to show bcrypt no longer
+stalls the event loop.
+
+    python -m bench.login_burst [concurrent_logins]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import main
+from app.database import Base, get_async_db, User
+from app.routes_auth import pwd_ctx
+
+
+def _percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def _probe(client, stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await client.get("/login")
+        samples.append((time.perf_counter() - t0) * 1000)
+        await asyncio.sleep(0.005)
+
+
+async def run(n_logins: int):
+    path = os.path.join(tempfile.mkdtemp(), "login_bench.db")
+    engine = create_engine("sqlite:///" + path, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    with Session() as s:
+        s.add(User(username="bench", email="bench@bench.local",
+                   password=pwd_ctx.hash("secret123"), role="patient"))
+        s.commit()
+
+    AsyncSession = async_sessionmaker(
+        bind=create_async_engine("sqlite+aiosqlite:///" + path),
+        autoflush=False, expire_on_commit=False,
+    )
+
+    async def override_db():
+        async with AsyncSession() as db:
+            yield db
+
+    main.app.dependency_overrides[get_async_db] = override_db
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        idle = []
+        stop = asyncio.Event()
+        probe = asyncio.create_task(_probe(client, stop, idle))
+        await asyncio.sleep(1.0)
+        stop.set()
+        await probe
+
+        busy = []
+        stop = asyncio.Event()
+        probe = asyncio.create_task(_probe(client, stop, busy))
+        form = {"email": "bench@bench.local", "password": "secret123", "role": "patient"}
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(client.post("/login", data=form) for _ in range(n_logins)))
+        burst_s = time.perf_counter() - t0
+        stop.set()
+        await probe
+    main.app.dependency_overrides.clear()
+
+    codes = [r.status_code for r in results]
+    print(f"logins        {n_logins} concurrent, {burst_s:.2f} s "
+          f"({codes.count(303)} ok, {codes.count(503)} shed with 503)")
+    for label, samples in (("idle", idle), ("during burst", busy)):
+        print(f"GET /login    {label:<13} n={len(samples):<5} "
+              f"p50={statistics.median(samples):7.2f} ms  p99={_percentile(samples, 99):7.2f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
@@ -0,0 +1,108 @@
+"""
+End-to-end emergency alert latency: patients POST high-risk scores while
+their doctor holds GET /notifications/stream open; reports the time from
+each submit to the matching server-sent event, through the outbox
+dispatcher. Runs a real uvicorn server on a temp DB, since the SSE
+response never completes.
+
+    python -m bench.notify_latency [alerts] [port]
+"""
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+import uvicorn
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import main
+from app.database import Base, get_async_db, get_async_read_db, User, PatientDoctor
+from app.outbox import NotificationSink, OutboxDispatcher
+from app.routes_auth import create_token
+
+EMERGENCY_FORM = {"age": 65, "ast": 120, "alt": 30, "platelets": 80, "albumin": 3.0,
+                  "bmi": 31, "glucose": 110, "insulin": 14}
+
+
+async def _listen(client, doctor_token, received: dict, ready: asyncio.Event):
+    async with client.stream("GET", "/notifications/stream",
+                             cookies={"access_token": doctor_token}) as r:
+        ready.set()
+        async for line in r.aiter_lines():
+            if line.startswith("data: "):
+                message = json.loads(line[6:])["message"]
+                received[message.split(" from ")[1].split(":")[0]] = time.perf_counter()
+
+
+async def run(n_alerts: int, port: int):
+    path = os.path.join(tempfile.mkdtemp(), "notify_bench.db")
+    engine = create_engine("sqlite:///" + path)
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as s:
+        s.execute(insert(User), [
+            {"id": i, "username": f"patient{i}", "email": f"u{i}@bench.local",
+             "password": "x", "role": "doctor" if i == 1 else "patient"}
+            for i in range(1, n_alerts + 2)
+        ])
+        s.execute(insert(PatientDoctor), [
+            {"patient_id": i, "doctor_id": 1} for i in range(2, n_alerts + 2)
+        ])
+        s.commit()
+    engine.dispose()
+
+    async_engine = create_async_engine("sqlite+aiosqlite:///" + path)
+    AsyncSession = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_db():
+        async with AsyncSession() as db:
+            yield db
+
+    main.app.dependency_overrides[get_async_db] = override_db
+    main.app.dependency_overrides[get_async_read_db] = override_db
+    main.app.router.on_startup.clear()   # skip init_db and the default dispatcher
+    main.app.router.on_shutdown.clear()
+    dispatcher = OutboxDispatcher(AsyncSession, sinks=[NotificationSink()])
+    dispatcher.start()
+    server = uvicorn.Server(uvicorn.Config(main.app, port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    received, sent = {}, {}
+    ready = asyncio.Event()
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+        listener = asyncio.create_task(_listen(client, create_token(1, "doctor"), received, ready))
+        await ready.wait()
+        for i in range(2, n_alerts + 2):
+            sent[f"patient{i}"] = time.perf_counter()
+            await client.post("/patient/score", data=EMERGENCY_FORM,
+                              cookies={"access_token": create_token(i, "patient")})
+            await asyncio.sleep(0.02)
+        deadline = time.perf_counter() + 5
+        while len(received) < n_alerts and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        listener.cancel()
+
+    server.should_exit = True
+    await serving
+    await dispatcher.stop()
+    main.app.dependency_overrides.clear()
+    await async_engine.dispose()
+
+    latencies = sorted((received[k] - sent[k]) * 1000 for k in received)
+    print(f"alerts        {n_alerts} sent, {len(latencies)} received over SSE")
+    if latencies:
+        print(f"submit→event  p50={statistics.median(latencies):7.1f} ms  "
+              f"p95={latencies[int(len(latencies) * 0.95)]:7.1f} ms  "
+              f"max={latencies[-1]:7.1f} ms")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(run(int(args[0]) if args else 50, int(args[1]) if len(args) > 1 else 8765))
@@ -0,0 +1,215 @@
+"""
+Microbenchmarks for app.scores, pytest-benchmark style: each case is timed
+over `--rounds` rounds of a calibrated number of calls, and reported as
+median (and best) operations per second. Input shapes:
+
+  scalar   one call with Python floats
+  list     a loop over 1,000 Python values, as a row-by-row import scores
+  array    the vectorised path (score_batch, classify_risk_batch) on NumPy
+           arrays; the per-score functions have no vectorised form, so
+           their "array" case loops over NumPy scalars instead
+
+Before timing anything, the edge cases in scores_golden.json (zero or
+negative platelets, zero ALT, missing fields, risk cut-points, rounding
+ties) are scored by both score_entry and score_batch and must equal their
+golden outputs exactly; a mismatch exits 1. `--record` appends the run to
+bench/baselines/scores.jsonl and prints the change against the last
+recorded run, which is how ops/sec is tracked over time. `--regold`
+rewrites the golden file from the current code: only after reviewing an
+intended change of results.
+
+    python -m bench.scores [--rounds 7] [-k fib4] [--record] [--regold]
+"""
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+from app.scores import (
+    SCORE_FIELDS, batch_to_rows, classify_risk, classify_risk_batch, compute_apri, compute_fib4,
+    compute_homa_ir, compute_nfs, score_batch, score_entry,
+)
+from bench.load import BASELINE_DIR, git_revision
+from bench.scores_batch import synthetic_columns
+
+GOLDEN_PATH  = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scores_golden.json")
+HISTORY_PATH = os.path.join(BASELINE_DIR, "scores.jsonl")
+N            = 1_000    # values per list / array case
+MIN_TIME     = 0.05     # seconds per round, after calibration
+
+EDGE_CASES = {
+    "typical":            {"age": 50, "ast": 40, "alt": 30, "platelets": 200, "albumin": 4.0,
+                           "bmi": 27, "diabetes": False, "glucose": 100, "insulin": 10},
+    "zero_platelets":     {"age": 50, "ast": 40, "alt": 30, "platelets": 0, "albumin": 4.0,
+                           "bmi": 27, "diabetes": False, "glucose": 100, "insulin": 10},
+    "zero_alt":           {"age": 50, "ast": 40, "alt": 0, "platelets": 200, "albumin": 4.0,
+                           "bmi": 27, "diabetes": False, "glucose": 100, "insulin": 10},
+    "zero_both":          {"age": 50, "ast": 40, "alt": 0, "platelets": 0, "albumin": 4.0,
+                           "bmi": 27, "diabetes": True, "glucose": 100, "insulin": 10},
+    "negative_platelets": {"age": 50, "ast": 40, "alt": 30, "platelets": -5, "albumin": 4.0,
+                           "bmi": 27, "diabetes": False, "glucose": 100, "insulin": 10},
+    "missing_fields":     {},
+    "fib4_at_1.30":       {"age": 65, "ast": 40, "alt": 100, "platelets": 200, "albumin": 4.0,
+                           "bmi": 27, "diabetes": False, "glucose": 100, "insulin": 10},
+    "fib4_below_1.30":    {"age": 65, "ast": 39.97, "alt": 100, "platelets": 200, "albumin": 4.0,
+                           "bmi": 27, "diabetes": False, "glucose": 100, "insulin": 10},
+    "fib4_at_2.67":       {"age": 89, "ast": 30, "alt": 100, "platelets": 100, "albumin": 4.0,
+                           "bmi": 27, "diabetes": False, "glucose": 100, "insulin": 10},
+    "rounding_tie":       {"age": 50, "ast": 40, "alt": 30, "platelets": 200, "albumin": 4.0,
+                           "bmi": 27, "diabetes": False, "glucose": 81, "insulin": 0.0125},
+    "diabetic_obese":     {"age": 71, "ast": 88, "alt": 41, "platelets": 96, "albumin": 3.1,
+                           "bmi": 41.5, "diabetes": True, "glucose": 182, "insulin": 31.5},
+    "extreme":            {"age": 120, "ast": 10000, "alt": 1e-6, "platelets": 1e6, "albumin": 0,
+                           "bmi": 80, "diabetes": True, "glucose": 1000, "insulin": 500},
+}
+
+
+# ── Golden outputs ────────────────────────────────────────────────────────────
+def _batch_rows(cases: dict) -> list[dict]:
+    columns = {k: [c.get(k, False if k == "diabetes" else 0) for c in cases.values()] for k in SCORE_FIELDS}
+    return batch_to_rows(score_batch(columns))
+
+
+def check_golden() -> list[str]:
+    """Mismatches of score_entry and score_batch against scores_golden.json."""
+    with open(GOLDEN_PATH) as f:
+        golden = json.load(f)
+    problems = []
+    if set(golden) != set(EDGE_CASES):
+        problems.append("golden file and EDGE_CASES list different cases; run --regold after review")
+    for (name, case), batch_row in zip(EDGE_CASES.items(), _batch_rows(EDGE_CASES)):
+        expected = golden.get(name)
+        for path, got in (("score_entry", score_entry(case)), ("score_batch", batch_row)):
+            if got != expected:
+                diff = {k: (expected.get(k) if expected else None, v) for k, v in got.items()
+                        if not expected or expected.get(k) != v}
+                problems.append(f"{name} via {path}: (golden, got) {diff}")
+    return problems
+
+
+def write_golden():
+    with open(GOLDEN_PATH, "w") as f:
+        json.dump({name: score_entry(case) for name, case in EDGE_CASES.items()}, f, indent=1)
+        f.write("\n")
+
+
+# ── Timing ────────────────────────────────────────────────────────────────────
+def measure(fn, ops: int, rounds: int) -> dict:
+    """Time `fn` (which performs `ops` operations) like pytest-benchmark: calibrate, then rounds."""
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - t0 >= MIN_TIME / 10:
+            break
+        loops *= 10
+    loops = max(1, int(loops * MIN_TIME / max(time.perf_counter() - t0, 1e-9)))
+    per_op = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            for _ in range(loops):
+                fn()
+            per_op.append((time.perf_counter() - t0) / (loops * ops))
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {"ops": round(1 / statistics.median(per_op)), "best": round(1 / min(per_op)),
+            "stdev_pct": round(100 * statistics.pstdev(per_op) / statistics.mean(per_op), 1)}
+
+
+def cases() -> dict:
+    """name -> (callable, operations per call)."""
+    cols = synthetic_columns(N)
+    lists = {k: v.tolist() for k, v in cols.items()}
+    age, ast, alt, plt = lists["age"], lists["ast"], lists["alt"], lists["platelets"]
+    alb, bmi, dm = lists["albumin"], lists["bmi"], lists["diabetes"]
+    glu, ins = lists["glucose"], lists["insulin"]
+    a_age, a_ast, a_alt, a_plt = cols["age"], cols["ast"], cols["alt"], cols["platelets"]
+    a_alb, a_bmi, a_dm = cols["albumin"], cols["bmi"], cols["diabetes"]
+    a_glu, a_ins = cols["glucose"], cols["insulin"]
+    scored = score_batch(cols)
+    fib4, apri = scored["fib4"].tolist(), scored["apri"].tolist()
+    rows = [dict(zip(SCORE_FIELDS, r)) for r in zip(*(lists[k] for k in SCORE_FIELDS))]
+    row = rows[0]
+
+    return {
+        "compute_fib4[scalar]":    (lambda: compute_fib4(50.0, 40.0, 200.0, 30.0), 1),
+        "compute_fib4[list]":      (lambda: [compute_fib4(*v) for v in zip(age, ast, plt, alt)], N),
+        "compute_fib4[array]":     (lambda: [compute_fib4(*v) for v in zip(a_age, a_ast, a_plt, a_alt)], N),
+        "compute_apri[scalar]":    (lambda: compute_apri(40.0, 200.0), 1),
+        "compute_apri[list]":      (lambda: [compute_apri(a, p) for a, p in zip(ast, plt)], N),
+        "compute_apri[array]":     (lambda: [compute_apri(a, p) for a, p in zip(a_ast, a_plt)], N),
+        "compute_nfs[scalar]":     (lambda: compute_nfs(50.0, 27.0, False, 40.0, 30.0, 200.0, 4.0), 1),
+        "compute_nfs[list]":       (lambda: [compute_nfs(*v) for v in zip(age, bmi, dm, ast, alt, plt, alb)], N),
+        "compute_nfs[array]":      (lambda: [compute_nfs(*v) for v in zip(a_age, a_bmi, a_dm, a_ast, a_alt, a_plt, a_alb)], N),
+        "compute_homa_ir[scalar]": (lambda: compute_homa_ir(100.0, 10.0), 1),
+        "compute_homa_ir[list]":   (lambda: [compute_homa_ir(g, i) for g, i in zip(glu, ins)], N),
+        "compute_homa_ir[array]":  (lambda: [compute_homa_ir(g, i) for g, i in zip(a_glu, a_ins)], N),
+        "classify_risk[scalar]":   (lambda: classify_risk(1.5, 0.5), 1),
+        "classify_risk[list]":     (lambda: [classify_risk(f, a) for f, a in zip(fib4, apri)], N),
+        "classify_risk[array]":    (lambda: classify_risk_batch(scored["fib4"], scored["apri"]), N),
+        "score_entry[scalar]":     (lambda: score_entry(row), 1),
+        "score_entry[list]":       (lambda: [score_entry(r) for r in rows], N),
+        "score_entry[array]":      (lambda: score_batch(cols), N),
+    }
+
+
+# ── History ───────────────────────────────────────────────────────────────────
+def _last_recorded() -> dict | None:
+    try:
+        with open(HISTORY_PATH) as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return None
+    return json.loads(lines[-1]) if lines else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.scores", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("-k", dest="filter", default="", help="only cases whose name contains this")
+    parser.add_argument("--record", action="store_true", help="append to " + os.path.relpath(HISTORY_PATH))
+    parser.add_argument("--regold", action="store_true", help="rewrite scores_golden.json, then check")
+    args = parser.parse_args(argv)
+
+    if args.regold:
+        write_golden()
+    problems = check_golden()
+    print(f"golden        {len(EDGE_CASES)} edge cases, score_entry and score_batch: "
+          + ("match" if not problems else f"{len(problems)} mismatches"))
+    for line in problems:
+        print("  " + line)
+    if problems:
+        sys.exit(1)
+
+    previous = _last_recorded()
+    results = {}
+    print(f"{'case':<26} {'ops/s':>14} {'best':>14} {'stdev':>7} {'vs last':>8}")
+    for name, (fn, ops) in cases().items():
+        if args.filter not in name:
+            continue
+        r = results[name] = measure(fn, ops, args.rounds)
+        before = (previous or {}).get("results", {}).get(name)
+        change = f"{(r['ops'] / before['ops'] - 1) * 100:+7.1f}%" if before else ""
+        print(f"{name:<26} {r['ops']:>14,} {r['best']:>14,} {r['stdev_pct']:>6.1f}% {change:>8}")
+    if previous:
+        print(f"vs last       {previous['git'] or 'unknown revision'}, {previous['created_at']}")
+
+    if args.record:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(HISTORY_PATH, "a") as f:
+            f.write(json.dumps({"created_at": datetime.utcnow().isoformat(timespec="seconds"),
+                                "git": git_revision(), "results": results}) + "\n")
+        print(f"recorded to {HISTORY_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Rows/second of app.scores.score_batch against the per-row score_entry path,
+plus an element-for-element equality check between the two.
+
+    python -m bench.scores_batch [rows]
+"""
+import sys
+import time
+
+import numpy as np
+
+from app.scores import SCORE_FIELDS, score_batch, score_entry, batch_to_rows
+
+
+def synthetic_columns(n: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    cols = {
+        "age":       rng.uniform(18, 90, n).round(0),
+        "ast":       rng.uniform(10, 250, n).round(1),
+        "alt":       rng.uniform(5, 300, n).round(1),
+        "platelets": rng.uniform(40, 450, n).round(0),
+        "albumin":   rng.uniform(2.5, 5.5, n).round(1),
+        "bmi":       rng.uniform(17, 45, n).round(1),
+        "diabetes":  rng.integers(0, 2, n).astype(bool),
+        "glucose":   rng.uniform(60, 250, n).round(0),
+        "insulin":   rng.uniform(2, 40, n).round(1),
+    }
+    # Exercise the platelets <= 0 / alt <= 0 guards
+    cols["platelets"][::97] = 0
+    cols["alt"][::89] = 0
+    return cols
+
+
+def main(n: int = 50_000):
+    cols = synthetic_columns(n)
+
+    t0 = time.perf_counter()
+    batch = score_batch(cols)
+    t_batch = time.perf_counter() - t0
+
+    rows = [{k: cols[k][i].item() for k in SCORE_FIELDS} for i in range(n)]
+    t0 = time.perf_counter()
+    scalar = [score_entry(r) for r in rows]
+    t_scalar = time.perf_counter() - t0
+
+    mismatches = sum(a != b for a, b in zip(batch_to_rows(batch), scalar))
+
+    print(f"rows          {n}")
+    print(f"score_entry   {n / t_scalar:>14,.0f} rows/s")
+    print(f"score_batch   {n / t_batch:>14,.0f} rows/s  ({t_scalar / t_batch:.1f}x)")
+    print(f"mismatches    {mismatches}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000) else 0)
@@ -0,0 +1,214 @@
+"""
+Synthetic population for load tests and local profiling, written into the
+app's own database (DATABASE_URL; by default app/hepacheck.db):
+
+  - doctors with profiles, and patients assigned to them round-robin
+  - `years` of score entries per patient, a visit every ~2 months, from a
+    per-patient baseline (age, BMI, diabetes, a latent fibrosis stage) that
+    drifts slowly, with visit-to-visit lab noise; scored by score_batch
+  - flags on about a third of the emergency entries (older ones resolved),
+    with the patient notifications they send, and "new patient" notes
+  - community posts, replies and likes
+
+Every account's password is SEED_PASSWORD and its email comes from
+`doctor_email` / `patient_email`, which is how bench.load signs in.
+
+    python -m bench.seed [--doctors 20] [--patients 2000] [--years 3] [--seed 0] [--reset]
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from passlib.context import CryptContext
+from sqlalchemy import func, insert, select
+
+from app.database import (
+    Base, SessionLocal, engine, init_db, reconcile_post_counters, reconcile_unread_counts,
+    User, DoctorProfile, PatientDoctor, Entry, Flag, Notification, CommunityPost, PostReply, PostLike,
+)
+from app.scores import SCORE_FIELDS, batch_to_rows, score_batch
+from app.summaries import rebuild_summaries
+
+SEED_PASSWORD     = "hepacheck-bench"
+VISIT_DAYS        = 60     # mean days between a patient's entries
+FLAG_SHARE        = 0.35   # emergency entries a doctor flags
+RESOLVE_AFTER     = 90     # days; older flags are resolved
+POSTS_PER_PATIENT = 0.5
+BATCH             = 20_000
+
+SPECIALISATIONS = ("Hepatology", "Gastroenterology", "Internal Medicine", "Endocrinology")
+CITIES          = ("Lisbon", "Porto", "Madrid", "Lyon", "Milan", "Munich", "Leeds", "Dublin")
+POST_TAGS       = ("Question", "Experience", "Tip", "Support")
+
+
+def doctor_email(n: int) -> str:
+    return f"doctor{n}@seed.hepacheck"
+
+
+def patient_email(n: int) -> str:
+    return f"patient{n}@seed.hepacheck"
+
+
+def _insert(db, model, rows: list):
+    # An empty list would insert one all-defaults row
+    for i in range(0, len(rows), BATCH):
+        db.execute(insert(model), rows[i:i + BATCH])
+
+
+def _users(n_doctors: int, n_patients: int, password: str) -> list[dict]:
+    doctors = [{"id": i, "username": f"Dr {i}", "email": doctor_email(i), "password": password,
+                "role": "doctor"} for i in range(1, n_doctors + 1)]
+    patients = [{"id": n_doctors + i, "username": f"Patient {i}", "email": patient_email(i),
+                 "password": password, "role": "patient"} for i in range(1, n_patients + 1)]
+    return doctors + patients
+
+
+def _entries(patient_ids: list, years: float, now: datetime, rng) -> list[dict]:
+    """Visits per patient from a drifting baseline; scored in one score_batch call."""
+    n = len(patient_ids)
+    age0     = np.clip(rng.normal(52, 13, n), 20, 85)
+    bmi0     = np.clip(rng.normal(29, 5, n), 18, 48)
+    diabetic = rng.random(n) < np.clip(0.08 + 0.02 * (bmi0 - 25), 0.03, 0.5)
+    stage    = rng.lognormal(-1.2, 0.8, n)                  # latent fibrosis, mostly mild
+    drift    = rng.normal(0.05, 0.1, n)                     # stage change per year
+    ast0     = 22 * (1 + stage) * rng.lognormal(0, 0.2, n)
+    alt0     = 26 * (1 + 0.5 * stage) * rng.lognormal(0, 0.3, n)
+
+    span = years * 365
+    start = now - timedelta(days=span)
+    cols = {k: [] for k in SCORE_FIELDS}
+    owners, created = [], []
+    for i, pid in enumerate(patient_ids):
+        days = np.cumsum(rng.exponential(VISIT_DAYS, int(span / VISIT_DAYS * 2) + 2))
+        days = days[days < span]
+        k = len(days)
+        if not k:
+            continue
+        t = days / 365
+        s = np.maximum(stage[i] + drift[i] * t, 0)
+        cols["age"].extend(np.round(age0[i] + t).tolist())
+        cols["ast"].extend(np.round(ast0[i] * (1 + s - stage[i]) * rng.lognormal(0, 0.15, k), 1).tolist())
+        cols["alt"].extend(np.round(alt0[i] * rng.lognormal(0, 0.15, k), 1).tolist())
+        cols["platelets"].extend(np.round(np.clip(rng.normal(260 - 70 * s, 35), 25, 480), 0).tolist())
+        cols["albumin"].extend(np.round(np.clip(rng.normal(4.4 - 0.35 * s, 0.25), 2.0, 5.5), 1).tolist())
+        cols["bmi"].extend(np.round(bmi0[i] + rng.normal(0, 0.6, k), 1).tolist())
+        cols["diabetes"].extend([bool(diabetic[i])] * k)
+        cols["glucose"].extend(np.round(rng.normal(92 + 35 * diabetic[i], 12, k), 0).tolist())
+        cols["insulin"].extend(np.round(rng.lognormal(np.log(8 + 0.6 * (bmi0[i] - 22)), 0.3, k), 1).tolist())
+        owners.extend([pid] * k)
+        created.extend(start + timedelta(days=float(d)) for d in days)
+
+    rows = batch_to_rows(score_batch(cols))
+    for row, pid, at in zip(rows, owners, created):
+        row["user_id"], row["created_at"] = pid, at
+    return rows
+
+
+def seed(db, n_doctors: int = 20, n_patients: int = 2000, years: float = 3, seed: int = 0) -> dict:
+    """Write the population through sync session `db`; returns row counts."""
+    rng = np.random.default_rng(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    password = CryptContext(schemes=["bcrypt"]).hash(SEED_PASSWORD)   # once: every account shares it
+
+    users = _users(n_doctors, n_patients, password)
+    _insert(db, User, users)
+    _insert(db, DoctorProfile, [
+        {"user_id": d, "medical_licence": f"ML-{100000 + d}", "highest_degree": "MD",
+         "specialisation": SPECIALISATIONS[d % len(SPECIALISATIONS)],
+         "years_practicing": int(rng.integers(2, 35)), "city": CITIES[d % len(CITIES)],
+         "clinic_hospital": f"Clinic {d}", "bio": "", "is_verified": True}
+        for d in range(1, n_doctors + 1)
+    ])
+    patient_ids = list(range(n_doctors + 1, n_doctors + n_patients + 1))
+    doctor_of = {p: 1 + p % n_doctors for p in patient_ids}
+    _insert(db, PatientDoctor, [
+        {"patient_id": p, "doctor_id": d, "assigned_at": now - timedelta(days=years * 365)}
+        for p, d in doctor_of.items()
+    ])
+
+    entries = _entries(patient_ids, years, now, rng)
+    _insert(db, Entry, entries)
+    db.flush()
+
+    # Flags on a share of emergency entries, each telling the patient
+    emergencies = db.execute(
+        select(Entry.id, Entry.user_id, Entry.created_at, Entry.fib4, Entry.apri)
+        .where(Entry.is_emergency == True)
+    ).all()
+    flagged = [e for e in emergencies if rng.random() < FLAG_SHARE]
+    resolve_before = now - timedelta(days=RESOLVE_AFTER)
+    _insert(db, Flag, [
+        {"entry_id": e.id, "doctor_id": doctor_of[e.user_id], "note": "Please book a follow-up.",
+         "status": "resolved" if e.created_at < resolve_before else "open",
+         "created_at": e.created_at + timedelta(days=1)}
+        for e in flagged
+    ])
+    notes = [
+        {"user_id": e.user_id, "kind": "info", "is_read": e.created_at < resolve_before,
+         "created_at": e.created_at + timedelta(days=1),
+         "message": f"Dr {doctor_of[e.user_id]} has flagged your entry from "
+                    f"{e.created_at:%b %d, %Y} (FIB-4: {e.fib4}, APRI: {e.apri})."}
+        for e in flagged
+    ]
+    notes += [
+        {"user_id": d, "kind": "info", "is_read": rng.random() < 0.9,
+         "created_at": now - timedelta(days=float(rng.uniform(0, years * 365))),
+         "message": f"Patient {p - n_doctors} has chosen you as their doctor."}
+        for p, d in doctor_of.items()
+    ]
+    _insert(db, Notification, notes)
+
+    # Community: posts by patients, replies and one-per-user likes
+    n_posts = int(n_patients * POSTS_PER_PATIENT)
+    post_times = sorted(now - timedelta(minutes=float(m)) for m in rng.uniform(0, years * 525_600, n_posts))
+    _insert(db, CommunityPost, [
+        {"author_id": int(rng.choice(patient_ids)), "tag": POST_TAGS[i % len(POST_TAGS)],
+         "body": f"Seeded post {i}: how are your numbers trending?", "created_at": at, "updated_at": at}
+        for i, at in enumerate(post_times)
+    ])
+    posts = db.execute(select(CommunityPost.id, CommunityPost.created_at)).all()
+    replies, likes = [], []
+    for post in posts:
+        for r in range(int(rng.poisson(1.5))):
+            replies.append({"post_id": post.id, "author_id": int(rng.choice(patient_ids)),
+                            "body": f"Reply {r}", "created_at": post.created_at + timedelta(hours=r + 1)})
+        for user_id in set(rng.choice(patient_ids, int(rng.poisson(3))).tolist()):
+            likes.append({"post_id": post.id, "user_id": user_id})
+    _insert(db, PostReply, replies)
+    _insert(db, PostLike, likes)
+    db.commit()
+
+    with engine.begin() as conn:
+        reconcile_post_counters(conn)
+        reconcile_unread_counts(conn)
+    rebuild_summaries(db)
+    return {"users": len(users), "entries": len(entries), "flags": len(flagged),
+            "notifications": len(notes), "posts": len(posts), "replies": len(replies), "likes": len(likes)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.seed", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--doctors", type=int, default=20)
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reset", action="store_true", help="drop and recreate every table first")
+    args = parser.parse_args(argv)
+
+    if args.reset:
+        Base.metadata.drop_all(bind=engine)
+    init_db()
+    with SessionLocal() as db:
+        if db.scalar(select(func.count(User.id))):
+            sys.exit(f"{engine.url} already has users; pass --reset to replace them.")
+        t0 = time.perf_counter()
+        counts = seed(db, args.doctors, args.patients, args.years, args.seed)
+    print(f"Seeded {engine.url} in {time.perf_counter() - t0:.1f}s: "
+          + ", ".join(f"{n} {name}" for name, n in counts.items()))
+    print(f"Sign in as {doctor_email(1)} / {patient_email(1)}, password {SEED_PASSWORD!r}")
+
+
+if __name__ == "__main__":
+    main()
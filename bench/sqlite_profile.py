@@ -0,0 +1,110 @@
+"""
+Mixed read/write throughput under the default SQLite setup (rollback journal,
+synchronous=FULL, a new connection per session) versus the engine profile in
+app.database (WAL, tuned pragmas, pooled connections). Writers POST
+/patient/score while readers load /doctor/home, on a freshly seeded temp DB
+per profile.
+
+    python -m bench.sqlite_profile [seconds] [writers] [readers]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+import main
+from app.database import (
+    Base, get_async_db, get_async_read_db, get_read_session_factory, configure_sqlite,
+    SQLITE_PRAGMAS, DB_POOL_SIZE, DB_MAX_OVERFLOW,
+)
+from app.routes_auth import create_token
+from bench.concurrency import seed
+
+PROFILES = {
+    "default": ({"journal_mode": "DELETE", "synchronous": "FULL"}, {"poolclass": NullPool}),
+    "tuned":   (SQLITE_PRAGMAS, {"poolclass": AsyncAdaptedQueuePool,
+                                 "pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW}),
+}
+SCORE_FORM = {"age": 55, "ast": 48, "alt": 35, "platelets": 180, "albumin": 4.1,
+              "bmi": 29, "glucose": 105, "insulin": 12}
+
+
+async def _worker(client, method, path, cookie, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        if method == "POST":
+            r = await client.post(path, data=SCORE_FORM, cookies={"access_token": cookie})
+        else:
+            r = await client.get(path, cookies={"access_token": cookie})
+        if r.status_code in (200, 303):
+            latencies.append((time.perf_counter() - t0) * 1000)
+        else:
+            errors.append(r.status_code)
+
+
+async def run_profile(name: str, seconds: float, n_writers: int, n_readers: int):
+    pragmas, pool_kw = PROFILES[name]
+    path = os.path.join(tempfile.mkdtemp(), f"{name}.db")
+    engine = configure_sqlite(create_engine("sqlite:///" + path), pragmas)
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as s:
+        n_doctors, _ = seed(s)
+    engine.dispose()
+
+    async_engine = configure_sqlite(
+        create_async_engine("sqlite+aiosqlite:///" + path, **pool_kw), pragmas)
+    AsyncSession = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_db():
+        async with AsyncSession() as db:
+            yield db
+
+    main.app.dependency_overrides[get_async_db] = override_db
+    main.app.dependency_overrides[get_async_read_db] = override_db
+    main.app.dependency_overrides[get_read_session_factory] = lambda: AsyncSession
+    reads, writes, errors = [], [], []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(
+            *(_worker(client, "POST", "/patient/score",
+                      create_token(n_doctors + 1 + k, "patient"), deadline, writes, errors)
+              for k in range(n_writers)),
+            *(_worker(client, "GET", "/doctor/home",
+                      create_token(1 + k % n_doctors, "doctor"), deadline, reads, errors)
+              for k in range(n_readers)),
+        )
+    main.app.dependency_overrides.clear()
+    await async_engine.dispose()
+
+    for label, samples in (("reads", reads), ("writes", writes)):
+        ordered = sorted(samples) or [0.0]
+        print(f"{name:<8} {label:<7} {len(samples) / seconds:8.1f} req/s  "
+              f"p50={statistics.median(ordered):7.1f} ms  "
+              f"p95={ordered[int(len(ordered) * 0.95)]:7.1f} ms")
+    if errors:
+        print(f"{name:<8} errors  {len(errors)} ({sorted(set(errors))})")
+
+
+async def run(seconds: float, n_writers: int, n_readers: int):
+    print(f"mix      {n_writers} writers (POST /patient/score), "
+          f"{n_readers} readers (GET /doctor/home), {seconds:.0f} s each")
+    for name in PROFILES:
+        await run_profile(name, seconds, n_writers, n_readers)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(run(
+        float(args[0]) if len(args) > 0 else 10.0,
+        int(args[1]) if len(args) > 1 else 8,
+        int(args[2]) if len(args) > 2 else 16,
+    ))
@@ -0,0 +1,101 @@
+"""
+Time to first byte of the streamed doctor dashboard as the panel grows: one
+doctor with `patients` patients (20 entries each) per run, served by a real
+uvicorn server (the ASGI test transport would buffer the body), fragment
+cache cleared before every request. Before streaming the first byte waited
+for the whole page, i.e. TTFB was the "total" column; now it should stay
+flat. Also reports the page's size on the wire per Accept-Encoding.
+
+    python -m bench.streaming [repeats] [port]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+import uvicorn
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import main
+from app import templating
+from app.database import Base, get_async_db, get_async_read_db, get_read_session_factory
+from app.routes_auth import create_token
+from bench.concurrency import seed
+
+PANEL_SIZES = (50, 200, 800)
+ENCODINGS   = ("identity", "gzip", "br")
+
+
+async def _fetch(client, cookies, encoding: str = "identity"):
+    """(ms to the first body byte, ms to the last, bytes on the wire)."""
+    templating.fragment_cache.clear()
+    t0 = time.perf_counter()
+    first, size = None, 0
+    async with client.stream("GET", "/doctor/home", cookies=cookies,
+                             headers={"Accept-Encoding": encoding}) as r:
+        assert r.status_code == 200, r.status_code
+        async for chunk in r.aiter_raw():
+            if first is None:
+                first = time.perf_counter()
+            size += len(chunk)
+    end = time.perf_counter()
+    return (first - t0) * 1000, (end - t0) * 1000, size
+
+
+async def _panel(n_patients: int, repeats: int, port: int):
+    path = os.path.join(tempfile.mkdtemp(), "streaming_bench.db")
+    engine = create_engine("sqlite:///" + path)
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as s:
+        seed(s, n_doctors=1, n_patients=n_patients, n_entries=20, n_posts=1)
+    engine.dispose()
+
+    async_engine = create_async_engine("sqlite+aiosqlite:///" + path)
+    AsyncSession = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_db():
+        async with AsyncSession() as db:
+            yield db
+
+    main.app.dependency_overrides[get_async_db] = override_db
+    main.app.dependency_overrides[get_async_read_db] = override_db
+    main.app.dependency_overrides[get_read_session_factory] = lambda: AsyncSession
+
+    server = uvicorn.Server(uvicorn.Config(main.app, port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    cookies = {"access_token": create_token(1, "doctor")}
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None) as client:
+        await _fetch(client, cookies)   # warm-up
+        runs = [await _fetch(client, cookies) for _ in range(repeats)]
+        sizes = {enc: (await _fetch(client, cookies, enc))[2] for enc in ENCODINGS}
+    ttfb = statistics.median(r[0] for r in runs)
+    total = statistics.median(r[1] for r in runs)
+    print(f"{n_patients:8}  {ttfb:8.1f}ms  {total:8.1f}ms  "
+          + "  ".join(f"{sizes[enc] / 1024:7.1f}" for enc in ENCODINGS))
+
+    server.should_exit = True
+    await serving
+    main.app.dependency_overrides.clear()
+    await async_engine.dispose()
+
+
+async def run(repeats: int, port: int):
+    main.app.router.on_startup.clear()   # skip init_db and the outbox dispatcher
+    main.app.router.on_shutdown.clear()
+    print(f"{'patients':>8}  {'TTFB':>10}  {'total':>10}  "
+          + "  ".join(f"{enc + ' KiB':>7}" for enc in ENCODINGS))
+    for n in PANEL_SIZES:
+        await _panel(n, repeats, port)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(run(int(args[0]) if args else 10, int(args[1]) if len(args) > 1 else 8765))
@@ -0,0 +1,94 @@
+"""
+Template cost of the doctor dashboard: compiling every template from source
+versus loading it from the bytecode cache (a fresh worker), then rendering
+doctor/home.html for `patients` patients (default 400) with the fragment
+cache bypassed (data_version None) versus warm.
+
+    python -m bench.templates [patients] [repeats]
+"""
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from app import templating
+from app.routes_doctor import _patient_rows, _risk_distribution
+
+
+def context(n: int, data_version, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    patients = [SimpleNamespace(id=i, username=f"patient {i}", email=f"p{i}@bench.local")
+                for i in range(2, n + 2)]
+    summaries = {
+        p.id: SimpleNamespace(
+            entry_count=rng.randint(1, 200),
+            last_entry_at=datetime(2024, 1, 1) + timedelta(days=rng.randint(0, 600)),
+            fib4=round(rng.uniform(0.5, 3.5), 3), fib4_slope=round(rng.uniform(-0.2, 0.2), 3),
+            low_count=rng.randint(0, 50), moderate_count=rng.randint(0, 50), high_count=rng.randint(0, 50),
+        )
+        for p in patients if rng.random() < 0.9
+    }
+    home = {
+        "stats": {"total_patients": n, "total_entries": sum(s.entry_count for s in summaries.values()),
+                  "open_flags": 0, "emergencies": 0},
+        "entries": [], "next_cursor": None, "flagged_entry_ids": set(), "emergencies": [], "open_flags": [],
+    }
+    rows, risk = _patient_rows(patients, summaries), _risk_distribution(summaries)
+    return {
+        "request": None, "user": SimpleNamespace(id=1, username="doctor", email="d@bench.local"),
+        "data_version": data_version, "open_flag_count": 0, "is_first_page": True,
+        "load_home": lambda: home, "load_risk": lambda: risk, "load_patient_rows": lambda: rows,
+    }
+
+
+def _env(bytecode_dir=None) -> Environment:
+    env = Environment(
+        loader=FileSystemLoader(templating.TEMPLATES_DIR), autoescape=True,
+        bytecode_cache=FileSystemBytecodeCache(bytecode_dir) if bytecode_dir else None,
+        extensions=[templating.FragmentCacheExtension],
+    )
+    env.globals.update(templating.env.globals)
+    return env
+
+
+def _median_ms(fn, repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times)
+
+
+def _compile_all(env):
+    for name in env.list_templates(extensions=("html",)):
+        env.get_template(name)
+
+
+def run(n: int, repeats: int):
+    bytecode_dir = tempfile.mkdtemp()
+    _compile_all(_env(bytecode_dir))   # fill the bytecode cache once
+    ms_source = _median_ms(lambda: _compile_all(_env()), repeats)
+    ms_bytecode = _median_ms(lambda: _compile_all(_env(bytecode_dir)), repeats)
+    print(f"compile all templates   source {ms_source:7.1f}ms   bytecode cache {ms_bytecode:7.1f}ms")
+
+    tpl = templating.env.get_template("doctor/home.html")
+    uncached, cached = context(n, None), context(n, 1)
+    templating.fragment_cache.clear()
+    html = tpl.render(cached)
+    assert html == tpl.render(uncached)
+    ms_uncached = _median_ms(lambda: tpl.render(uncached), repeats)
+    ms_cached = _median_ms(lambda: tpl.render(cached), repeats)
+    print(f"doctor/home, {n} patients   uncached {ms_uncached:7.2f}ms   "
+          f"fragment cache {ms_cached:7.2f}ms   ({len(html) / 1024:.0f} KiB)")
+    print(f"fragment cache {templating.fragment_cache.stats()}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    run(int(args[0]) if args else 400, int(args[1]) if len(args) > 1 else 20)
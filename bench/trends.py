@@ -0,0 +1,111 @@
+"""
+Trend endpoint cost against history length: one patient each with 100, 1k,
+10k and 50k entries on a temp DB, timing GET /patient/trends (default 200
+points, LTTB and min/max buckets) and the response size, next to rendering
+every entry as the old patient views did.
+
+    python -m bench.trends [repeats]
+"""
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import main
+from app.database import Base, get_async_db, get_async_read_db, User, Entry
+from app.routes_auth import create_token
+
+SIZES = (100, 1_000, 10_000, 50_000)
+
+
+def seed(session, sizes=SIZES, seed=0):
+    rng = random.Random(seed)
+    session.execute(insert(User), [
+        {"id": i, "username": f"patient{i}", "email": f"p{i}@bench.local",
+         "password": "x", "role": "patient"}
+        for i in range(1, len(sizes) + 1)
+    ])
+    start = datetime(2010, 1, 1)
+    for pid, n in enumerate(sizes, start=1):
+        fib4 = 1.0
+        rows = []
+        for k in range(n):
+            fib4 = max(0.3, fib4 + rng.gauss(0, 0.05))
+            rows.append({
+                "user_id": pid, "age": 50, "ast": 40, "alt": 30, "platelets": 200,
+                "albumin": 4, "bmi": 27, "diabetes": False, "glucose": 100, "insulin": 10,
+                "fib4": round(fib4, 3), "apri": 0.5, "nfs": -1.0, "homa_ir": 2.5,
+                "risk_level": "Low", "is_emergency": False,
+                "created_at": start + timedelta(hours=6 * k),
+            })
+        session.execute(insert(Entry), rows)
+    session.commit()
+
+
+async def _timed(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        out = await fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return out, statistics.median(times)
+
+
+async def run(repeats: int):
+    path = os.path.join(tempfile.mkdtemp(), "trends_bench.db")
+    engine = create_engine("sqlite:///" + path)
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as s:
+        seed(s)
+    engine.dispose()
+
+    async_engine = create_async_engine("sqlite+aiosqlite:///" + path)
+    AsyncSession = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_db():
+        async with AsyncSession() as db:
+            yield db
+
+    main.app.dependency_overrides[get_async_db] = override_db
+    main.app.dependency_overrides[get_async_read_db] = override_db
+    transport = httpx.ASGITransport(app=main.app)
+    print(f"{'entries':>8}  {'all rows':>10}  {'lttb':>16}  {'minmax':>16}")
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for pid, n in enumerate(SIZES, start=1):
+            cookies = {"access_token": create_token(pid, "patient")}
+
+            async def load_all():
+                # What patient_detail used to do: every Entry, serialised
+                async with AsyncSession() as db:
+                    entries = (await db.scalars(
+                        select(Entry).where(Entry.user_id == pid).order_by(Entry.created_at.desc())
+                    )).all()
+                return json.dumps([[e.created_at.isoformat(), e.fib4, e.apri, e.nfs, e.homa_ir]
+                                   for e in entries])
+
+            _, ms_all = await _timed(load_all, repeats)
+            r_lttb, ms_lttb = await _timed(
+                lambda: client.get("/patient/trends", cookies=cookies), repeats)
+            r_mm, ms_mm = await _timed(
+                lambda: client.get("/patient/trends", params={"method": "minmax"}, cookies=cookies),
+                repeats)
+            print(f"{n:>8}  {ms_all:8.1f}ms  "
+                  f"{ms_lttb:6.1f}ms {len(r_lttb.content) / 1024:5.1f}KiB  "
+                  f"{ms_mm:6.1f}ms {len(r_mm.content) / 1024:5.1f}KiB")
+
+    main.app.dependency_overrides.clear()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 3))
@@ -7,33 +7,81 @@ os.chdir(_HERE)
 
 from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.exceptions import HTTPException as FastAPIHTTPException
 from fastapi.responses import JSONResponse
 
-from app.database import init_db
+from app.database import (
+    async_engine, replica_engine, init_db,
+    DATABASE_REPLICA_URL, READ_PRIMARY_COOKIE, REPLICA_STICKY_SECONDS,
+)
 from app.routes_auth import router as auth_router
 from app.routes_patient import router as patient_router
 from app.routes_doctor import router as doctor_router
+from app.routes_scores import router as scores_router
+from app.routes_notifications import router as notifications_router
+from app.routes_metrics import router as metrics_router
+from app.assets import AssetFiles
+from app.compression import CompressionMiddleware
+from app.metrics import MetricsMiddleware
+from app.outbox import dispatcher as outbox_dispatcher
+from app.templating import warm_templates
 
 app = FastAPI(title="HepaCheck")
 
-# Absolute paths — always correct regardless of CWD
+# gzip/brotli for HTML and JSON over COMPRESS_MIN_SIZE; streamed pages are
+# compressed chunk by chunk, precompressed static files pass through.
+app.add_middleware(CompressionMiddleware)
+# Outermost, so request latency includes compression. Served at /metrics.
+app.add_middleware(MetricsMiddleware)
+
+# Absolute paths — always correct regardless of CWD. Hashed files from
+# `python -m app.assets` are served immutable, with precompressed siblings.
 app.mount(
     "/static",
-    StaticFiles(directory=os.path.join(_HERE, "static")),
+    AssetFiles(directory=os.path.join(_HERE, "static")),
     name="static",
 )
 
 app.include_router(auth_router)
 app.include_router(patient_router)
 app.include_router(doctor_router)
+app.include_router(scores_router)
+app.include_router(notifications_router)
+app.include_router(metrics_router)
+
+
+if DATABASE_REPLICA_URL:
+    @app.middleware("http")
+    async def read_primary_after_write(request: Request, call_next):
+        """Pin a client's dashboard reads to the primary briefly after it writes."""
+        response = await call_next(request)
+        if request.method not in ("GET", "HEAD"):
+            response.set_cookie(
+                READ_PRIMARY_COOKIE, "1",
+                max_age=REPLICA_STICKY_SECONDS, httponly=True, samesite="lax",
+            )
+        return response
 
 
 @app.on_event("startup")
 def on_startup():
     init_db()
+    warm_templates()
+
+
+@app.on_event("startup")
+async def start_outbox():
+    outbox_dispatcher.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await outbox_dispatcher.stop()
+    # Pooled aiosqlite connections each own a non-daemon thread
+    await async_engine.dispose()
+    if replica_engine is not async_engine:
+        await replica_engine.dispose()
 
 
 @app.exception_handler(FastAPIHTTPException)
@@ -44,6 +92,7 @@ async def http_exception_handler(request: Request, exc: FastAPIHTTPException):
     return JSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail},
+        headers=exc.headers,
     )
 
 
@@ -233,7 +233,7 @@ function saveScores() {
   renderReports();
   // Count badge
   var badge = document.getElementById('history-count-badge');
-  if (badge) badge.textContent = history.length + ' entr' + (history.length === 1 ? 'y' : 'ies');
+  if (badge && !hasServerTrend()) badge.textContent = history.length + ' entr' + (history.length === 1 ? 'y' : 'ies');
 }
 
 function renderReports() {
@@ -241,7 +241,7 @@ function renderReports() {
   if (!wrap) return;
   var history = JSON.parse(localStorage.getItem(REPORT_KEY) || '[]');
   var badge = document.getElementById('history-count-badge');
-  if (badge) badge.textContent = history.length + ' entr' + (history.length === 1 ? 'y' : 'ies');
+  if (badge && !hasServerTrend()) badge.textContent = history.length + ' entr' + (history.length === 1 ? 'y' : 'ies');
 
   if (history.length === 0) {
     wrap.innerHTML = '<div class="empty-state"><div class="empty-icon">📋</div><p>No saved results yet. Compute scores and click Save.</p></div>';
@@ -259,9 +259,15 @@ function renderReports() {
   renderHistoryChart(history);
 }
 
+/* Once the server history has loaded it takes over the chart and badge. */
+function hasServerTrend() {
+  var chartWrap = document.getElementById('home-history-chart');
+  return !!(chartWrap && chartWrap._trend);
+}
+
 function renderHistoryChart(history) {
   var chartWrap = document.getElementById('home-history-chart');
-  if (!chartWrap || history.length === 0) return;
+  if (!chartWrap || history.length === 0 || hasServerTrend()) return;
   var max5 = history.slice(0, 5).reverse();
   var html = max5.map(function(e) {
     var val = parseFloat(e.fib4) || 0;
@@ -681,4 +687,127 @@ document.addEventListener('DOMContentLoaded', function() {
       if (document.getElementById('reports-table-wrap')) renderReports();
     }
   }
-});
\ No newline at end of file
+});
+/* ═══════════════════════════════════════════════════════════════
+   LIVE NOTIFICATIONS  —  GET /notifications/stream (server-sent events)
+   New notifications arrive as toasts without reloading the dashboard.
+   EventSource reconnects on its own and sends Last-Event-ID, so the
+   server replays anything missed while disconnected.
+═══════════════════════════════════════════════════════════════ */
+function subscribeNotifications(onEvent) {
+  if (!window.EventSource) return null;
+  var source = new EventSource('/notifications/stream');
+  source.addEventListener('notification', function(e) {
+    var n = JSON.parse(e.data);
+    showNotificationToast(n);
+    if (onEvent) onEvent(n);
+  });
+  return source;
+}
+
+function showNotificationToast(n) {
+  var stack = document.getElementById('notif-toasts');
+  if (!stack) {
+    stack = document.createElement('div');
+    stack.id = 'notif-toasts';
+    stack.className = 'notif-toasts';
+    document.body.appendChild(stack);
+  }
+  var toast = document.createElement('div');
+  toast.className = 'notif-toast' + (n.kind === 'emergency' ? ' emergency' : '');
+  var msg = document.createElement('div');
+  msg.textContent = n.message;
+  var time = document.createElement('div');
+  time.className = 'notif-time';
+  time.textContent = n.time;
+  toast.appendChild(msg);
+  toast.appendChild(time);
+  toast.onclick = function() { toast.remove(); };
+  stack.appendChild(toast);
+  if (n.kind !== 'emergency') setTimeout(function() { toast.remove(); }, 8000);
+}
+
+/* ═══════════════════════════════════════════════════════════════
+   SCORE TRENDS  —  GET /patient/trends, /doctor/patient/:id/trends
+   The server downsamples each series to a fixed number of points, so
+   the chart costs the same for 10 entries or 10,000. Any element with
+   data-trend-url is filled on load; data-count-badge names an element
+   that receives the entry count.
+═══════════════════════════════════════════════════════════════ */
+var TREND_LABELS = { fib4: 'FIB-4', apri: 'APRI', nfs: 'NFS', homa_ir: 'HOMA-IR' };
+var SVG_NS = 'http://www.w3.org/2000/svg';
+
+function renderTrendChart(el) {
+  fetch(el.getAttribute('data-trend-url'), { credentials: 'same-origin' })
+    .then(function(r) { return r.ok ? r.json() : null; })
+    .then(function(data) {
+      if (!data || !data.count) return;
+      el._trend = data;
+      var badge = document.getElementById(el.getAttribute('data-count-badge') || '');
+      if (badge) badge.textContent = data.count + ' entr' + (data.count === 1 ? 'y' : 'ies');
+      drawTrend(el, el.getAttribute('data-metric') || Object.keys(data.series)[0]);
+    });
+}
+
+function _svg(tag, attrs) {
+  var node = document.createElementNS(SVG_NS, tag);
+  Object.keys(attrs).forEach(function(k) { node.setAttribute(k, attrs[k]); });
+  return node;
+}
+
+function drawTrend(el, metric) {
+  var data = el._trend, s = data.series[metric], sum = data.summary[metric];
+  var W = 600, H = 180, P = 20;
+  var t  = s.t.map(function(x) { return Date.parse(x); });
+  var ys = s.y || s.mean;
+  var t0 = t[0], t1 = t[t.length - 1];
+  var lo = Math.min.apply(null, s.min || ys), hi = Math.max.apply(null, s.max || ys);
+  function X(v) { return (P + (t1 === t0 ? 0.5 : (v - t0) / (t1 - t0)) * (W - 2 * P)).toFixed(1); }
+  function Y(v) { return (H - P - (hi === lo ? 0.5 : (v - lo) / (hi - lo)) * (H - 2 * P)).toFixed(1); }
+
+  el.setAttribute('data-metric', metric);
+  el.innerHTML = '';
+  var tabs = document.createElement('div');
+  tabs.className = 'trend-tabs';
+  Object.keys(data.series).forEach(function(m) {
+    var b = document.createElement('button');
+    b.type = 'button';
+    b.className = 'trend-tab' + (m === metric ? ' active' : '');
+    b.textContent = TREND_LABELS[m] || m;
+    b.onclick = function() { drawTrend(el, m); };
+    tabs.appendChild(b);
+  });
+  el.appendChild(tabs);
+
+  var svg = _svg('svg', { viewBox: '0 0 ' + W + ' ' + H, 'class': 'trend-svg' });
+  if (s.min) {   /* bucketed: shade the min–max band */
+    var band = t.map(function(x, i) { return X(x) + ',' + Y(s.max[i]); })
+      .concat(t.slice().reverse().map(function(x, i) { return X(x) + ',' + Y(s.min[t.length - 1 - i]); }));
+    svg.appendChild(_svg('polygon', { points: band.join(' '), 'class': 'trend-band' }));
+  }
+  svg.appendChild(_svg('polyline', {
+    points: t.map(function(x, i) { return X(x) + ',' + Y(ys[i]); }).join(' '),
+    'class': 'trend-line',
+  }));
+  data.alerts.forEach(function(a) {
+    var at = Date.parse(a.at);
+    if (a.metric !== metric || at < t0 || at > t1) return;
+    var dot = _svg('circle', { cx: X(at), cy: Y(Math.min(hi, Math.max(lo, a.value))), r: 4, 'class': 'trend-alert' });
+    dot.appendChild(_svg('title', {})).textContent = a.at + ': +' + a.delta + ' (' + a.rate + ' per 30 days)';
+    svg.appendChild(dot);
+  });
+  el.appendChild(svg);
+
+  var alerts = data.alerts.filter(function(a) { return a.metric === metric; }).length;
+  var note = document.createElement('div');
+  note.className = 'trend-summary';
+  note.textContent = 'Latest ' + sum.last + ' · change ' + (sum.change > 0 ? '+' : '') + sum.change
+    + (sum.slope_per_30d !== null ? ' · trend ' + sum.slope_per_30d + ' / 30 days' : '')
+    + ' · ' + data.count + ' entries' + (s.t.length < data.count ? ', ' + s.t.length + ' points shown' : '')
+    + (alerts ? ' · ' + alerts + ' rapid rise' + (alerts === 1 ? '' : 's') : '');
+  el.appendChild(note);
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+  document.querySelectorAll('[data-trend-url]').forEach(renderTrendChart);
+});
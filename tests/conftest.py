@@ -0,0 +1,24 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# app.database builds its engines at import, so point DATABASE_URL at a
+# throwaway SQLite file before any test imports the app.
+_TMP = tempfile.mkdtemp(prefix="hepacheck-test-")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_TMP, "hepacheck.db")
+os.environ.pop("DATABASE_REPLICA_URL", None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app_client():
+    """One TestClient for the session; the app's lifespan binds to its event loop."""
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as client:
+        yield client
@@ -0,0 +1,20 @@
+"""/metrics and /metrics/outbox are closed unless METRICS_TOKEN is set and presented."""
+import pytest
+
+from app import auth
+
+PATHS = ("/metrics", "/metrics/outbox")
+
+
+@pytest.mark.parametrize("path", PATHS)
+def test_disabled_without_a_token(app_client, monkeypatch, path):
+    monkeypatch.setattr(auth, "METRICS_TOKEN", "")
+    assert app_client.get(path).status_code == 404
+
+
+@pytest.mark.parametrize("path", PATHS)
+def test_requires_the_bearer_token(app_client, monkeypatch, path):
+    monkeypatch.setattr(auth, "METRICS_TOKEN", "s3cret")
+    assert app_client.get(path).status_code == 401
+    assert app_client.get(path, headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert app_client.get(path, headers={"Authorization": "Bearer s3cret"}).status_code == 200
@@ -0,0 +1,86 @@
+"""
+EXPLAIN QUERY PLAN for every SELECT the dashboards and the community feed
+run, captured from real requests against a small seeded SQLite database.
+No hot table may be scanned except along an index, and each page must use
+the composite indexes declared for it in app.database.
+"""
+import re
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.database import SessionLocal, engine, init_db
+from app.routes_auth import create_token
+from bench.seed import seed
+
+HOT_TABLES = ("entries", "flags", "community_posts", "notifications")
+
+# (role, user id, path) -> indexes its queries must use
+PAGES = {
+    ("doctor", 1, "/doctor/home"): {
+        "ix_patient_doctor_doctor", "ix_entries_user_created",
+        "ix_flags_entry_status", "ix_flags_doctor_status_created",
+    },
+    ("doctor", 1, "/doctor/patient/3"): {"ix_entries_user_created", "ix_flags_entry_status"},
+    ("patient", 3, "/patient/home"): set(),   # primary-key lookups only
+    ("patient", 3, "/patient/community/posts"): {
+        "ix_community_posts_created", "ix_community_posts_author", "ix_post_replies_post_created",
+    },
+}
+
+
+@pytest.fixture(scope="module")
+def plans(app_client):
+    """path -> [(statement, plan lines)] for every SELECT the page ran."""
+    init_db()
+    with SessionLocal() as db:
+        seed(db, n_doctors=2, n_patients=10, years=1)
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    result = {}
+    event.listen(Engine, "before_cursor_execute", capture)
+    try:
+        for role, user_id, path in PAGES:
+            app_client.cookies.set("access_token", create_token(user_id, role))
+            statements.clear()
+            assert app_client.get(path).status_code == 200, path
+            result[path] = list(statements)
+    finally:
+        event.remove(Engine, "before_cursor_execute", capture)
+        app_client.cookies.clear()
+
+    with engine.connect() as conn:
+        return {
+            path: [(statement, [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, params)])
+                   for statement, params in ran]
+            for path, ran in result.items()
+        }
+
+
+def _scanned_table(line: str) -> str | None:
+    match = re.match(r"SCAN (\w+?)(?:_\d+)?(?: |$)", line)
+    return match.group(1) if match and match.group(1) in HOT_TABLES else None
+
+
+@pytest.mark.parametrize("page", list(PAGES), ids=[path for _, _, path in PAGES])
+def test_hot_tables_are_never_scanned(plans, page):
+    path = page[2]
+    for statement, plan in plans[path]:
+        for line in plan:
+            if _scanned_table(line):
+                assert re.search(r"USING (?:COVERING )?INDEX ", line), (
+                    f"{path}: table scan {line!r} in\n{' '.join(statement.split())}"
+                )
+
+
+@pytest.mark.parametrize("page", list(PAGES), ids=[path for _, _, path in PAGES])
+def test_pages_use_their_indexes(plans, page):
+    path = page[2]
+    used = {m for _, plan in plans[path] for line in plan for m in re.findall(r"INDEX (ix_\w+)", line)}
+    assert PAGES[page] <= used, f"{path} did not use {sorted(PAGES[page] - used)}"
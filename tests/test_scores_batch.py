@@ -0,0 +1,38 @@
+"""POST /scores/batch refuses inputs that would score to NaN with a 422."""
+import pytest
+
+from app.routes_auth import create_token
+
+ROW = {"age": 50, "ast": 40, "alt": 30, "platelets": 200, "albumin": 4.0,
+       "bmi": 27, "diabetes": False, "glucose": 100, "insulin": 10}
+
+
+@pytest.fixture(scope="module")
+def client(app_client):
+    app_client.cookies.set("access_token", create_token(1, "doctor"))
+    yield app_client
+    app_client.cookies.clear()
+
+
+def test_scores_a_valid_batch(client):
+    r = client.post("/scores/batch", json=[ROW, ROW])
+    assert r.status_code == 200
+    assert r.json()["count"] == 2
+
+
+@pytest.mark.parametrize("body", [
+    {**{k: [v, v] for k, v in ROW.items()}, "age": [50, None]},
+    [ROW, {**ROW, "age": None}],
+], ids=["column null", "row null"])
+def test_json_null_is_422(client, body):
+    r = client.post("/scores/batch", json=body)
+    assert r.status_code == 422
+    assert "age" in r.json()["detail"] and "row 1" in r.json()["detail"]
+
+
+@pytest.mark.parametrize("value", ["nan", "inf", "-inf"])
+def test_csv_non_finite_is_422(client, value):
+    body = "age,ast,alt,platelets\n50,40,30,200\n50,40,30," + value + "\n"
+    r = client.post("/scores/batch", content=body, headers={"content-type": "text/csv"})
+    assert r.status_code == 422
+    assert "platelets" in r.json()["detail"]